@@ -26,25 +26,278 @@ import re
 # 5. Flags:
 #    - `re.IGNORECASE`: Makes the pattern case-insensitive.
 #    - `re.MULTILINE`: Allows `^` and `$` to match the start and end of each line, not just the start and end of the entire string.
+# 6. Compiled pattern registry:
+#    - Calling `re.findall(pattern, text)` with a raw string looks the pattern up in the small module-level cache inside `re` on every call.
+#      When thousands of patterns are in play that cache overflows and patterns get recompiled over and over.
+#    - A registry keeps compiled `re.Pattern` objects keyed by (pattern, flags) in a size-bounded LRU, so hot loops never recompile.
+#    - Patterns can also be registered under a name, exported as a manifest and used to warm up a fresh registry at startup.
+#    - Registering with lazy=True returns a LazyPattern that behaves like `re.Pattern` but only compiles on first use,
+#      so importing a module full of patterns costs nothing until one of them is actually needed.
+#    - enable_disk_cache() (opt-in) stores the compiled engine code of every str pattern on disk, so a cold process
+#      can skip parsing and compiling and build the pattern straight from the cached code. The cache lives in a
+#      per-user directory and is only loaded when the current user owns it and nobody else can write to it.
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import _sre
+
+# Cache files live in a per-user directory: the engine code loaded from them goes straight into _sre.compile(),
+# so a file another user could plant or edit (as in the shared temp directory) must never be read
+private_cache_dir = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "python-regex-examples",
+)
+# The engine code format changes between Python versions, so each version gets its own cache file
+compiled_code_cache_path = os.path.join(
+    private_cache_dir,
+    f"re_compiled_code_{sys.implementation.cache_tag}_{re._constants.MAGIC}.json",
+)
+
+
+def _load_private_json(path):
+    # Returns None unless the file exists, belongs to the current user and only they can write to it
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            info = os.fstat(file.fileno())
+            if hasattr(os, "getuid") and info.st_uid != os.getuid():
+                return None
+            if info.st_mode & 0o022:
+                return None
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_private_json(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # Write to a temporary file first so a concurrent reader never sees a half-written file;
+    # O_EXCL refuses to follow a link planted under the temporary name
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    os.replace(temporary_path, path)
+
+
+def _valid_code_entry(entry):
+    return (
+        isinstance(entry, dict)
+        and isinstance(entry.get("flags"), int)
+        and isinstance(entry.get("code"), list)
+        and all(isinstance(word, int) and 0 <= word <= re._compiler.MAXCODE for word in entry["code"])
+        and isinstance(entry.get("groups"), int)
+        and isinstance(entry.get("groupindex"), dict)
+        and isinstance(entry.get("indexgroup"), list)
+        and len(entry["indexgroup"]) == entry["groups"]
+    )
+
+
+class LazyPattern:
+    """Stands in for a compiled `re.Pattern` and compiles it through a registry on first use."""
+
+    def __init__(self, registry, pattern, flags=0):
+        self.pattern = pattern
+        self._flags = flags
+        self._registry = registry
+        self._compiled = None
+
+    @property
+    def compiled(self):
+        if self._compiled is None:
+            self._compiled = self._registry.compile(self.pattern, self._flags)
+        return self._compiled
+
+    def __getattr__(self, name):
+        # Only reached for attributes not set on the instance: search, findall, flags, groups, ...
+        if name.startswith("_"):
+            raise AttributeError(name)  # copy and pickle probe for these before __init__ has run
+        value = getattr(self.compiled, name)
+        if callable(value):
+            self.__dict__[name] = value  # later calls skip __getattr__ entirely
+        return value
+
+    def __repr__(self):
+        state = "compiled" if self._compiled is not None else "not compiled yet"
+        return f"LazyPattern({self.pattern!r}, {state})"
+
+
+def _resolve_pattern(pattern):
+    # LazyPattern is not an re.Pattern, so helpers that check for compiled patterns unwrap it first
+    if isinstance(pattern, LazyPattern):
+        return pattern.compiled
+    return pattern
+
+
+class PatternRegistry:
+    """Size-bounded LRU of compiled regex patterns with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize=4096):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1.")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._compiled = OrderedDict()  # (pattern, flags) -> re.Pattern, oldest first
+        self._names = {}  # name -> (pattern, flags)
+        self._lock = threading.Lock()
+        self.disk_cache_path = None
+        self._disk_code = None  # (pattern, flags) -> compiled code, when the disk cache is enabled
+
+    def compile(self, pattern, flags=0):
+        key = (pattern, int(flags))
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+        # Compile outside the lock so a slow pattern does not block other threads
+        compiled = self._compile_uncached(pattern, int(flags))
+        with self._lock:
+            self._compiled[key] = compiled
+            self._compiled.move_to_end(key)
+            while len(self._compiled) > self.maxsize:
+                self._compiled.popitem(last=False)
+                self.evictions += 1
+        return compiled
+
+    def _compile_uncached(self, pattern, flags):
+        if self._disk_code is None or not isinstance(pattern, str):
+            return re.compile(pattern, flags)
+        entry = self._disk_code.get((pattern, flags))
+        if entry is None:
+            # The same steps as re._compiler.compile(), keeping the code so it can be saved
+            parsed = re._parser.parse(pattern, flags)
+            indexgroup = [None] * parsed.state.groups
+            for group_name, index in parsed.state.groupdict.items():
+                indexgroup[index] = group_name
+            entry = {
+                "flags": flags | parsed.state.flags,
+                "code": re._compiler._code(parsed, flags),
+                "groups": parsed.state.groups,
+                "groupindex": dict(parsed.state.groupdict),
+                "indexgroup": indexgroup,
+            }
+            self._disk_code[(pattern, flags)] = entry
+        try:
+            return _sre.compile(
+                pattern,
+                entry["flags"],
+                entry["code"],
+                entry["groups"] - 1,
+                entry["groupindex"],
+                tuple(entry["indexgroup"]),
+            )
+        except RuntimeError:
+            # Well-formed but invalid engine code ("invalid SRE code"): drop the entry and compile normally
+            self._disk_code.pop((pattern, flags), None)
+            return re.compile(pattern, flags)
+
+    def enable_disk_cache(self, path=None):
+        # Loads previously saved engine code; returns how many patterns it holds
+        # Files owned by another user, writable by others or not shaped like saved code are ignored
+        self.disk_cache_path = path or compiled_code_cache_path
+        saved = _load_private_json(self.disk_cache_path)
+        self._disk_code = {}
+        if isinstance(saved, list):
+            for item in saved:
+                if isinstance(item, list) and len(item) == 3 and _valid_code_entry(item[2]):
+                    pattern, flags, entry = item
+                    if isinstance(pattern, str) and isinstance(flags, int):
+                        self._disk_code[(pattern, flags)] = entry
+        return len(self._disk_code)
+
+    def save_disk_cache(self):
+        if self._disk_code is None:
+            raise RuntimeError("call enable_disk_cache() first")
+        saved = [[pattern, flags, entry] for (pattern, flags), entry in self._disk_code.items()]
+        _save_private_json(self.disk_cache_path, saved)
+        return len(saved)
+
+    def register(self, name, pattern, flags=0, lazy=False):
+        self._names[name] = (pattern, int(flags))
+        if lazy:
+            return LazyPattern(self, pattern, flags)
+        return self.compile(pattern, flags)
+
+    def lazy(self, pattern, flags=0):
+        return LazyPattern(self, pattern, flags)
+
+    def get(self, name):
+        try:
+            pattern, flags = self._names[name]
+        except KeyError:
+            raise KeyError(f"No pattern registered under the name {name!r}.") from None
+        return self.compile(pattern, flags)
+
+    def names(self):
+        return list(self._names)
+
+    def export_manifest(self):
+        # Only str patterns are exported, since JSON cannot hold bytes
+        return {
+            name: {"pattern": pattern, "flags": flags}
+            for name, (pattern, flags) in self._names.items()
+            if isinstance(pattern, str)
+        }
+
+    def warm_up(self, manifest, lazy=False):
+        # `manifest` is a dict as returned by export_manifest() or the path of a JSON file holding one.
+        # With lazy=True the names are only registered and each pattern compiles when first fetched.
+        if isinstance(manifest, str):
+            with open(manifest, "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+        for name, entry in manifest.items():
+            self.register(name, entry["pattern"], entry.get("flags", 0), lazy=lazy)
+        return len(manifest)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._compiled),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._compiled.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+# A single process-wide registry that every example below goes through
+pattern_registry = PatternRegistry()
 # Example usage of regex in Python:
 # Search for a pattern in a string
 pattern = r"\bhello\b"
 text = "Hello world! hello again."
-matches = re.findall(pattern, text, re.IGNORECASE)
+matches = pattern_registry.register("hello_word", pattern, re.IGNORECASE).findall(text)
 print(matches)  # Output: ['hello', 'hello']
 # Replace a pattern in a string
-replacement = re.sub(pattern, "hi", text, flags=re.IGNORECASE)
+replacement = pattern_registry.get("hello_word").sub("hi", text)
 print(replacement)  # Output: 'hi world! hi again.'
 # Match a pattern at the start of a string
 start_pattern = r"^Hello"
-start_match = re.match(start_pattern, text, flags=re.IGNORECASE)
+start_match = pattern_registry.register(
+    "hello_start", start_pattern, re.IGNORECASE
+).match(text)
 if start_match:
     print("Match found at the start of the string.")
 else:
     print("No match found at the start of the string.")
 # Match a pattern at the end of a string
 end_pattern = r"again\.$"
-end_match = re.search(end_pattern, text, flags=re.IGNORECASE)
+end_match = pattern_registry.register("again_end", end_pattern, re.IGNORECASE).search(
+    text
+)
 if end_match:
     print("Match found at the end of the string.")
 else:
@@ -52,64 +305,80 @@ else:
 # Grouping and capturing matches
 group_pattern = r"(\w+) (\w+)"
 group_text = "Hello world"
-group_matches = re.findall(group_pattern, group_text)
+group_matches = pattern_registry.register("word_pair", group_pattern).findall(group_text)
 print(group_matches)  # Output: [('Hello', 'world')]
 # Using character classes
 char_class_pattern = r"[aeiou]"
 char_class_text = "Hello world"
-char_class_matches = re.findall(char_class_pattern, char_class_text)
+char_class_matches = pattern_registry.register("vowel", char_class_pattern).findall(
+    char_class_text
+)
 print(char_class_matches)  # Output: ['e', 'o', 'o']
 # Using quantifiers
 quantifier_pattern = r"\d{2,4}"
 quantifier_text = "Year 2023, 1999, and 20"
-quantifier_matches = re.findall(quantifier_pattern, quantifier_text)
+quantifier_matches = pattern_registry.register(
+    "short_number", quantifier_pattern
+).findall(quantifier_text)
 print(quantifier_matches)  # Output: ['2023', '1999', '20']
 # Using escape sequences
 escape_pattern = r"\d\.\d"
 escape_text = "The price is 12.99 and 3.50."
-escape_matches = re.findall(escape_pattern, escape_text)
+escape_matches = pattern_registry.register("decimal", escape_pattern).findall(escape_text)
 print(escape_matches)  # Output: ['12.9', '3.5']
 # Using flags for case-insensitive matching
 case_insensitive_pattern = r"hello"
 case_insensitive_text = "Hello world! hello again."
-case_insensitive_matches = re.findall(
-    case_insensitive_pattern, case_insensitive_text, flags=re.IGNORECASE
-)
+case_insensitive_matches = pattern_registry.register(
+    "hello", case_insensitive_pattern, re.IGNORECASE
+).findall(case_insensitive_text)
 print(case_insensitive_matches)  # Output: ['Hello', 'hello']
 # Using multiline flag
 multiline_text = "First line\nSecond line\nThird line"
 multiline_pattern = r"^\w+"
-multiline_matches = re.findall(multiline_pattern, multiline_text, flags=re.MULTILINE)
+multiline_matches = pattern_registry.register(
+    "line_start_word", multiline_pattern, re.MULTILINE
+).findall(multiline_text)
 print(multiline_matches)  # Output: ['First', 'Second', 'Third']
 # Using logical OR
 or_pattern = r"cat|dog"
 or_text = "I have a cat and a dog."
-or_matches = re.findall(or_pattern, or_text)
+or_matches = pattern_registry.register("cat_or_dog", or_pattern).findall(or_text)
 print(or_matches)  # Output: ['cat', 'dog']
 # Using word boundaries
 word_boundary_pattern = r"\bword\b"
 word_boundary_text = "This is a word in a sentence."
-word_boundary_matches = re.findall(word_boundary_pattern, word_boundary_text)
+word_boundary_matches = pattern_registry.register(
+    "word", word_boundary_pattern
+).findall(word_boundary_text)
 print(word_boundary_matches)  # Output: ['word']
 # Using non-capturing groups
 non_capturing_pattern = r"(?:\d{3})-(\d{2})-(\d{4})"
 non_capturing_text = "My number is 123-45-6789."
-non_capturing_matches = re.findall(non_capturing_pattern, non_capturing_text)
+non_capturing_matches = pattern_registry.register(
+    "ssn_groups", non_capturing_pattern
+).findall(non_capturing_text)
 print(non_capturing_matches)  # Output: ['45', '6789']
 # Using lookahead assertions
 lookahead_pattern = r"\d+(?= dollars)"
 lookahead_text = "I have 100 dollars and 50 cents."
-lookahead_matches = re.findall(lookahead_pattern, lookahead_text)
+lookahead_matches = pattern_registry.register(
+    "dollar_amount", lookahead_pattern
+).findall(lookahead_text)
 print(lookahead_matches)  # Output: ['100']
 # Using lookbehind assertions
 lookbehind_pattern = r"(?<=\$)\d+"
 lookbehind_text = "The price is $20 and $30."
-lookbehind_matches = re.findall(lookbehind_pattern, lookbehind_text)
+lookbehind_matches = pattern_registry.register(
+    "price", lookbehind_pattern
+).findall(lookbehind_text)
 print(lookbehind_matches)  # Output: ['20', '30']
 # Using named groups
 named_group_pattern = r"(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})"
 named_group_text = "The date is 2023-10-05."
-named_group_matches = re.search(named_group_pattern, named_group_text)
+named_group_matches = pattern_registry.register(
+    "date", named_group_pattern
+).search(named_group_text)
 if named_group_matches:
     print(named_group_matches.group("year"))  # Output: 2023
     print(named_group_matches.group("month"))  # Output: 10
@@ -121,7 +390,10 @@ verbose_pattern = r"""
 -(?P<day>\d{2})  # Match a 2-digit day  
 """
 verbose_text = "The date is 2023-10-05."
-verbose_matches = re.search(verbose_pattern, verbose_text, re.VERBOSE)
+# lazy=True defers compiling this longer pattern until search() is first called on it
+verbose_matches = pattern_registry.register(
+    "date_verbose", verbose_pattern, re.VERBOSE, lazy=True
+).search(verbose_text)
 if verbose_matches:
     print(verbose_matches.group("year"))  # Output: 2023
     print(verbose_matches.group("month"))  # Output: 10
@@ -129,7 +401,9 @@ if verbose_matches:
 # Using backreferences
 backreference_pattern = r"(\w+) \1"
 backreference_text = "hello hello world"
-backreference_matches = re.findall(backreference_pattern, backreference_text)
+backreference_matches = pattern_registry.register(
+    "repeated_word", backreference_pattern
+).findall(backreference_text)
 print(backreference_matches)  # Output: ['hello']
 # Backreferences allow you to refer to a previously captured group within the same regex pattern.
 # This can be useful for matching repeated patterns or validating input formats.
@@ -138,7 +412,9 @@ print(backreference_matches)  # Output: ['hello']
 # Using atomic groups
 atomic_group_pattern = r"(?>\d{3})-(\d{2})-(\d{4})"
 atomic_group_text = "My number is 123-45-6789."
-atomic_group_matches = re.findall(atomic_group_pattern, atomic_group_text)
+atomic_group_matches = pattern_registry.register(
+    "ssn_atomic", atomic_group_pattern
+).findall(atomic_group_text)
 print(atomic_group_matches)  # Output: ['45', '6789']
 # Atomic groups are used to prevent backtracking in regex patterns, which can improve performance for certain complex patterns.
 # In this example, the pattern r'(?>\d{3})-(\d{2})-(\d{4})' matches a 3-digit number followed by a hyphen, a 2-digit number, another hyphen, and a 4-digit number.
@@ -146,19 +422,1404 @@ print(atomic_group_matches)  # Output: ['45', '6789']
 # Using possessive quantifiers
 possessive_pattern = r"\d++"
 possessive_text = "12345"
-possessive_matches = re.findall(possessive_pattern, possessive_text)
+possessive_matches = pattern_registry.register(
+    "digits_possessive", possessive_pattern
+).findall(possessive_text)
 print(possessive_matches)  # Output: ['12345']
 # Possessive quantifiers are similar to greedy quantifiers but do not allow backtracking.
 # In this example, the pattern r'\d++' matches one or more digits in a possessive manner, meaning once it matches '12345', it will not backtrack to find shorter matches.
 # This can lead to performance improvements in certain scenarios, especially when dealing with large inputs or complex patterns.
+# Using the pattern registry in hot loops and at startup
+# Every example above registered its pattern by name, so a hot loop fetches the compiled pattern instead of recompiling it.
+for line in ["Call 123-45-6789 now", "No number here", "Or 987-65-4321"] * 1000:
+    pattern_registry.get("ssn_groups").findall(line)
+print(pattern_registry.stats())  # Output: {'size': 19, 'maxsize': 4096, 'hits': 3001, 'misses': 19, 'evictions': 0}
+# The registered names can be exported as a manifest (for example saved to JSON) and used to warm up a new registry,
+# so a service pays the compilation cost once at startup instead of on the first request.
+regex_catalog_manifest = pattern_registry.export_manifest()
+warm_registry = PatternRegistry(maxsize=8)
+print(warm_registry.warm_up(regex_catalog_manifest))  # Output: 19
+print(warm_registry.stats())  # Output: {'size': 8, 'maxsize': 8, 'hits': 0, 'misses': 19, 'evictions': 11}
+# Benchmark: the startup cost of a service that imports many modules full of patterns.
+# Each registered pattern is made unique 25 times over (an empty (?#...) comment changes the text, not the meaning),
+# which stands in for a few hundred patterns spread over many modules.
+import time
+
+startup_manifest = {
+    f"{name}_{copy}": {"pattern": f"{entry['pattern']}(?#{copy})", "flags": entry["flags"]}
+    for name, entry in regex_catalog_manifest.items()
+    for copy in range(25)
+}
+startup_cache_path = os.path.join(private_cache_dir, "regex_startup_benchmark_cache.json")
+
+
+def _cold_start(lazy=False, disk_cache=False):
+    re.purge()  # forget the patterns `re` compiled so far, as in a fresh process
+    started = time.perf_counter()
+    registry = PatternRegistry()
+    if disk_cache:
+        registry.enable_disk_cache(startup_cache_path)
+    registry.warm_up(startup_manifest, lazy=lazy)
+    return time.perf_counter() - started, registry
+
+
+priming_registry = PatternRegistry()
+priming_registry.enable_disk_cache(startup_cache_path)
+priming_registry.warm_up(startup_manifest)
+print(priming_registry.save_disk_cache())  # Output: 475
+eager_time, _ = _cold_start()
+lazy_time, lazy_registry = _cold_start(lazy=True)
+cached_time, cached_registry = _cold_start(disk_cache=True)
+assert cached_registry.get("date_3").search(named_group_text).groupdict() == {
+    "year": "2023",
+    "month": "10",
+    "day": "05",
+}
+# An entry that has the right shape but code the engine rejects is dropped, and the pattern is compiled normally
+damaged_registry = PatternRegistry()
+damaged_registry.enable_disk_cache(startup_cache_path)
+damaged_key = (startup_manifest["date_3"]["pattern"], startup_manifest["date_3"]["flags"])
+damaged_registry._disk_code[damaged_key] = dict(damaged_registry._disk_code[damaged_key], code=[0])
+assert damaged_registry.compile(*damaged_key).search(named_group_text).group("year") == "2023"
+assert damaged_key not in damaged_registry._disk_code
+print(
+    f"Compile everything: {eager_time * 1000:.1f} ms, lazy: {lazy_time * 1000:.1f} ms, "
+    f"from disk cache: {cached_time * 1000:.1f} ms"
+)
+# Output (timings vary by machine): Compile everything: 30.6 ms, lazy: 0.5 ms, from disk cache: 5.3 ms
+# The lazy registry pays the compile cost later, one pattern at a time, and only for the patterns that get used
+lazy_ssn = lazy_registry.lazy(r"\d{3}-\d{2}-\d{4}")
+print(lazy_ssn)  # Output: LazyPattern('\\d{3}-\\d{2}-\\d{4}', not compiled yet)
+print(lazy_ssn.findall("Call 123-45-6789 now"), lazy_ssn)
+# Output: ['123-45-6789'] LazyPattern('\\d{3}-\\d{2}-\\d{4}', compiled)
+# Matching large lists of literal keywords
+# An alternation like r"cat|dog" is fine for a handful of words, but the backtracking engine tries every alternative
+# at every position, so it slows down linearly as the keyword list grows to thousands of entries.
+# An Aho-Corasick automaton builds a trie of all keywords with failure links between them, so each input is scanned
+# exactly once no matter how many keywords there are.
+# KeywordMatcher below returns the same matches as re.findall/re.finditer on the escaped, joined alternation:
+# leftmost match first, earlier keywords win when several start at the same position, and matches never overlap.
+from collections import deque
+
+
+class KeywordMatch:
+    """Match result for KeywordMatcher, mirroring the commonly used parts of re.Match."""
+
+    __slots__ = ("string", "_start", "_end")
+
+    def __init__(self, string, start, end):
+        self.string = string
+        self._start = start
+        self._end = end
+
+    def group(self, index=0):
+        if index != 0:
+            raise IndexError("no such group")
+        return self.string[self._start : self._end]
+
+    def start(self):
+        return self._start
+
+    def end(self):
+        return self._end
+
+    def span(self):
+        return (self._start, self._end)
+
+    def __repr__(self):
+        return f"<KeywordMatch object; span={self.span()!r}, match={self.group()!r}>"
+
+
+def _is_word_char(char, ascii_only=False):
+    # What \w matches: with re.ASCII only [A-Za-z0-9_], otherwise every Unicode letter and digit as well
+    if ascii_only and char >= "\x80":
+        return False
+    return char.isalnum() or char == "_"
+
+
+def _ignore_case_key(char, ascii_only=False):
+    # The character re.IGNORECASE compares by: the engine's simple lowercase mapping (not str.lower(), which turns
+    # "İ" into two characters), then the smallest member of its re._casefix group, so "s"/"ſ", "k"/"K" (Kelvin sign)
+    # and "i"/"ı" share one key exactly when re treats them as equal
+    if ascii_only:
+        return chr(_sre.ascii_tolower(ord(char)))
+    lower = _sre.unicode_tolower(ord(char))
+    return chr(min((lower, *re._casefix._EXTRA_CASES.get(lower, ()))))
+
+
+class KeywordMatcher:
+    """Aho-Corasick matcher for a list of literal keywords."""
+
+    def __init__(self, keywords, flags=0, word_boundary=False):
+        self.keywords = list(keywords)
+        if not self.keywords:
+            raise ValueError("At least one keyword is required.")
+        if not all(self.keywords):
+            raise ValueError("Keywords must be non-empty strings.")
+        self.flags = int(flags)
+        self.ignore_case = bool(self.flags & re.IGNORECASE)
+        self.word_boundary = word_boundary
+        self._build()
+
+    def _fold(self, text):
+        # Per-character folding that gives the same equalities as re.IGNORECASE for str patterns
+        ascii_only = bool(self.flags & re.ASCII)
+        return "".join(_ignore_case_key(char, ascii_only) for char in text)
+
+    def _build(self):
+        goto = [{}]  # state -> {char: next state}
+        depth = [0]  # length of the keyword prefix each state represents
+        outputs = [()]  # state -> ((keyword length, keyword priority), ...)
+        for priority, keyword in enumerate(self.keywords):
+            if self.ignore_case:
+                keyword = self._fold(keyword)
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    depth.append(depth[state] + 1)
+                    outputs.append(())
+                state = next_state
+            # A duplicate keyword can never win over its first occurrence, so keep only the first
+            if not any(length == len(keyword) for length, _ in outputs[state]):
+                outputs[state] = outputs[state] + ((len(keyword), priority),)
+        # Breadth-first pass to compute failure links and merge the outputs of suffix states
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+        self._goto = goto
+        self._fail = fail
+        self._depth = depth
+        self._outputs = outputs
+
+    def _boundary(self, text, index):
+        ascii_only = bool(self.flags & re.ASCII)
+        before = index > 0 and _is_word_char(text[index - 1], ascii_only)
+        after = index < len(text) and _is_word_char(text[index], ascii_only)
+        return before != after
+
+    def _spans(self, text):
+        goto, fail, depth, outputs = self._goto, self._fail, self._depth, self._outputs
+        ascii_only = bool(self.flags & re.ASCII)
+        folded = {}  # char -> _ignore_case_key(char), filled as characters are seen
+        state = 0
+        last_end = 0
+        pending = []  # (start, priority, end) candidates that may still lose to an earlier start
+        for index, char in enumerate(text):
+            if self.ignore_case:
+                key = folded.get(char)
+                if key is None:
+                    key = folded[char] = _ignore_case_key(char, ascii_only)
+                char = key
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            end = index + 1
+            for length, priority in outputs[state]:
+                start = end - length
+                if start < last_end:
+                    continue
+                if self.word_boundary and not (
+                    self._boundary(text, start) and self._boundary(text, end)
+                ):
+                    continue
+                pending.append((start, priority, end))
+            # Any future match must start at or after end - depth[state], so earlier candidates are final
+            while pending:
+                best = min(pending)
+                if best[0] >= end - depth[state]:
+                    break
+                yield best[0], best[2]
+                last_end = best[2]
+                pending = [candidate for candidate in pending if candidate[0] >= last_end]
+        while pending:
+            best = min(pending)
+            yield best[0], best[2]
+            last_end = best[2]
+            pending = [candidate for candidate in pending if candidate[0] >= last_end]
+
+    def finditer(self, text):
+        for start, end in self._spans(text):
+            yield KeywordMatch(text, start, end)
+
+    def findall(self, text):
+        return [text[start:end] for start, end in self._spans(text)]
+
+    def search(self, text):
+        for start, end in self._spans(text):
+            return KeywordMatch(text, start, end)
+        return None
+
+    def as_regex(self):
+        # The equivalent alternation, useful for benchmarking and for checking results
+        alternation = "|".join(re.escape(keyword) for keyword in self.keywords)
+        if self.word_boundary:
+            alternation = rf"\b(?:{alternation})\b"
+        return pattern_registry.compile(alternation, self.flags)
+
+
+keyword_matcher = KeywordMatcher(["cat", "dog"])
+print(keyword_matcher.findall(or_text))  # Output: ['cat', 'dog']
+keyword_matcher = KeywordMatcher(
+    ["hello", "word"], flags=re.IGNORECASE, word_boundary=True
+)
+keyword_text = "Hello world! hello again, word."
+print(keyword_matcher.findall(keyword_text))  # Output: ['Hello', 'hello', 'word']
+print(list(keyword_matcher.finditer("HELLO word")))
+# Output: [<KeywordMatch object; span=(0, 5), match='HELLO'>, <KeywordMatch object; span=(6, 10), match='word'>]
+import random
+
+# Case-insensitive matching agrees with re even for pairs that str.lower() does not join, such as "ſ" and "s",
+# the Kelvin sign and "k", or "İ" and "i"
+print(KeywordMatcher(["kiss"], flags=re.IGNORECASE).findall("KIſſ \u212aİSS"))  # Output: ['KIſſ', 'KİSS']
+keyword_parity_random = random.Random(2)
+for _ in range(3000):
+    alphabet = "sSſkKKıiIİßẞµμΣσς"
+    keywords = [
+        "".join(keyword_parity_random.choice(alphabet) for _ in range(keyword_parity_random.randint(1, 3)))
+        for _ in range(3)
+    ]
+    text = "".join(keyword_parity_random.choice(alphabet + " ") for _ in range(20))
+    matcher = KeywordMatcher(keywords, flags=re.IGNORECASE)
+    assert [match.span() for match in matcher.finditer(text)] == [
+        match.span() for match in matcher.as_regex().finditer(text)
+    ], (keywords, text)
+# With re.ASCII the word boundary also follows \b: "é" is not a word character there, so "ab" in "éab" is a word
+print(KeywordMatcher(["ab"], flags=re.ASCII, word_boundary=True).findall("éab"))  # Output: ['ab']
+for flags in [0, re.ASCII, re.ASCII | re.IGNORECASE]:
+    for text in ["éab", "abé", "_ab", "ab1 ab", "²ab", "ab"]:
+        matcher = KeywordMatcher(["ab"], flags=flags, word_boundary=True)
+        assert matcher.findall(text) == matcher.as_regex().findall(text), (flags, text)
+# Benchmark against the joined alternation:
+# The regex cost grows with the number of keywords, while the automaton does one trie step per character.
+import timeit
+
+keyword_random = random.Random(27)
+benchmark_keywords = [
+    "".join(
+        keyword_random.choice("abcdefghijklmnopqrstuvwxyz")
+        for _ in range(keyword_random.randint(4, 10))
+    )
+    for _ in range(5000)
+]
+benchmark_text = " ".join(
+    keyword_random.choice(benchmark_keywords)
+    if keyword_random.random() < 0.1
+    else "filler"
+    for _ in range(5000)
+)
+benchmark_matcher = KeywordMatcher(benchmark_keywords, word_boundary=True)
+benchmark_regex = benchmark_matcher.as_regex()
+assert benchmark_matcher.findall(benchmark_text) == benchmark_regex.findall(benchmark_text)
+regex_time = timeit.timeit(lambda: benchmark_regex.findall(benchmark_text), number=3)
+matcher_time = timeit.timeit(lambda: benchmark_matcher.findall(benchmark_text), number=3)
+print(f"Joined alternation: {regex_time:.3f}s, Aho-Corasick: {matcher_time:.3f}s")
+# Output (timings vary by machine): Joined alternation: 1.034s, Aho-Corasick: 0.043s
+# Scanning files larger than memory
+# Every example above runs over an in-memory string. To run the same patterns over multi-GB log files the file is read
+# in fixed-size chunks (or memory mapped) and the matches are reported as absolute byte offsets into the file.
+# A match can straddle two chunks, so the tail of each chunk is carried over into the next one:
+# - matches that end inside the last `overlap` bytes are held back and found again once the next chunk is appended,
+# - the carried tail also keeps `overlap` bytes of context so lookbehinds like (?<=\$) and \b still see the text before them,
+# - matches are reported exactly once because the search always resumes after the last reported match.
+# This is exact as long as a single match (plus any lookaround it needs) spans fewer than `overlap` bytes.
+import mmap
+import os
+
+
+def _as_bytes_pattern(pattern, flags=0):
+    # The file is scanned as bytes, so str patterns (and compiled str patterns) are re-encoded once
+    pattern = _resolve_pattern(pattern)
+    if isinstance(pattern, re.Pattern):
+        pattern, flags = pattern.pattern, pattern.flags
+    if isinstance(pattern, str):
+        pattern = pattern.encode("utf-8")
+        flags &= ~re.UNICODE
+    return pattern_registry.compile(pattern, flags)
+
+
+def scan_file(
+    pattern, path, flags=0, chunk_size=1 << 20, overlap=4096, use_mmap=False
+):
+    """
+    Yields (start, end, match) for every match of `pattern` in the file at `path`.
+
+    `start` and `end` are absolute byte offsets into the file. `match` is the re.Match object
+    for the chunk it was found in, so its groups are available but its own spans are relative
+    to that chunk. Memory use stays around chunk_size + 2 * overlap bytes for any file size.
+    """
+    compiled = _as_bytes_pattern(pattern, flags)
+    if use_mmap:
+        # The operating system pages the file in and out, so the whole file can be searched in one call
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                # An empty file cannot be memory mapped, but patterns like r"x*" still match it
+                for match in compiled.finditer(b""):
+                    yield match.start(), match.end(), match
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for match in compiled.finditer(data):
+                    yield match.start(), match.end(), match
+        return
+    if chunk_size <= overlap:
+        raise ValueError("chunk_size must be larger than overlap.")
+    with open(path, "rb") as file:
+        buffer = b""
+        buffer_offset = 0  # absolute file offset of buffer[0]
+        search_from = 0  # position in buffer where the next search starts
+        while True:
+            chunk = file.read(chunk_size)
+            at_eof = not chunk
+            buffer += chunk
+            safe_end = len(buffer) if at_eof else len(buffer) - overlap
+            position = search_from
+            held_back_start = None
+            for match in compiled.finditer(buffer, search_from):
+                if not at_eof and match.end() > safe_end:
+                    # This match might grow (or be replaced by an earlier one) once more data arrives
+                    held_back_start = match.start()
+                    break
+                yield buffer_offset + match.start(), buffer_offset + match.end(), match
+                position = match.end()
+                if match.start() == match.end():
+                    position += 1  # an empty match: finditer moves on by one character
+            if at_eof:
+                return
+            restart = safe_end
+            if held_back_start is not None:
+                restart = min(held_back_start, restart)
+            restart = max(restart, position)
+            context = min(overlap, restart)
+            buffer_offset += restart - context
+            buffer = buffer[restart - context :]
+            search_from = context
+
+
+# Example: extract the dates and prices from a log file while reading it 64 bytes at a time
+import tempfile
+
+log_lines = [
+    f"2023-10-{day:02d} order {day} paid ${day * 10} for item {day}\n"
+    for day in range(1, 29)
+]
+with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as log_file:
+    log_file.writelines(log_lines)
+log_bytes = "".join(log_lines).encode("utf-8")
+streamed_dates = [
+    match.group("year", "month", "day")
+    for _, _, match in scan_file(
+        named_group_pattern, log_file.name, chunk_size=64, overlap=16
+    )
+]
+print(streamed_dates[:2])  # Output: [(b'2023', b'10', b'01'), (b'2023', b'10', b'02')]
+streamed_prices = [
+    log_bytes[start:end]
+    for start, end, _ in scan_file(
+        lookbehind_pattern, log_file.name, chunk_size=64, overlap=16
+    )
+]
+in_memory_prices = _as_bytes_pattern(lookbehind_pattern).findall(log_bytes)
+print(streamed_prices == in_memory_prices)  # Output: True
+mmap_spans = [
+    (start, end)
+    for start, end, _ in scan_file(lookbehind_pattern, log_file.name, use_mmap=True)
+]
+print(len(mmap_spans), mmap_spans[0])  # Output: 28 (25, 27)
+os.remove(log_file.name)
+# Searching in parallel across processes
+# Regex matching is CPU-bound and holds the GIL, so findall() only ever uses one core.
+# For large inputs the data can be split into line-aligned shards and searched by a multiprocessing.Pool
+# (the same pool pattern shown in 035_multiprocessing.py). Workers never receive the data itself:
+# a buffer is copied once into multiprocessing.shared_memory and a file is memory mapped by each worker,
+# so only the shard offsets are pickled. Each shard reports the matches that start inside it, searching on into
+# the next shard when a match (or a lookahead) needs to, and never reporting an empty match at its own end, which
+# the next shard finds. Pool.map returns the shard results in input order. Where a match runs from one shard into
+# the next, the parent searches that stretch again until the two agree, so the merged list is exactly what a single
+# findall() over the whole input returns, as long as no single match is longer than a shard.
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+
+# Below this many bytes the cost of handing work to the pool outweighs the speed-up.
+# The default is replaced by measure_parallel_crossover() in the example below.
+parallel_crossover_bytes = 8 << 20
+
+
+def _iter_parse_tree(parsed):
+    # Yields every (opcode, argument) pair of a pattern parsed by re._parser, including nested groups
+    for op, av in parsed:
+        yield op, av
+        stack = [av]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, re._parser.SubPattern):
+                yield from _iter_parse_tree(item)
+            elif isinstance(item, (list, tuple)):
+                stack.extend(item)
+
+
+def _anchors_at_string_end(compiled):
+    # A `$` without re.MULTILINE (or \Z) would match at the end of every shard, not just the end of the input
+    parsed = re._parser.parse(compiled.pattern, compiled.flags)
+    for op, av in _iter_parse_tree(parsed):
+        if op is re._constants.AT and av is re._constants.AT_END_STRING:
+            return True
+        if op is re._constants.AT and av is re._constants.AT_END:
+            if not compiled.flags & re.MULTILINE:
+                return True
+    return False
+
+
+def _line_aligned_shards(data, shard_count):
+    size = len(data)
+    boundaries = [0]
+    for index in range(1, shard_count):
+        cut = data.find(b"\n", max(size * index // shard_count, boundaries[-1]))
+        if cut == -1:
+            break
+        if cut + 1 > boundaries[-1]:
+            boundaries.append(cut + 1)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def _findall_in_file(compiled, path):
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return compiled.findall(b"")  # an empty file cannot be memory mapped
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return compiled.findall(data)
+
+
+def _findall_item(match):
+    # What findall() returns for one match: the whole match, the only group, or a tuple of all groups.
+    # The empty value comes from the pattern, as a slice of match.string would be a view of a shared block.
+    empty = match.re.pattern[:0]
+    if match.re.groups == 0:
+        return match.group()
+    if match.re.groups == 1:
+        return match.group(1) or empty
+    return match.groups(empty)
+
+
+def _shard_matches(compiled, data, start, end, endpos):
+    # The matches that start in [start, end). The search may read on up to endpos (the end of the next shard), so
+    # matches running past `end`, lookaheads and `$` see the same text as in a single search over all the data
+    found = []
+    for match in compiled.finditer(data, start, endpos):
+        if match.start() >= end and end < endpos:
+            break  # also drops the empty match at `end`, which the next shard finds again
+        found.append((match.start(), match.end(), _findall_item(match)))
+    return found
+
+
+def _resync_shard(compiled, data, position, end, endpos, found):
+    # The previous shard's last match ended at `position`, inside this shard, so the matches this shard found from
+    # its own start may be wrong. Search again from `position` until a match lines up with one the shard found;
+    # from then on both searches are in the same state and the shard's results are right.
+    spans = {(start, stop): index for index, (start, stop, _) in enumerate(found)}
+    redone = []
+    for match in compiled.finditer(data, position, endpos):
+        if match.start() >= end and end < endpos:
+            break
+        index = spans.get(match.span())
+        if index is not None:
+            return redone + found[index:]
+        redone.append((match.start(), match.end(), _findall_item(match)))
+    return redone
+
+
+def _search_shard(task):
+    source_kind, source, start, end, endpos, pattern, flags = task
+    compiled = pattern_registry.compile(pattern, flags)
+    if source_kind == "path":
+        with open(source, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _shard_matches(compiled, data, start, end, endpos)
+    block = shared_memory.SharedMemory(name=source)
+    try:
+        # The matched bytes are copied out, so no view of the block outlives this call
+        return _shard_matches(compiled, block.buf, start, end, endpos)
+    finally:
+        block.close()
+
+
+def _merge_shards(compiled, source, is_path, shards, shard_results):
+    results = []
+    position = 0
+    data = file = None
+    try:
+        for index, ((start, end), found) in enumerate(zip(shards, shard_results)):
+            if position > start:
+                if data is None:
+                    if is_path:
+                        file = open(source, "rb")
+                        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                    else:
+                        data = source
+                endpos = shards[index + 1][1] if index + 1 < len(shards) else len(data)
+                found = _resync_shard(compiled, data, position, end, endpos, found)
+            results.extend(item for _, _, item in found)
+            if found:
+                position = found[-1][1]
+    finally:
+        if file is not None:
+            data.close()
+            file.close()
+    return results
+
+
+def parallel_findall(
+    pattern, source, flags=0, processes=None, min_parallel_bytes=None, pool=None
+):
+    """
+    Returns the same list as findall() over `source`, searching line-aligned shards in a process pool.
+
+    `source` is a bytes-like buffer or the path of a file. Inputs smaller than `min_parallel_bytes`
+    (default: parallel_crossover_bytes) are searched in the calling process.
+    """
+    compiled = _as_bytes_pattern(pattern, flags)
+    if min_parallel_bytes is None:
+        min_parallel_bytes = parallel_crossover_bytes
+    processes = processes or multiprocessing.cpu_count()
+    is_path = isinstance(source, (str, os.PathLike))
+    size = os.path.getsize(source) if is_path else len(source)
+    # An empty input cannot be put in shared memory or mmapped, and has nothing to split anyway
+    if size == 0 or size < min_parallel_bytes or processes < 2 or _anchors_at_string_end(compiled):
+        if is_path:
+            return _findall_in_file(compiled, source)
+        return compiled.findall(source)
+    block = None
+    try:
+        if is_path:
+            source_kind, source_name = "path", os.fspath(source)
+            with open(source, "rb") as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    shards = _line_aligned_shards(data, processes * 4)
+        else:
+            # One copy into shared memory instead of pickling the data for every worker
+            block = shared_memory.SharedMemory(create=True, size=size)
+            block.buf[:size] = source
+            source_kind, source_name = "shm", block.name
+            shards = _line_aligned_shards(source, processes * 4)
+        # Each shard may read on to the end of the next one, for matches that start in it but run past its end
+        endposes = [end for _, end in shards[1:]] + [size]
+        tasks = [
+            (source_kind, source_name, start, end, endpos, compiled.pattern, compiled.flags)
+            for (start, end), endpos in zip(shards, endposes)
+        ]
+        if pool is not None:
+            shard_results = pool.map(_search_shard, tasks)
+        else:
+            resource_tracker.ensure_running()
+            with multiprocessing.Pool(processes=processes) as own_pool:
+                shard_results = own_pool.map(_search_shard, tasks)
+    finally:
+        if block is not None:
+            block.close()
+            block.unlink()
+    return _merge_shards(compiled, source, is_path, shards, shard_results)
+
+
+def measure_parallel_crossover(pattern, sample, sizes, processes=None, pool=None):
+    # Returns the smallest input size (in bytes) at which parallel_findall beats a single findall, or None
+    compiled = _as_bytes_pattern(pattern)
+    for size in sizes:
+        data = sample * (size // len(sample) + 1)
+        single_time = min(timeit.repeat(lambda: compiled.findall(data), number=1, repeat=3))
+        parallel_time = min(
+            timeit.repeat(
+                lambda: parallel_findall(
+                    compiled, data, processes=processes, min_parallel_bytes=0, pool=pool
+                ),
+                number=1,
+                repeat=3,
+            )
+        )
+        if parallel_time < single_time:
+            return size
+    return None
+
+
+# Example: measure where the pool starts paying off on this machine, then search a buffer in parallel
+# Workers that attach to a shared memory block register it with the resource tracker. Starting the tracker
+# before the pool makes the workers share the parent's tracker, so the block is only cleaned up once.
+# The pool is only started when this file is run as a script: with the "spawn" and "forkserver" start methods each
+# worker imports the main module again, which would otherwise start pools of its own
+if __name__ == "__main__":
+    resource_tracker.ensure_running()
+    with multiprocessing.Pool(processes=4) as regex_pool:
+        measured_crossover = measure_parallel_crossover(
+            lookbehind_pattern,
+            log_bytes,
+            sizes=[1 << 16, 1 << 20, 8 << 20],
+            processes=4,
+            pool=regex_pool,
+        )
+        # None means the pool never won, for example on a single-core machine
+        parallel_crossover_bytes = measured_crossover or float("inf")
+        if measured_crossover is None:
+            print("Parallel search never paid off on this machine")
+        else:
+            print(f"Parallel search pays off from {measured_crossover} bytes")
+        # Output (depends on the machine): Parallel search pays off from 1048576 bytes
+        large_log = log_bytes * 2000
+        parallel_prices = parallel_findall(
+            lookbehind_pattern, large_log, processes=4, min_parallel_bytes=0, pool=regex_pool
+        )
+        single_prices = _as_bytes_pattern(lookbehind_pattern).findall(large_log)
+        print(parallel_prices == single_prices)  # Output: True
+        # Patterns that can match the empty string, or match across a shard boundary, give the same list too
+        boundary_data = b"aa\nbab\n \n a\n" * 50
+        for boundary_pattern in [rb"a*", rb"(?m)^", rb"x?", rb"a$", rb"(?m)a$", rb"\s+", rb"b(?=a)", rb"(a)|(\n)"]:
+            assert parallel_findall(
+                boundary_pattern, boundary_data, processes=4, min_parallel_bytes=0, pool=regex_pool
+            ) == re.compile(boundary_pattern).findall(boundary_data), boundary_pattern
+        with tempfile.NamedTemporaryFile(suffix=".log", delete=False) as boundary_file:
+            boundary_file.write(boundary_data)
+        assert parallel_findall(
+            rb"\s+", boundary_file.name, processes=4, min_parallel_bytes=0, pool=regex_pool
+        ) == re.findall(rb"\s+", boundary_data)
+        os.remove(boundary_file.name)
+        # Empty input is searched in this process: it cannot go into shared memory or an mmap
+        assert parallel_findall(rb"a*", b"", processes=2, min_parallel_bytes=0, pool=regex_pool) == [b""]
+        with tempfile.NamedTemporaryFile(suffix=".log", delete=False) as empty_file:
+            pass
+        assert parallel_findall(rb"a", empty_file.name, processes=2, min_parallel_bytes=0, pool=regex_pool) == []
+        os.remove(empty_file.name)
+# Skipping the regex engine with a required-literal prefilter
+# Most patterns contain text that every match must include: " dollars" in the lookahead example, "$" in the lookbehind
+# example and "-" in the number pattern. If that text is missing from a line, the regex cannot match it, and
+# `in`/str.find (which use a fast memchr-style search in C) can tell us so far more cheaply than the regex engine.
+# required_literals() pulls those substrings out of the parsed pattern, and PrefilteredPattern wraps a compiled
+# pattern so that calls on inputs missing a required literal return the "no match" result without running the regex.
+# Only mandatory parts of the pattern count: optional groups, repeats that may run zero times, alternations and
+# negative lookarounds are skipped. With re.IGNORECASE only characters that have no case are used, because the
+# engine's case-insensitive rules are broader than str.lower().
+
+
+def required_literals(compiled):
+    _constants = re._constants
+    ignore_case = compiled.flags & re.IGNORECASE
+    to_text = chr if isinstance(compiled.pattern, str) else lambda code: bytes([code])
+    empty = "" if isinstance(compiled.pattern, str) else b""
+    literals = []
+
+    def collect(sequence, ignore_case):
+        run = []
+        for op, av in sequence:
+            if op is _constants.LITERAL:
+                char = to_text(av)
+                if not (ignore_case and char.upper() != char.lower()):
+                    run.append(char)
+                    continue
+            if op is _constants.AT:
+                continue  # anchors do not consume text, so the literals around them stay adjacent
+            if run:
+                literals.append(empty.join(run))
+                run = []
+            if op is _constants.SUBPATTERN:
+                add_flags, del_flags = av[1], av[2]
+                scoped_ignore_case = ignore_case or add_flags & re.IGNORECASE
+                collect(av[3], scoped_ignore_case and not del_flags & re.IGNORECASE)
+            elif op in (
+                _constants.MAX_REPEAT,
+                _constants.MIN_REPEAT,
+                _constants.POSSESSIVE_REPEAT,
+            ):
+                if av[0] >= 1:
+                    collect(av[2], ignore_case)
+            elif op is _constants.ATOMIC_GROUP:
+                collect(av, ignore_case)
+            elif op is _constants.ASSERT:
+                collect(av[1], ignore_case)  # lookahead/lookbehind text must also be present
+        if run:
+            literals.append(empty.join(run))
+
+    parsed = re._parser.parse(compiled.pattern, compiled.flags)
+    collect(parsed, ignore_case or parsed.state.flags & re.IGNORECASE)
+    # Longest first: it is the most selective check, and `all()` stops at the first missing literal
+    return sorted(set(literals), key=len, reverse=True)
+
+
+class PrefilteredPattern:
+    """A compiled pattern that skips the regex engine when a required literal is missing."""
+
+    def __init__(self, pattern, flags=0):
+        pattern = _resolve_pattern(pattern)
+        if not isinstance(pattern, re.Pattern):
+            pattern = pattern_registry.compile(pattern, flags)
+        self.compiled = pattern
+        self.literals = required_literals(pattern)
+        self.skipped = 0
+
+    def may_match(self, string):
+        for literal in self.literals:
+            if literal not in string:
+                self.skipped += 1
+                return False
+        return True
+
+    def search(self, string, *args):
+        return self.compiled.search(string, *args) if self.may_match(string) else None
+
+    def match(self, string, *args):
+        return self.compiled.match(string, *args) if self.may_match(string) else None
+
+    def fullmatch(self, string, *args):
+        if not self.may_match(string):
+            return None
+        return self.compiled.fullmatch(string, *args)
+
+    def findall(self, string, *args):
+        return self.compiled.findall(string, *args) if self.may_match(string) else []
+
+    def finditer(self, string, *args):
+        if not self.may_match(string):
+            return iter(())
+        return self.compiled.finditer(string, *args)
+
+    def split(self, string, maxsplit=0):
+        if not self.may_match(string):
+            return [string]
+        return self.compiled.split(string, maxsplit)
+
+    def sub(self, repl, string, count=0):
+        if not self.may_match(string):
+            return string
+        return self.compiled.sub(repl, string, count)
+
+    def subn(self, repl, string, count=0):
+        if not self.may_match(string):
+            return string, 0
+        return self.compiled.subn(repl, string, count)
+
+    def __getattr__(self, name):
+        # pattern, flags, groups, groupindex, ... come straight from the wrapped pattern
+        return getattr(self.compiled, name)
+
+    def __repr__(self):
+        return f"PrefilteredPattern({self.compiled!r}, literals={self.literals!r})"
+
+
+print(PrefilteredPattern(lookahead_pattern).literals)  # Output: [' dollars']
+print(PrefilteredPattern(lookbehind_pattern).literals)  # Output: ['$']
+print(PrefilteredPattern(non_capturing_pattern).literals)  # Output: ['-']
+print(PrefilteredPattern(pattern, re.IGNORECASE).literals)  # Output: []
+print(PrefilteredPattern(word_boundary_pattern).literals)  # Output: ['word']
+# Lazy patterns from register(..., lazy=True) are unwrapped, so they are accepted like compiled ones
+lazy_dollars = pattern_registry.lazy(lookahead_pattern)
+assert PrefilteredPattern(lazy_dollars).compiled is lazy_dollars.compiled
+assert _as_bytes_pattern(lazy_dollars).pattern == lookahead_pattern.encode("utf-8")
+# Benchmark: most log lines never mention dollars, so most searches never reach the regex engine.
+# Without the prefilter, r"\d+(?= dollars)" tries the lookahead after every run of digits on every line.
+prefilter_lines = [
+    f"{number:05d} GET /item/{number} 200 {number * 31} bytes in {number % 97} ms" * 3
+    for number in range(19)
+] + ["order 7 paid 100 dollars and 50 cents"]
+prefilter_lines = prefilter_lines * 1000
+amount_pattern = pattern_registry.get("dollar_amount")
+prefiltered_amount = PrefilteredPattern(amount_pattern)
+assert [amount_pattern.findall(line) for line in prefilter_lines] == [
+    prefiltered_amount.findall(line) for line in prefilter_lines
+]
+plain_time = timeit.timeit(
+    lambda: [amount_pattern.findall(line) for line in prefilter_lines], number=3
+)
+prefiltered_time = timeit.timeit(
+    lambda: [prefiltered_amount.findall(line) for line in prefilter_lines], number=3
+)
+print(f"Plain regex: {plain_time:.3f}s, with prefilter: {prefiltered_time:.3f}s")
+# Output (timings vary by machine): Plain regex: 0.444s, with prefilter: 0.066s
+# Extracting from bytes without decoding every line
+# Log files are usually ASCII or UTF-8. Decoding them to str before matching means holding a second, decoded copy.
+# A bytes pattern runs directly over bytes, memoryview and mmap buffers, and for ASCII input `\d`, `\w`, `\s`, `\b` and
+# re.IGNORECASE behave exactly like their str counterparts. BytesExtractor compiles a bytes variant of each registered
+# pattern and only decodes the groups the caller actually asks for.
+
+
+class LazyMatch:
+    """Wraps a bytes re.Match and decodes groups to str only when they are read."""
+
+    __slots__ = ("raw", "encoding")
+
+    def __init__(self, raw, encoding="utf-8"):
+        self.raw = raw
+        self.encoding = encoding
+
+    def _decode(self, value):
+        # Groups of memoryview input come back as memoryview slices, which str() decodes without another copy
+        return None if value is None else str(value, self.encoding)
+
+    def group(self, *groups):
+        values = self.raw.group(*groups)
+        if len(groups) > 1:
+            return tuple(self._decode(value) for value in values)
+        return self._decode(values)
+
+    def __getitem__(self, group):
+        return self.group(group)
+
+    def groups(self, default=None):
+        return tuple(
+            default if value is None else self._decode(value) for value in self.raw.groups()
+        )
+
+    def groupdict(self, default=None):
+        return {
+            name: default if value is None else self._decode(value)
+            for name, value in self.raw.groupdict().items()
+        }
+
+    def start(self, group=0):
+        return self.raw.start(group)
+
+    def end(self, group=0):
+        return self.raw.end(group)
+
+    def span(self, group=0):
+        return self.raw.span(group)
+
+    def __repr__(self):
+        return f"<LazyMatch span={self.span()!r}>"
+
+
+class BytesExtractor:
+    """Runs bytes variants of registered str patterns over bytes-like buffers."""
+
+    def __init__(self, registry=None, names=None, encoding="utf-8"):
+        self.registry = pattern_registry if registry is None else registry
+        self.encoding = encoding
+        self.patterns = {}
+        for name in names if names is not None else self.registry.names():
+            pattern = self.registry.get(name)
+            if isinstance(pattern.pattern, str) and not pattern.pattern.isascii():
+                continue  # non-ASCII literals would only match UTF-8 input, so keep those on the str path
+            try:
+                self.patterns[name] = _as_bytes_pattern(pattern)
+            except re.error:
+                continue  # str-only syntax such as \U escapes
+
+    def finditer(self, name, buffer, pos=0, endpos=sys.maxsize):
+        encoding = self.encoding
+        for raw in self.patterns[name].finditer(buffer, pos, endpos):
+            yield LazyMatch(raw, encoding)
+
+    def search(self, name, buffer, pos=0, endpos=sys.maxsize):
+        raw = self.patterns[name].search(buffer, pos, endpos)
+        return None if raw is None else LazyMatch(raw, self.encoding)
+
+    def findall(self, name, buffer):
+        # Decodes everything, returning exactly what findall() on the decoded text returns
+        found = self.patterns[name].findall(buffer)
+        if self.patterns[name].groups > 1:
+            return [tuple(str(value, self.encoding) for value in item) for item in found]
+        return [str(item, self.encoding) for item in found]
+
+    def finditer_file(self, name, path, **scan_options):
+        # Streams a file through scan_file(); offsets in the result are relative to each chunk
+        for _, _, raw in scan_file(self.patterns[name], path, **scan_options):
+            yield LazyMatch(raw, self.encoding)
+
+
+bytes_extractor = BytesExtractor()
+print(sorted(bytes_extractor.patterns)[:4])  # Output: ['again_end', 'cat_or_dog', 'date', 'date_verbose']
+log_view = memoryview(log_bytes)
+first_date = bytes_extractor.search("date", log_view)
+print(first_date.group("year"), first_date.span())  # Output: 2023 (0, 10)
+log_text = log_bytes.decode("utf-8")
+for name in ["date", "price", "word_pair", "hello"]:
+    assert bytes_extractor.findall(name, log_view) == pattern_registry.get(name).findall(log_text)
+# Benchmark: decode the whole buffer and match as str, against matching the same buffer as raw bytes and decoding
+# only the year. Both sides make one finditer() pass over the whole buffer, so only the decoding differs.
+bytes_benchmark_log = log_bytes * 2000
+date_pattern = pattern_registry.get("date")
+str_time = timeit.timeit(
+    lambda: [
+        match.group("year")
+        for match in date_pattern.finditer(bytes_benchmark_log.decode("utf-8"))
+    ],
+    number=3,
+)
+bytes_time = timeit.timeit(
+    lambda: [
+        match.group("year")
+        for match in bytes_extractor.finditer("date", memoryview(bytes_benchmark_log))
+    ],
+    number=3,
+)
+print(f"Decode then match: {str_time:.3f}s, bytes with lazy decode: {bytes_time:.3f}s")
+# Output (timings vary by machine): Decode then match: 0.331s, bytes with lazy decode: 0.424s
+# Decoding ASCII-only UTF-8 is a fast bulk copy, so here it costs less than wrapping every hit in a LazyMatch; the
+# bytes path is not faster on its own. What it saves is the decoded copy: a memoryview or mmap of a large file is
+# searched in place, while decoding first needs the whole text in memory as a second, str-sized buffer.
+# Extracting named groups into typed columns
+# finditer() creates a Match object per hit and .group("year") a new str per call, so a million dates cost millions of
+# small objects. ColumnExtractor keeps one column per named group instead. Each line is matched on its own with
+# findall(), which returns plain tuples (so ^, $ and \s behave as in a per-line loop), and the matches of a block of
+# lines are transposed with zip() in one go. Groups made only of digits, such as
+# (?P<year>\d{4}), are converted in bulk with array.array(typecode, map(int, column)) into compact typed arrays
+# (see 042_memory_management_tips.py). The typecode is the smallest one that fits the longest possible value:
+# "H" for up to 4 digits, "L" for up to 9 and "Q" for up to 19. Other groups, and groups that may not take part
+# in a match, stay lists of str (or bytes).
+import array
+import itertools
+
+_DIGIT_TYPECODES = [(4, "H"), (9, "L"), (19, "Q")]
+
+
+def _digit_run_length(sequence):
+    # Returns the (shortest, longest) run of digits a parsed sequence can match, or None if it can match anything else
+    _constants = re._constants
+    shortest = longest = 0
+    for op, av in sequence:
+        if op is _constants.IN:
+            for item_op, item_av in av:
+                if item_op is _constants.CATEGORY and item_av is _constants.CATEGORY_DIGIT:
+                    continue
+                if item_op is _constants.RANGE and 48 <= item_av[0] <= item_av[1] <= 57:
+                    continue
+                if item_op is _constants.LITERAL and 48 <= item_av <= 57:
+                    continue
+                return None
+            shortest, longest = shortest + 1, longest + 1
+        elif op is _constants.LITERAL and 48 <= av <= 57:
+            shortest, longest = shortest + 1, longest + 1
+        elif op in (_constants.MAX_REPEAT, _constants.MIN_REPEAT, _constants.POSSESSIVE_REPEAT):
+            body = _digit_run_length(av[2])
+            if body is None or av[1] is _constants.MAXREPEAT:
+                return None
+            shortest, longest = shortest + body[0] * av[0], longest + body[1] * av[1]
+        elif op in (_constants.SUBPATTERN, _constants.ATOMIC_GROUP):
+            body = _digit_run_length(av[3] if op is _constants.SUBPATTERN else av)
+            if body is None:
+                return None
+            shortest, longest = shortest + body[0], longest + body[1]
+        else:
+            return None
+    return shortest, longest
+
+
+def _numeric_typecodes(compiled):
+    # Maps group number -> array typecode for every group that always matches a non-empty, bounded run of digits
+    _constants = re._constants
+    typecodes = {}
+
+    def visit(sequence, optional):
+        for op, av in sequence:
+            if op is _constants.SUBPATTERN:
+                group, body = av[0], av[3]
+                run = None if optional or group is None else _digit_run_length(body)
+                for limit, typecode in _DIGIT_TYPECODES:
+                    # An empty group would leave nothing for int() to convert
+                    if run is not None and run[0] > 0 and run[1] <= limit:
+                        typecodes[group] = typecode
+                        break
+                visit(body, optional)
+            elif op in (_constants.MAX_REPEAT, _constants.MIN_REPEAT, _constants.POSSESSIVE_REPEAT):
+                # A group inside a repeat only keeps its last repetition, and none at all if it ran zero times
+                visit(av[2], optional or av[0] == 0)
+            elif op is _constants.BRANCH:
+                for branch in av[1]:
+                    visit(branch, True)
+            elif op is _constants.ATOMIC_GROUP:
+                visit(av, optional)
+            elif op is _constants.ASSERT:
+                visit(av[1], optional)
+            elif op is _constants.GROUPREF_EXISTS:
+                visit(av[1], True)
+                if av[2] is not None:
+                    visit(av[2], True)
+
+    visit(re._parser.parse(compiled.pattern, compiled.flags), False)
+    return typecodes
+
+
+class ColumnExtractor:
+    """Collects every match of a pattern's named groups into one column per group."""
+
+    def __init__(self, pattern, flags=0, block_lines=4096):
+        pattern = _resolve_pattern(pattern)
+        if not isinstance(pattern, re.Pattern):
+            pattern = pattern_registry.compile(pattern, flags)
+        if not pattern.groupindex:
+            raise ValueError("the pattern has no named groups")
+        self.compiled = pattern
+        self.block_lines = block_lines
+        typecodes = _numeric_typecodes(pattern)
+        # Group order, not name order, so columns line up with the tuples findall() returns
+        self.names = sorted(pattern.groupindex, key=pattern.groupindex.get)
+        self._indexes = [pattern.groupindex[name] - 1 for name in self.names]
+        self.columns = {
+            name: array.array(typecodes[pattern.groupindex[name]])
+            if pattern.groupindex[name] in typecodes
+            else []
+            for name in self.names
+        }
+
+    def extend(self, text):
+        # Appends the groups of every match in `text` (a str or bytes)
+        return self._append(self.compiled.findall(text))
+
+    def _append(self, found):
+        if not found:
+            return 0
+        if self.compiled.groups == 1:
+            found = [(value,) for value in found]
+        transposed = list(zip(*found))
+        for name, index in zip(self.names, self._indexes):
+            column = self.columns[name]
+            if isinstance(column, array.array):
+                # int() accepts both str and bytes digits, and map() runs the conversion without a Python loop
+                column.extend(map(int, transposed[index]))
+            else:
+                column.extend(transposed[index])
+        return len(found)
+
+    def extend_lines(self, lines):
+        # Matches an iterable of lines (such as an open file) block by block, so the input is never fully in memory
+        lines = iter(lines)
+        while True:
+            block = list(itertools.islice(lines, self.block_lines))
+            if not block:
+                return self
+            # Lines are not joined: matches must not run from one line into the next, and anchors must see each line
+            self._append(list(itertools.chain.from_iterable(map(self.compiled.findall, block))))
+
+    def __len__(self):
+        return len(self.columns[self.names[0]])
+
+    def nbytes(self):
+        return sum(
+            column.itemsize * len(column)
+            for column in self.columns.values()
+            if isinstance(column, array.array)
+        )
+
+    def to_numpy(self):
+        """Returns the columns as NumPy arrays; typed columns share memory with the array.array buffers."""
+        import numpy
+
+        return {
+            name: numpy.frombuffer(column, dtype=column.typecode)
+            if isinstance(column, array.array)
+            else numpy.array(column)
+            for name, column in self.columns.items()
+        }
+
+
+date_columns = ColumnExtractor(pattern_registry.get("date"))
+print({name: column.typecode for name, column in date_columns.columns.items()})
+# Output: {'year': 'H', 'month': 'H', 'day': 'H'}
+date_columns.extend_lines(log_text.splitlines(keepends=True))
+print(len(date_columns), date_columns.columns["day"][:5])
+# Output: 28 array('H', [1, 2, 3, 4, 5])
+assert len(ColumnExtractor(pattern_registry.lazy(date_pattern.pattern)).extend_lines(log_text.splitlines())) == 28
+# Each line is matched on its own, with or without its line ending, exactly like a per-line finditer() loop
+for column_pattern, column_lines in [
+    (r"(?P<n>\d+)", ["12", "34"]),
+    (r"^(?P<n>\d+)$", ["12\n", "34\n", "5x\n"]),
+    (r"(?P<n>\d+)\s(?P<rest>\S*)", ["12\n", "34 ab", "56"]),
+]:
+    per_line = ColumnExtractor(column_pattern, block_lines=2).extend_lines(column_lines)
+    compiled_column_pattern = pattern_registry.compile(column_pattern)
+    expected = [match.group("n") for line in column_lines for match in compiled_column_pattern.finditer(line)]
+    assert list(map(int, per_line.columns["n"])) == list(map(int, expected)), column_pattern
+order_columns = ColumnExtractor(
+    _as_bytes_pattern(r"order (?P<order>\d+) paid \$(?P<amount>\d{1,6}) for (?P<item>\w+ \d+)")
+)
+order_columns.extend_lines(log_bytes.splitlines(keepends=True))
+print(order_columns.columns["amount"][:3], order_columns.columns["item"][:2])
+# Output: array('L', [10, 20, 30]) [b'item 1', b'item 2']
+try:
+    date_arrays = date_columns.to_numpy()
+    print(date_arrays["month"].dtype, date_arrays["day"].max())  # Output: uint16 28
+except ImportError:
+    print("NumPy is not installed, so the columns stay as array.array.")
+# Benchmark: a Match object and three group() calls per date, against typed columns filled in bulk
+column_benchmark_lines = log_text.splitlines(keepends=True) * 5000
+date_pattern = pattern_registry.get("date")
+
+
+def _dates_per_match():
+    years, months, days = [], [], []
+    for line in column_benchmark_lines:
+        for match in date_pattern.finditer(line):
+            years.append(int(match.group("year")))
+            months.append(int(match.group("month")))
+            days.append(int(match.group("day")))
+    return years, months, days
+
+
+per_match_time = timeit.timeit(_dates_per_match, number=3)
+column_time = timeit.timeit(
+    lambda: ColumnExtractor(date_pattern).extend_lines(column_benchmark_lines), number=3
+)
+years, months, days = _dates_per_match()
+benchmark_columns = ColumnExtractor(date_pattern).extend_lines(column_benchmark_lines)
+assert list(benchmark_columns.columns["day"]) == days
+print(f"Match objects: {per_match_time:.3f}s, typed columns: {column_time:.3f}s")
+# Output (timings vary by machine): Match objects: 1.543s, typed columns: 1.042s
+# Months and days are below 257, so Python shares those int objects; every year is a separate object
+list_bytes = sum(map(sys.getsizeof, (years, months, days))) + sum(map(sys.getsizeof, years))
+print(f"Lists of int: {list_bytes} bytes, typed columns: {benchmark_columns.nbytes()} bytes")
+# Output: Lists of int: 7341704 bytes, typed columns: 840000 bytes
+# Translating Unicode property escapes for the built-in engine
+# `re` does not understand `\p{L}` (it raises "bad escape \p"), and the third-party `regex` module that does is slower
+# than `re` for simple classes and expensive to import. Most property escapes are just large character classes,
+# so they can be expanded ahead of time into ordinary `re` ranges built from `unicodedata`:
+# - general categories: \p{L}, \p{Lu}, \p{N}, \p{Nd}, \p{P}, ... and the long names such as \p{Letter},
+# - scripts: \p{Latin}, \p{Greek}, \p{Han}, \p{Script=Cyrillic}, ... unicodedata has no script table, so this is
+#   an approximation built from the character names, e.g. "GREEK SMALL LETTER ALPHA". Only letters and marks are
+#   kept, because names such as "LATIN CROSS" or "ARABIC COMMA" belong to symbols and punctuation that Unicode
+#   assigns to the Common script. Script-specific digits and signs (THAI DIGIT ZERO, ...) are left out as well,
+# - negations: \P{L} and \p{^L}, inside or outside of [...].
+# Computing a class walks all 1.1 million code points, so the ranges are cached on disk per Unicode version,
+# in the same per-user cache directory as the compiled pattern code.
+import os
+import sys
+import unicodedata
+
+_CATEGORY_ALIASES = {
+    "Letter": "L",
+    "Cased_Letter": "LC",
+    "L&": "LC",
+    "Uppercase_Letter": "Lu",
+    "Lowercase_Letter": "Ll",
+    "Titlecase_Letter": "Lt",
+    "Modifier_Letter": "Lm",
+    "Other_Letter": "Lo",
+    "Mark": "M",
+    "Number": "N",
+    "Decimal_Number": "Nd",
+    "Punctuation": "P",
+    "Symbol": "S",
+    "Separator": "Z",
+    "Other": "C",
+}
+_SCRIPT_NAME_PREFIXES = {
+    "Latin": ("LATIN ",),
+    "Greek": ("GREEK ",),
+    "Cyrillic": ("CYRILLIC ",),
+    "Armenian": ("ARMENIAN ",),
+    "Hebrew": ("HEBREW ",),
+    "Arabic": ("ARABIC ",),
+    "Devanagari": ("DEVANAGARI ",),
+    "Bengali": ("BENGALI ",),
+    "Thai": ("THAI ",),
+    "Georgian": ("GEORGIAN ",),
+    "Hangul": ("HANGUL ",),
+    "Hiragana": ("HIRAGANA ",),
+    "Katakana": ("KATAKANA ",),
+    "Han": ("CJK UNIFIED IDEOGRAPH", "CJK COMPATIBILITY IDEOGRAPH"),
+}
+unicode_class_cache_path = os.path.join(
+    private_cache_dir, f"unicode_property_classes_{unicodedata.unidata_version}.json"
+)
+_unicode_classes = None  # property name -> list of [first, last] code point ranges
+
+
+def _ranges(code_points):
+    ranges = []
+    for code_point in code_points:
+        if ranges and ranges[-1][1] == code_point - 1:
+            ranges[-1][1] = code_point
+        else:
+            ranges.append([code_point, code_point])
+    return ranges
+
+
+def _valid_ranges(ranges):
+    # Sorted, non-overlapping [first, last] pairs inside the code point space
+    if not isinstance(ranges, list):
+        return False
+    next_start = 0
+    for pair in ranges:
+        if not (isinstance(pair, list) and len(pair) == 2 and all(type(value) is int for value in pair)):
+            return False
+        first, last = pair
+        if not next_start <= first <= last <= sys.maxunicode:
+            return False
+        next_start = last + 1
+    return True
+
+
+def _load_unicode_classes():
+    global _unicode_classes
+    if _unicode_classes is None:
+        saved = _load_private_json(unicode_class_cache_path)
+        # A damaged or unexpected cache is ignored and the classes are rebuilt
+        if isinstance(saved, dict) and all(
+            isinstance(name, str) and _valid_ranges(ranges) for name, ranges in saved.items()
+        ):
+            _unicode_classes = saved
+        else:
+            _unicode_classes = {}
+    return _unicode_classes
+
+
+def _save_unicode_classes():
+    try:
+        _save_private_json(unicode_class_cache_path, _unicode_classes)
+    except OSError:
+        pass  # the cache is an optimisation only
+
+
+def _build_general_categories(classes):
+    # One pass over every code point fills all 30 two-letter categories at once
+    members = {}
+    for code_point in range(sys.maxunicode + 1):
+        members.setdefault(unicodedata.category(chr(code_point)), []).append(code_point)
+    for category, code_points in members.items():
+        classes[category] = _ranges(code_points)
+    for major in "LMNPSZC":
+        classes[major] = _ranges(
+            sorted(
+                code_point
+                for category, code_points in members.items()
+                if category[0] == major
+                for code_point in code_points
+            )
+        )
+    classes["LC"] = _ranges(sorted(members["Lu"] + members["Ll"] + members["Lt"]))
+
+
+def _build_script(classes, script):
+    # Name-prefix approximation of the Script property, restricted to letters (L*) and marks (M*)
+    prefixes = _SCRIPT_NAME_PREFIXES[script]
+    classes[script] = _ranges(
+        code_point
+        for code_point in range(sys.maxunicode + 1)
+        if unicodedata.category(chr(code_point))[0] in "LM"
+        and unicodedata.name(chr(code_point), "").startswith(prefixes)
+    )
+
+
+def unicode_property_ranges(name):
+    """Returns the [first, last] code point ranges of a general category or script property."""
+    for prefix in ("Script=", "sc="):
+        if name.startswith(prefix):
+            name = name[len(prefix) :]
+    if not name:
+        raise re.error("empty Unicode property name")  # before any table is loaded or built
+    name = _CATEGORY_ALIASES.get(name, name)
+    classes = _load_unicode_classes()
+    if name not in classes:
+        if name in _SCRIPT_NAME_PREFIXES:
+            _build_script(classes, name)
+        elif len(name) <= 2 and name[:1] in "LMNPSZC" and "Lu" not in classes:
+            _build_general_categories(classes)
+        if name not in classes:
+            raise re.error(f"unknown Unicode property {name!r}")
+        _save_unicode_classes()
+    return classes[name]
+
+
+def _complement(ranges):
+    complement = []
+    next_start = 0
+    for first, last in ranges:
+        if first > next_start:
+            complement.append([next_start, first - 1])
+        next_start = last + 1
+    if next_start <= sys.maxunicode:
+        complement.append([next_start, sys.maxunicode])
+    return complement
+
+
+def _class_body(ranges):
+    return "".join(
+        f"\\U{first:08x}" if first == last else f"\\U{first:08x}-\\U{last:08x}"
+        for first, last in ranges
+    )
+
+
+def _standalone_class(ranges):
+    # `re` stores the BMP part of a class as a fast bitmap but checks every range above U+FFFF one by one,
+    # so a character outside the class would be compared against hundreds of astral ranges. Testing the
+    # astral ranges only after a cheap "is this above U+FFFF" lookahead keeps the common case fast.
+    bmp = [[first, min(last, 0xFFFF)] for first, last in ranges if first <= 0xFFFF]
+    astral = [[max(first, 0x10000), last] for first, last in ranges if last > 0xFFFF]
+    if not astral or not bmp:
+        return f"[{_class_body(ranges)}]"
+    astral_guard = "(?=[\\U00010000-\\U0010ffff])"
+    return f"(?:[{_class_body(bmp)}]|{astral_guard}[{_class_body(astral)}])"
+
+
+def translate_unicode_properties(pattern):
+    """Rewrites \\p{...} and \\P{...} escapes in a str pattern into plain `re` character classes."""
+    output = []
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\" and index + 1 < len(pattern):
+            escape = pattern[index + 1]
+            if escape not in "pP":
+                output.append(pattern[index : index + 2])
+                index += 2
+                continue
+            if pattern.startswith("{", index + 2):
+                end = pattern.find("}", index + 3)
+                if end == -1:
+                    raise re.error("missing } in Unicode property escape", pattern, index)
+                name = pattern[index + 3 : end]
+                index = end + 1
+            else:
+                name = pattern[index + 2 : index + 3]  # the short form \pL
+                index += 3
+            negate = escape == "P"
+            if name.startswith("^"):
+                negate, name = not negate, name[1:]
+            ranges = unicode_property_ranges(name)
+            if negate:
+                ranges = _complement(ranges)
+            output.append(_class_body(ranges) if in_class else _standalone_class(ranges))
+            continue
+        if char == "[" and not in_class:
+            in_class = True
+            output.append(char)
+            index += 1
+            # A "]" straight after "[" or "[^" is a literal, not the end of the class
+            if pattern.startswith("^", index):
+                output.append("^")
+                index += 1
+            if pattern.startswith("]", index):
+                output.append("]")
+                index += 1
+            continue
+        if char == "]" and in_class:
+            in_class = False
+        output.append(char)
+        index += 1
+    return "".join(output)
+
+
+def compile_unicode_properties(pattern, flags=0):
+    return pattern_registry.compile(translate_unicode_properties(pattern), flags)
+
+
 # Using Unicode properties
 unicode_property_pattern = r"\p{L}+"
 unicode_property_text = "Hello, 世界!"
-unicode_property_matches = re.findall(unicode_property_pattern, unicode_property_text)
+unicode_property_matches = compile_unicode_properties(unicode_property_pattern).findall(
+    unicode_property_text
+)
 print(unicode_property_matches)  # Output: ['Hello', '世界']
 # Unicode properties allow you to match characters based on their properties, such as letter, digit, or category.
 # In this example, the pattern r'\p{L}+' matches one or more Unicode letters, capturing 'Hello' and '世界' from the input text.
-# Note: The `\p{L}` syntax is not directly supported in Python's `re` module. Instead, you can use the `regex` module for Unicode property support.
+# Note: The `\p{L}` syntax is not directly supported in Python's `re` module, which is why the pattern is passed through
+# compile_unicode_properties() above. Alternatively, you can use the `regex` module for Unicode property support.
 # Example using the `regex` module for Unicode properties (Python 3.9+):
 try:
     import regex as re_unicode
@@ -174,5 +1835,38 @@ except ImportError:
         "The 'regex' module is not installed. Please install it to use Unicode properties."
     )
 # Note: The `regex` module can be installed via pip: `pip install regex`
+# Benchmark: translated `re` classes against the `regex` module
+import time
+
+unicode_benchmark_text = "Hello, 世界! Ελληνικά 123 текст. " * 20000
+translated_pattern = compile_unicode_properties(r"\p{L}+")
+print(compile_unicode_properties(r"\p{Han}+").findall(unicode_property_text))  # Output: ['世界']
+# Symbols and punctuation named after a script (LATIN CROSS, ARABIC COMMA) are not part of it
+print(compile_unicode_properties(r"\p{Latin}+|\p{Arabic}+").findall("\u271d é\u060c سلام"))  # Output: ['é', 'سلام']
+print(compile_unicode_properties(r"[\P{L}\s]+").findall("ab, 12 cd"))  # Output: [', 12 ']
+try:
+    compile_unicode_properties(r"\p{}")
+except re.error as error:
+    print(error)  # Output: empty Unicode property name
+translated_time = timeit.timeit(
+    lambda: translated_pattern.findall(unicode_benchmark_text), number=5
+)
+print(f"re with translated classes: {translated_time:.3f}s")
+# Output (timings vary by machine): re with translated classes: 0.377s
+try:
+    import_started = time.perf_counter()
+    import regex as re_unicode
+
+    print(f"Importing regex: {time.perf_counter() - import_started:.3f}s")
+    regex_pattern = re_unicode.compile(r"\p{L}+")
+    assert regex_pattern.findall(unicode_benchmark_text) == translated_pattern.findall(
+        unicode_benchmark_text
+    )
+    regex_time = timeit.timeit(
+        lambda: regex_pattern.findall(unicode_benchmark_text), number=5
+    )
+    print(f"regex module: {regex_time:.3f}s")
+except ImportError:
+    print("The 'regex' module is not installed, so only the translated pattern was timed.")
 # Using the `regex` module allows for more advanced regex features, including Unicode properties, which can be useful for matching characters in different languages and scripts.
 # Using the `regex` module for advanced regex features (Python 3.9+):
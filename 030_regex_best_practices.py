@@ -4,7 +4,9 @@ import re
 
 # 1. Use raw strings:
 #    Always use raw strings (prefix with `r`) for regex patterns to avoid issues with escape sequences.
-char_class_matches = re.findall(char_class_pattern, char_class_text)
+# This lesson continues from 027_syntax_and_patterns.py and reuses its `pattern_registry`,
+# so every pattern below is compiled once and served from the registry afterwards.
+char_class_matches = pattern_registry.get("vowel").findall(char_class_text)
 
 # 2. Use comments:
 #    Use the `re.VERBOSE` flag to write multi-line regex patterns with comments for better readability.
@@ -15,7 +17,9 @@ verbose_pattern = r"""
 -(?P<day>\d{2})  # Match a 2-digit day
 """
 verbose_text = "The date is 2023-10-05."
-verbose_matches = re.search(verbose_pattern, verbose_text, re.VERBOSE)
+verbose_matches = pattern_registry.register(
+    "date_inline_verbose", verbose_pattern, re.VERBOSE
+).search(verbose_text)
 if verbose_matches:
     print(verbose_matches.group("year"))  # Output: 2023
     print(verbose_matches.group("month"))  # Output: 10
@@ -25,7 +29,9 @@ if verbose_matches:
 #    Use character classes to match specific sets of characters, which can make patterns more readable.
 char_class_pattern = r"[a-zA-Z0-9]"
 char_class_text = "Sample text with numbers 123 and letters abc."
-char_class_matches = re.findall(char_class_pattern, char_class_text)
+char_class_matches = pattern_registry.register(
+    "alphanumeric", char_class_pattern
+).findall(char_class_text)
 print(
     char_class_matches
 )  # Output: ['S', 'a', 'm', 'p', 'l', 'e', ' ', 't', 'e', 'x', 't', ' ', 'w', 'i', 't', 'h', ' ', 'n', 'u', 'm', 'b', 'e', 'r', 's', ' ', '1', '2', '3', ' ', 'a', 'n', 'd', ' ', 'l', 'e', 't', 't', 'e', 'r', 's', ' ', 'a', 'b', 'c']
@@ -33,42 +39,52 @@ print(
 #    Use non-capturing groups `(?:...)` when you don't need to capture a group for back-referencing, which can improve performance.
 non_capturing_pattern = r"(?:\d{3})-(\d{2})-(\d{4})"
 non_capturing_text = "My number is 123-45-6789."
-non_capturing_matches = re.findall(non_capturing_pattern, non_capturing_text)
+non_capturing_matches = pattern_registry.compile(non_capturing_pattern).findall(
+    non_capturing_text
+)
 print(non_capturing_matches)  # Output: ['45', '6789']
 # 5. Use anchors:
 #    Use anchors (`^` for start, `$` for end) to specify the position of the match, which can help avoid unnecessary matches.
 anchor_pattern = r"^\d{3}-\d{2}-\d{4}$"
 anchor_text = "123-45-6789"
-anchor_matches = re.findall(anchor_pattern, anchor_text)
+anchor_matches = pattern_registry.register("ssn_anchored", anchor_pattern).findall(
+    anchor_text
+)
 print(anchor_matches)  # Output: ['123-45-6789']
 # 6. Use flags for case sensitivity:
 #    Use flags like `re.IGNORECASE` to perform case-insensitive matching when necessary.
 case_insensitive_pattern = r"hello"
 case_insensitive_text = "Hello world! hello again."
-case_insensitive_matches = re.findall(
-    case_insensitive_pattern, case_insensitive_text, flags=re.IGNORECASE
-)
+case_insensitive_matches = pattern_registry.compile(
+    case_insensitive_pattern, re.IGNORECASE
+).findall(case_insensitive_text)
 print(case_insensitive_matches)  # Output: ['Hello', 'hello']
 # 7. Use flags for multiline matching:
 multiline_text = "First line\nSecond line\nThird line"
 multiline_pattern = r"^\w+"
-multiline_matches = re.findall(multiline_pattern, multiline_text, flags=re.MULTILINE)
+multiline_matches = pattern_registry.compile(multiline_pattern, re.MULTILINE).findall(
+    multiline_text
+)
 print(multiline_matches)  # Output: ['First', 'Second', 'Third']
 # 8. Use flags for logical OR matching:
 or_pattern = r"cat|dog"
 or_text = "I have a cat and a dog."
-or_matches = re.findall(or_pattern, or_text)
+or_matches = pattern_registry.compile(or_pattern).findall(or_text)
 print(or_matches)  # Output: ['cat', 'dog']
 # 9. Use flags for word boundaries:
 word_boundary_pattern = r"\bword\b"
 word_boundary_text = "This is a word in a sentence."
-word_boundary_matches = re.findall(word_boundary_pattern, word_boundary_text)
+word_boundary_matches = pattern_registry.compile(word_boundary_pattern).findall(
+    word_boundary_text
+)
 print(word_boundary_matches)  # Output: ['word']
 # use raw strings to avoid issues with escape sequences
 # for example, use `r"\d"` instead of `"\d"`.
 # Compile regex pattersns:
 #    Compile regex patterns using `re.compile()` for better performance, especially if the pattern is used multiple times.
-compiled_pattern = re.compile(r"\d{3}-\d{2}-\d{4}")
+#    At module level, register with lazy=True so importing the module does not pay for patterns it never uses;
+#    the pattern is compiled by the first findall() below.
+compiled_pattern = pattern_registry.register("ssn", r"\d{3}-\d{2}-\d{4}", lazy=True)
 compiled_text = "My number is 123-45-6789."
 compiled_matches = compiled_pattern.findall(compiled_text)
 print(compiled_matches)  # Output: ['123-45-6789']
@@ -94,3 +110,1142 @@ print(compiled_matches)  # Output: ['123-45-6789']
 #    Recognize when regex is not the best tool for the job. For simple string operations like splitting or replacing, consider using built-in string methods like `str.split()` or `str.replace()`, which are often more efficient and easier to read.
 # Learn and improve:
 #    Regular expressions can be complex, so continuously learn and improve your regex skills. Practice with different patterns and scenarios to become more proficient in crafting efficient and maintainable regex expressions.
+
+# Detecting catastrophic backtracking (items 13 and 14 in practice):
+#    Nested quantifiers such as `(a+)+` or overlapping alternatives such as `(\w|\d)+` give the engine exponentially many ways
+#    to split the same input, so a near-miss like "aaaaaaaaaaaaaaaaaaaaaaaab" can take minutes to fail.
+#    Two adjacent quantifiers over the same characters, such as `\d+\d+`, are not exponential but still cost O(n^2) per attempt.
+#    find_backtracking_risks() parses a pattern with `re._parser` (the parser `re.compile` itself uses) and flags these shapes.
+#    Possessive quantifiers and atomic groups never backtrack into what they matched, so they are not flagged.
+from collections import namedtuple
+
+BacktrackingRisk = namedtuple("BacktrackingRisk", ["severity", "reason"])
+
+_constants = re._constants
+_REPEATS = (_constants.MAX_REPEAT, _constants.MIN_REPEAT)
+# A small alphabet that is enough to tell whether two character sets overlap
+_SAMPLE_CHARS = tuple(chr(code) for code in range(128)) + ("é", "ß", "世", "٣", "\u00a0", "\u2028")
+_CATEGORY_PATTERNS = {
+    _constants.CATEGORY_DIGIT: r"\d",
+    _constants.CATEGORY_NOT_DIGIT: r"\D",
+    _constants.CATEGORY_SPACE: r"\s",
+    _constants.CATEGORY_NOT_SPACE: r"\S",
+    _constants.CATEGORY_WORD: r"\w",
+    _constants.CATEGORY_NOT_WORD: r"\W",
+}
+
+
+_category_cache = {}  # category -> set of _SAMPLE_CHARS characters
+
+
+def _category_chars(category, sample):
+    # Only the shared base sample is cached; a per-pattern sample is small enough to check directly
+    if sample is _SAMPLE_CHARS and category in _category_cache:
+        return _category_cache[category]
+    compiled = re.compile(_CATEGORY_PATTERNS[category])
+    chars = {char for char in sample if compiled.match(char)}
+    if sample is _SAMPLE_CHARS:
+        _category_cache[category] = chars
+    return chars
+
+
+def _single_char_set(op, av, flags, sample):
+    # Returns the characters of `sample` a one-character item can match, or None if the item is not one
+    if op is _constants.LITERAL:
+        chars = {chr(av)}
+    elif op is _constants.NOT_LITERAL:
+        chars = set(sample) - {chr(av)}
+    elif op is _constants.ANY:
+        chars = set(sample) if flags & re.DOTALL else set(sample) - {"\n"}
+    elif op is _constants.IN:
+        chars = set()
+        negate = False
+        for item_op, item_av in av:
+            if item_op is _constants.NEGATE:
+                negate = True
+            elif item_op is _constants.LITERAL:
+                chars.add(chr(item_av))
+            elif item_op is _constants.RANGE:
+                low, high = item_av
+                chars.update(char for char in sample if low <= ord(char) <= high)
+            elif item_op is _constants.CATEGORY and item_av in _CATEGORY_PATTERNS:
+                chars.update(_category_chars(item_av, sample))
+        if negate:
+            chars = set(sample) - chars
+    else:
+        return None
+    if flags & re.IGNORECASE:
+        chars |= {char.swapcase() for char in chars if len(char.swapcase()) == 1}
+    return chars
+
+
+def _children(op, av):
+    # The nested sequences an item contains
+    if op is _constants.SUBPATTERN:
+        return [av[3]]
+    if op in _REPEATS or op is _constants.POSSESSIVE_REPEAT:
+        return [av[2]]
+    if op is _constants.BRANCH:
+        return list(av[1])
+    if op in (_constants.ASSERT, _constants.ASSERT_NOT):
+        return [av[1]]
+    if op is _constants.ATOMIC_GROUP:
+        return [av]
+    if op is _constants.GROUPREF_EXISTS:
+        return [branch for branch in av[1:] if branch is not None]
+    return []
+
+
+def _consumed_chars(sequence, flags, sample):
+    # Every sample character that any part of `sequence` can consume
+    chars = set()
+    for op, av in sequence:
+        single = _single_char_set(op, av, flags, sample)
+        if single is not None:
+            chars |= single
+        elif op is _constants.GROUPREF:
+            chars |= set(sample)
+        elif op not in (_constants.ASSERT, _constants.ASSERT_NOT):
+            for child in _children(op, av):
+                chars |= _consumed_chars(child, flags, sample)
+    return chars
+
+
+def _first_chars(sequence, flags, sample):
+    # The sample characters a match of `sequence` can start with
+    chars = set()
+    for op, av in sequence:
+        single = _single_char_set(op, av, flags, sample)
+        if single is not None:
+            return chars | single
+        if op is _constants.BRANCH:
+            for child in av[1]:
+                chars |= _first_chars(child, flags, sample)
+        elif op in (_constants.SUBPATTERN, _constants.ATOMIC_GROUP, _constants.POSSESSIVE_REPEAT) + _REPEATS:
+            chars |= _first_chars(_children(op, av)[0], flags, sample)
+        elif op is _constants.GROUPREF:
+            chars |= set(sample)
+        if not _is_nullable([(op, av)]):
+            break
+    return chars
+
+
+def _is_nullable(sequence):
+    # True if `sequence` can match the empty string
+    for op, av in sequence:
+        if op in (_constants.AT, _constants.ASSERT, _constants.ASSERT_NOT, _constants.GROUPREF):
+            continue
+        if op in _REPEATS or op is _constants.POSSESSIVE_REPEAT:
+            if av[0] == 0 or _is_nullable(av[2]):
+                continue
+            return False
+        if op in (_constants.SUBPATTERN, _constants.ATOMIC_GROUP):
+            if _is_nullable(_children(op, av)[0]):
+                continue
+            return False
+        if op in (_constants.BRANCH, _constants.GROUPREF_EXISTS):
+            if any(_is_nullable(child) for child in _children(op, av)):
+                continue
+            return False
+        return False
+    return True
+
+
+def _is_unbounded_repeat(op, av):
+    return op in _REPEATS and av[1] == _constants.MAXREPEAT
+
+
+def _adjacent_overlapping_repeats(sequence, flags, sample):
+    # Finds `X* ... Y*` with only optional items in between, where X and Y share characters
+    found = []
+    repeats = [index for index, (op, av) in enumerate(sequence) if _is_unbounded_repeat(op, av)]
+    for left, right in zip(repeats, repeats[1:]):
+        if not _is_nullable(sequence[left + 1 : right]):
+            continue
+        left_chars = _consumed_chars(sequence[left][1][2], flags, sample)
+        right_chars = _consumed_chars(sequence[right][1][2], flags, sample)
+        if left_chars & right_chars:
+            found.append((left, right))
+    return found
+
+
+def _nested_repeat_splits(body):
+    # True if an inner repeat can be split across iterations of the outer one, as in (a+)+ or (\w+\s?)+
+    body = list(body)
+    for index, (op, av) in enumerate(body):
+        others = body[:index] + body[index + 1 :]
+        if not _is_nullable(others):
+            continue
+        if _is_unbounded_repeat(op, av):
+            return True
+        if op is _constants.SUBPATTERN and _nested_repeat_splits(av[3]):
+            return True
+        if op is _constants.BRANCH and any(_nested_repeat_splits(child) for child in av[1]):
+            return True
+    return False
+
+
+def _unwrap_groups(body):
+    # (?:...) and (...) around the whole body do not change how it can backtrack
+    body = list(body)
+    while len(body) == 1 and body[0][0] is _constants.SUBPATTERN:
+        body = list(body[0][1][3])
+    return body
+
+
+def _overlapping_branches(body, flags, sample):
+    for op, av in body:
+        if op is _constants.BRANCH:
+            firsts = [_first_chars(child, flags, sample) for child in av[1]]
+            for index, chars in enumerate(firsts):
+                if any(chars & other for other in firsts[index + 1 :]):
+                    return True
+    return False
+
+
+def _optional_tail_overlaps(body, flags, sample):
+    # (a|aa)+ is parsed as a(?:|a)+: each iteration may or may not take the extra "a", so a run of
+    # a's can be split between iterations in exponentially many ways
+    body_first = _first_chars(body, flags, sample)
+    for op, av in body:
+        if op is _constants.BRANCH and any(_is_nullable(child) for child in av[1]):
+            if any(_first_chars(child, flags, sample) & body_first for child in av[1]):
+                return True
+    return False
+
+
+def _repeat_body_risk(body, flags, sample):
+    body = _unwrap_groups(body)
+    if _is_nullable(body):
+        return "repeated group that can match the empty string, e.g. (a?)+"
+    if _nested_repeat_splits(body):
+        return "nested quantifier, e.g. (a+)+"
+    if _adjacent_overlapping_repeats(body, flags, sample):
+        return "repeated group with overlapping quantifiers, e.g. (a+a+)+"
+    if _overlapping_branches(body, flags, sample):
+        return "repeated alternation whose branches start alike, e.g. (\\w|\\d\\d)+"
+    if _optional_tail_overlaps(body, flags, sample):
+        return "repeated group with an optional part that overlaps its start, e.g. (a|aa)+"
+    return None
+
+
+def _scan_for_risks(sequence, flags, sample, risks):
+    for left, right in _adjacent_overlapping_repeats(sequence, flags, sample):
+        risks.append(
+            BacktrackingRisk(
+                "polynomial",
+                f"adjacent quantifiers #{left} and #{right} can match the same characters",
+            )
+        )
+    for op, av in sequence:
+        child_flags = flags
+        if op is _constants.SUBPATTERN:
+            child_flags = (flags | av[1]) & ~av[2]  # scoped inline flags such as (?i:...)
+        if _is_unbounded_repeat(op, av):
+            reason = _repeat_body_risk(av[2], flags, sample)
+            if reason is not None:
+                risks.append(BacktrackingRisk("exponential", reason))
+        if op in (_constants.ATOMIC_GROUP, _constants.POSSESSIVE_REPEAT):
+            # The engine never backtracks into these from outside; their contents are not analysed
+            continue
+        for child in _children(op, av):
+            _scan_for_risks(child, child_flags, sample, risks)
+
+
+def find_backtracking_risks(pattern, flags=0):
+    """
+    Statically checks a pattern for shapes that can backtrack catastrophically.
+
+    Returns a list of BacktrackingRisk(severity, reason) tuples, where severity is
+    "exponential" or "polynomial". An empty list means no risky shape was found.
+    """
+    pattern = _resolve_pattern(pattern)
+    if isinstance(pattern, re.Pattern):
+        pattern, flags = pattern.pattern, pattern.flags
+    if isinstance(pattern, bytes):
+        pattern = pattern.decode("latin-1")
+    parsed = re._parser.parse(pattern, flags)
+    risks = []
+    _scan_for_risks(list(parsed), parsed.state.flags, _SAMPLE_CHARS, risks)
+    return risks
+
+
+print(find_backtracking_risks(r"(a+)+$"))
+# Output: [BacktrackingRisk(severity='exponential', reason='nested quantifier, e.g. (a+)+')]
+print(find_backtracking_risks(r"(a|aa)+$"))
+# Output: [BacktrackingRisk(severity='exponential', reason='repeated group with an optional part that overlaps its start, e.g. (a|aa)+')]
+print(find_backtracking_risks(r"\d+\d+x"))
+# Output: [BacktrackingRisk(severity='polynomial', reason='adjacent quantifiers #0 and #1 can match the same characters')]
+print(find_backtracking_risks(anchor_pattern), find_backtracking_risks(r"(a++)+$"))  # Output: [] []
+
+# Running untrusted patterns with a time budget:
+#    A static check cannot catch everything, so patterns from users should also run with a hard time limit.
+#    `re` cannot be interrupted from Python while it is matching, so the match runs in a separate worker process
+#    that is killed (and replaced) when the budget runs out. The caller gets a "timeout" result instead of hanging.
+#    If the worker dies during a call the caller gets an "error" result, and the next call starts a new worker.
+import multiprocessing
+import threading
+import time
+
+TimedMatchResult = namedtuple("TimedMatchResult", ["status", "value", "elapsed"])
+
+
+def _timed_match_worker(connection):
+    while True:
+        request = connection.recv()
+        if request is None:
+            return
+        pattern, flags, method, text = request
+        try:
+            result = getattr(pattern_registry.compile(pattern, flags), method)(text)
+            if isinstance(result, re.Match):
+                result = (result.span(), result.groups())  # match objects cannot be pickled
+            connection.send(("ok", result))
+        except Exception as error:
+            connection.send(("error", repr(error)))
+
+
+class TimeBoundedMatcher:
+    """Runs regex calls in a killable worker process with a per-call time budget."""
+
+    METHODS = ("findall", "search", "match", "fullmatch", "split")
+
+    def __init__(self, timeout=1.0):
+        self.timeout = timeout
+        self.timings = {}  # (pattern, flags) -> {"calls", "timeouts", "total", "max"}
+        self._process = None
+        self._connection = None
+
+    def _start_worker(self):
+        self._connection, worker_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_timed_match_worker, args=(worker_connection,), daemon=True
+        )
+        self._process.start()
+        worker_connection.close()
+
+    def _kill_worker(self):
+        self._process.kill()
+        self._process.join()
+        self._connection.close()
+        self._process = self._connection = None
+
+    def run(self, pattern, text, flags=0, method="findall", timeout=None):
+        if method not in self.METHODS:
+            raise ValueError(f"Unsupported method {method!r}.")
+        if self._process is None or not self._process.is_alive():
+            self._start_worker()
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        try:
+            self._connection.send((pattern, int(flags), method, text))
+            if self._connection.poll(timeout):
+                status, value = self._connection.recv()
+            else:
+                self._kill_worker()  # the next call starts a fresh worker
+                status, value = "timeout", None
+        except (EOFError, OSError):
+            # The worker died during the call (killed, out of memory, crashed): report it and start afresh next time
+            self._kill_worker()
+            status, value = "error", "the worker process exited during the call"
+        elapsed = time.perf_counter() - started
+        self._record(pattern, flags, status, elapsed)
+        return TimedMatchResult(status, value, elapsed)
+
+    def _record(self, pattern, flags, status, elapsed):
+        timing = self.timings.setdefault(
+            (pattern, int(flags)), {"calls": 0, "timeouts": 0, "total": 0.0, "max": 0.0}
+        )
+        timing["calls"] += 1
+        timing["timeouts"] += status == "timeout"
+        timing["total"] += elapsed
+        timing["max"] = max(timing["max"], elapsed)
+
+    def close(self):
+        if self._process is not None:
+            self._connection.send(None)
+            self._process.join()
+            self._connection.close()
+            self._process = self._connection = None
+
+
+# The worker process is only started when this file is run as a script, so that importing it (which the "spawn"
+# and "forkserver" start methods do in every new process) never starts workers of its own
+if __name__ == "__main__":
+    bounded_matcher = TimeBoundedMatcher(timeout=0.5)
+    print(bounded_matcher.run(anchor_pattern, anchor_text).status)  # Output: ok
+    print(bounded_matcher.run(r"(a+)+$", "a" * 40 + "b").status)  # Output: timeout
+    print(bounded_matcher.run(anchor_pattern, anchor_text).value)  # Output: ['123-45-6789']
+    print(bounded_matcher.timings[(r"(a+)+$", 0)]["timeouts"])  # Output: 1
+    # A worker that dies in the middle of a call gives an "error" result, and the next call gets a new worker
+    threading.Timer(0.2, bounded_matcher._process.kill).start()
+    print(bounded_matcher.run(r"(a+)+$", "a" * 40 + "b", timeout=10).status)  # Output: error
+    print(bounded_matcher.run(anchor_pattern, anchor_text).status)  # Output: ok
+    bounded_matcher.close()
+
+# Measuring the advice above (item 18 in practice):
+#    The claims that compiled patterns, non-capturing groups, anchors and plain string methods are faster are easy to
+#    check. run_regex_benchmarks() times every pattern registered in 027 and 030 on the same deterministic text at sizes
+#    from 1 KB to 1 GB, in several variants:
+#    - "compiled": findall() on the compiled pattern from the registry,
+#    - "module_function": re.findall(pattern, text), which pays for a lookup in the `re` cache on every call,
+#    - "non_capturing": the same pattern with every capturing group turned into (?:...),
+#    - "regex": the third-party `regex` module, when it is installed,
+#    and a few regex calls against the str method that does the same job ("regex" vs "str_method").
+#    The results are plain JSON, so runs on different Python versions can be stored and compared with
+#    compare_regex_benchmarks(). Patterns that find_backtracking_risks() rates as exponential are skipped.
+import json
+import os
+import platform
+import tempfile
+import timeit
+
+REGEX_BENCHMARK_SIZES = [1 << 10, 1 << 15, 1 << 20, 1 << 25, 1 << 30]  # 1 KB to 1 GB
+_BENCHMARK_SAMPLE = "\n".join(
+    [
+        verbose_text,
+        char_class_text,
+        non_capturing_text,
+        anchor_text,
+        case_insensitive_text,
+        multiline_text,
+        or_text,
+        word_boundary_text,
+        "Hello hello world again. The cat saw the the dog, and 100 dollars changed hands.",
+        log_text,
+    ]
+)
+# Regex calls that a str method can replace, as (name, regex call, str call); both must return the same result
+_STRING_METHOD_CASES = [
+    (
+        "split_lines",
+        lambda text: pattern_registry.compile(r"\n").split(text),
+        lambda text: text.split("\n"),
+    ),
+    (
+        "replace_literal",
+        lambda text: pattern_registry.compile(r"cat").sub("dog", text),
+        lambda text: text.replace("cat", "dog"),
+    ),
+    (
+        "count_literal",
+        lambda text: len(pattern_registry.compile(r"paid").findall(text)),
+        lambda text: text.count("paid"),
+    ),
+    (
+        "contains_literal",
+        lambda text: pattern_registry.compile(r"dollars").search(text) is not None,
+        lambda text: "dollars" in text,
+    ),
+    (
+        "starts_with",
+        lambda text: pattern_registry.compile(r"2023").match(text) is not None,
+        lambda text: text.startswith("2023"),
+    ),
+]
+
+
+def _benchmark_text(size):
+    # The same sample repeated, so every run and every Python version sees identical input
+    return (_BENCHMARK_SAMPLE * (size // len(_BENCHMARK_SAMPLE) + 1))[:size]
+
+
+def _without_captures(pattern):
+    # Rewrites "(" and "(?P<name>" as "(?:", leaving escapes and character classes alone
+    output = []
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\":
+            output.append(pattern[index : index + 2])
+            index += 2
+            continue
+        if char == "[" and not in_class:
+            in_class = True
+        elif char == "]" and in_class:
+            in_class = False
+        elif char == "(" and not in_class:
+            if not pattern.startswith("?", index + 1):
+                output.append("(?:")
+                index += 1
+                continue
+            if pattern.startswith("?P<", index + 1):
+                output.append("(?:")
+                index = pattern.index(">", index) + 1
+                continue
+        output.append(char)
+        index += 1
+    return "".join(output)
+
+
+def _best_time(func, repeat, min_time):
+    # Seconds per call: the loop count doubles until a batch takes min_time, then the fastest of `repeat` batches wins
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time and number < 1 << 20:
+        number *= 2
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def _pattern_variants(pattern, flags):
+    # Yields (variant, callable taking the text) for one registered pattern
+    compiled = pattern_registry.compile(pattern, flags)
+    yield "compiled", compiled.findall
+    yield "module_function", lambda text: re.findall(pattern, text, flags)
+    if compiled.groups:
+        try:
+            non_capturing = re.compile(_without_captures(pattern), flags)
+        except re.error:
+            non_capturing = None  # backreferences need their groups
+        if non_capturing is not None:
+            yield "non_capturing", non_capturing.findall
+    try:
+        import regex as re_unicode
+    except ImportError:
+        return
+    try:
+        yield "regex", re_unicode.compile(pattern, flags).findall
+    except re_unicode.error:
+        pass
+
+
+def run_regex_benchmarks(
+    sizes=REGEX_BENCHMARK_SIZES, names=None, repeat=3, min_time=0.2, output_path=None
+):
+    """
+    Times every registered pattern (or only `names`) on inputs of each size and returns the results as a dict.
+
+    When `output_path` is given the same dict is also written there as JSON.
+    """
+    try:
+        import regex as re_unicode
+
+        regex_version = re_unicode.__version__
+    except ImportError:
+        regex_version = None
+    manifest = pattern_registry.export_manifest()
+    results = []
+    skipped = []
+    for size in sizes:
+        text = _benchmark_text(size)
+        for name in names if names is not None else list(manifest):
+            pattern, flags = manifest[name]["pattern"], manifest[name]["flags"]
+            if any(risk.severity == "exponential" for risk in find_backtracking_risks(pattern, flags)):
+                if name not in skipped:
+                    skipped.append(name)
+                continue
+            for variant, func in _pattern_variants(pattern, flags):
+                seconds = _best_time(lambda: func(text), repeat, min_time)
+                results.append(
+                    {
+                        "benchmark": name,
+                        "pattern": pattern,
+                        "flags": flags,
+                        "variant": variant,
+                        "size": size,
+                        "seconds": seconds,
+                        "mb_per_second": size / seconds / 1e6,
+                        "matches": len(func(text)),
+                    }
+                )
+        for name, regex_call, str_call in _STRING_METHOD_CASES:
+            if names is not None and name not in names:
+                continue
+            if regex_call(text) != str_call(text):
+                raise AssertionError(f"{name}: the regex and str method results differ")
+            for variant, func in (("regex", regex_call), ("str_method", str_call)):
+                seconds = _best_time(lambda: func(text), repeat, min_time)
+                results.append(
+                    {
+                        "benchmark": name,
+                        "variant": variant,
+                        "size": size,
+                        "seconds": seconds,
+                        "mb_per_second": size / seconds / 1e6,
+                    }
+                )
+        del text  # the 1 GB input should not outlive its round
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "regex_version": regex_version,
+        "skipped": skipped,
+        "results": results,
+    }
+    if output_path is not None:
+        with open(output_path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    return report
+
+
+def compare_regex_benchmarks(baseline, current, tolerance=1.2):
+    # Returns (benchmark, variant, size, slowdown) for every result that got more than `tolerance` times slower
+    reports = []
+    for report in (baseline, current):
+        if isinstance(report, (str, os.PathLike)):
+            with open(report, "r", encoding="utf-8") as file:
+                report = json.load(file)
+        reports.append(
+            {
+                (result["benchmark"], result["variant"], result["size"]): result["seconds"]
+                for result in report["results"]
+            }
+        )
+    baseline_times, current_times = reports
+    return [
+        (*key, current_times[key] / seconds)
+        for key, seconds in baseline_times.items()
+        if key in current_times and current_times[key] > seconds * tolerance
+    ]
+
+
+# Example: a quick run on small inputs. The full 1 KB to 1 GB run is run_regex_benchmarks(output_path="results.json").
+# Each run writes to a file of its own, so runs at the same time never overwrite each other's results
+with tempfile.NamedTemporaryFile(suffix=".json", prefix="regex_benchmarks_", delete=False) as benchmark_file:
+    benchmark_path = benchmark_file.name
+benchmark_report = run_regex_benchmarks(sizes=[1 << 10, 1 << 16], min_time=0.02, output_path=benchmark_path)
+benchmark_times = {
+    (result["benchmark"], result["variant"], result["size"]): result["seconds"]
+    for result in benchmark_report["results"]
+}
+print(len(benchmark_report["results"]) > 0, benchmark_report["skipped"])  # Output: True []
+for name, variant, other in [
+    ("ssn", "module_function", "compiled"),
+    ("date", "compiled", "non_capturing"),
+    ("replace_literal", "regex", "str_method"),
+]:
+    ratio = benchmark_times[(name, variant, 1 << 10)] / benchmark_times[(name, other, 1 << 10)]
+    print(f"{name}: {variant} takes {ratio:.2f}x the time of {other} on 1 KB")
+# Output (timings vary by machine):
+# ssn: module_function takes 1.02x the time of compiled on 1 KB
+# date: compiled takes 1.01x the time of non_capturing on 1 KB
+# replace_literal: regex takes 2.50x the time of str_method on 1 KB
+print(compare_regex_benchmarks(benchmark_path, benchmark_report))  # Output: []
+os.remove(benchmark_path)
+
+# Applying the advice automatically:
+#    optimize_pattern() takes a pattern and how it is used, applies the rewrites from this lesson that cannot change
+#    the result, and checks the rewritten pattern against the original on a fuzz corpus before handing it back:
+#    - "non_capturing": groups the caller never reads become (?:...) (item 4),
+#    - "possessive": a greedy repeat of single characters becomes possessive (\d+ -> \d++) when nothing that can
+#      follow it starts with one of those characters, so giving characters back could never lead to a match
+#      (items 13 and 14),
+#    - "anchor": a search for .*X is anchored to the start of a line, since no match can start mid-line (item 5),
+#    - "factor": adjacent alternatives with a common literal prefix share it, as in ap(?:ple|ricot)|banana.
+#    Atomic groups are not added: they are only provably equivalent where they change nothing, and possessive
+#    quantifiers already cover the single-character case. The rewritten pattern is rebuilt from the `re._parser`
+#    parse tree, so comments and whitespace of verbose patterns are not kept.
+import random
+
+OptimizedPattern = namedtuple(
+    "OptimizedPattern", ["pattern", "flags", "rewrites", "group_map", "verified"]
+)
+# Methods whose results expose every group, so no group can be dropped when they are used
+_ALL_GROUP_METHODS = {"findall", "split"}
+_FLAG_LETTERS = [
+    (re.ASCII, "a"),
+    (re.IGNORECASE, "i"),
+    (re.LOCALE, "L"),
+    (re.MULTILINE, "m"),
+    (re.DOTALL, "s"),
+    (re.UNICODE, "u"),
+    (re.VERBOSE, "x"),
+]
+# Items that a quantifier can follow directly
+_SINGLE_ITEM_OPS = (
+    _constants.LITERAL,
+    _constants.NOT_LITERAL,
+    _constants.ANY,
+    _constants.IN,
+    _constants.SUBPATTERN,
+    _constants.ATOMIC_GROUP,
+    _constants.GROUPREF,
+)
+_AT_SYNTAX = {
+    _constants.AT_BEGINNING: "^",
+    _constants.AT_BEGINNING_STRING: r"\A",
+    _constants.AT_END: "$",
+    _constants.AT_END_STRING: r"\Z",
+    _constants.AT_BOUNDARY: r"\b",
+    _constants.AT_NON_BOUNDARY: r"\B",
+}
+
+
+def _escape(char, in_class=False):
+    # Only the characters that are special in that position get a backslash, unlike re.escape()
+    if char in ("\\]^-[" if in_class else ".^$*+?{}[]\\|()"):
+        return "\\" + char
+    return char
+
+
+def _flag_letters(flags):
+    return "".join(letter for flag, letter in _FLAG_LETTERS if flags & flag)
+
+
+def _unparse(sequence, group_names):
+    # Turns a (possibly rewritten) parse tree back into pattern text
+    output = []
+    for op, av in sequence:
+        if op is _constants.LITERAL:
+            output.append(_escape(chr(av)))
+        elif op is _constants.NOT_LITERAL:
+            output.append(f"[^{_escape(chr(av), in_class=True)}]")
+        elif op is _constants.ANY:
+            output.append(".")
+        elif op is _constants.IN:
+            output.append(_unparse_class(av))
+        elif op is _constants.AT:
+            output.append(_AT_SYNTAX[av])
+        elif op is _constants.SUBPATTERN:
+            group, add_flags, del_flags, body = av
+            body_text = _unparse(body, group_names)
+            if group is not None:
+                name = group_names.get(group)
+                output.append(f"(?P<{name}>{body_text})" if name else f"({body_text})")
+            elif add_flags or del_flags:
+                removed = f"-{_flag_letters(del_flags)}" if del_flags else ""
+                output.append(f"(?{_flag_letters(add_flags)}{removed}:{body_text})")
+            else:
+                output.append(f"(?:{body_text})")
+        elif op is _constants.BRANCH:
+            branches = "|".join(_unparse(branch, group_names) for branch in av[1])
+            output.append(branches if len(sequence) == 1 else f"(?:{branches})")
+        elif op in _REPEATS or op is _constants.POSSESSIVE_REPEAT:
+            low, high, body = av
+            body_text = _unparse(body, group_names)
+            # a*+ would read as a possessive repeat and \b* is not allowed, so such bodies keep a group
+            if len(body) != 1 or body[0][0] not in _SINGLE_ITEM_OPS:
+                body_text = f"(?:{body_text})"
+            if (low, high) == (0, _constants.MAXREPEAT):
+                quantifier = "*"
+            elif (low, high) == (1, _constants.MAXREPEAT):
+                quantifier = "+"
+            elif (low, high) == (0, 1):
+                quantifier = "?"
+            elif low == high:
+                quantifier = f"{{{low}}}"
+            elif high == _constants.MAXREPEAT:
+                quantifier = f"{{{low},}}"
+            else:
+                quantifier = f"{{{low},{high}}}"
+            if op is _constants.MIN_REPEAT:
+                quantifier += "?"
+            elif op is _constants.POSSESSIVE_REPEAT:
+                quantifier += "+"
+            output.append(body_text + quantifier)
+        elif op in (_constants.ASSERT, _constants.ASSERT_NOT):
+            direction, body = av
+            prefix = ("(?=" if op is _constants.ASSERT else "(?!") if direction == 1 else None
+            if prefix is None:
+                prefix = "(?<=" if op is _constants.ASSERT else "(?<!"
+            output.append(prefix + _unparse(body, group_names) + ")")
+        elif op is _constants.ATOMIC_GROUP:
+            output.append(f"(?>{_unparse(av, group_names)})")
+        elif op is _constants.GROUPREF:
+            output.append(f"(?:\\{av})")
+        elif op is _constants.GROUPREF_EXISTS:
+            group, yes, no = av
+            no_text = "" if no is None else "|" + _unparse(no, group_names)
+            output.append(f"(?({group}){_unparse(yes, group_names)}{no_text})")
+        else:
+            raise ValueError(f"cannot rebuild pattern text for {op}")
+    return "".join(output)
+
+
+def _unparse_class(items):
+    if len(items) == 1 and items[0][0] is _constants.CATEGORY:
+        return _CATEGORY_PATTERNS[items[0][1]]
+    output = ["["]
+    for op, av in items:
+        if op is _constants.NEGATE:
+            output.append("^")
+        elif op is _constants.LITERAL:
+            output.append(_escape(chr(av), in_class=True))
+        elif op is _constants.RANGE:
+            low, high = (_escape(chr(code), in_class=True) for code in av)
+            output.append(f"{low}-{high}")
+        elif op is _constants.CATEGORY:
+            output.append(_CATEGORY_PATTERNS[av])
+        else:
+            raise ValueError(f"cannot rebuild character class item {op}")
+    output.append("]")
+    return "".join(output)
+
+
+def _walk(sequence):
+    # Yields every item of a parse tree, including nested ones and the items of character classes
+    for op, av in sequence:
+        yield op, av
+        if op is _constants.IN:
+            yield from av
+        for child in _children(op, av):
+            yield from _walk(child)
+
+
+def _pattern_sample_chars(sequence):
+    # The set analysis above only sees the characters of its sample, so each pattern gets its own copy of
+    # _SAMPLE_CHARS with the pattern's literals and range ends added; two ranges overlap exactly when an end of
+    # one lies inside the other
+    sample = list(_SAMPLE_CHARS)
+    known = set(sample)
+    for op, av in _walk(sequence):
+        codes = []
+        if op in (_constants.LITERAL, _constants.NOT_LITERAL):
+            codes = [av]
+        elif op is _constants.RANGE:
+            codes = list(av)
+        for code in codes:
+            char = chr(code)
+            if char not in known:
+                known.add(char)
+                sample.append(char)
+    return tuple(sample)
+
+
+def _word_chars(flags, sample):
+    compiled = re.compile(r"\w", flags & (re.ASCII | re.UNICODE))
+    return {char for char in sample if compiled.match(char)}
+
+
+def _follow_chars(rest, outer, repeated, low, flags, sample):
+    # The characters that can come right after a repeat of `repeated` characters, or None if that is unclear.
+    # `outer` is what can follow the enclosing sequence (None when unknown). With repeated=None only the
+    # characters are collected, for the repeats nested inside the next item.
+    chars = set()
+    for op, av in rest:
+        if op is _constants.AT:
+            # Giving characters back leaves the position in front of one of the `repeated` characters
+            if av is _constants.AT_END_STRING:
+                return chars
+            if repeated is None:
+                return None
+            if av is _constants.AT_END and "\n" not in repeated:
+                continue
+            if av is _constants.AT_BOUNDARY and low >= 1:
+                word = _word_chars(flags, sample)
+                if repeated <= word or not repeated & word:
+                    continue
+            return None
+        if op in (_constants.ASSERT, _constants.ASSERT_NOT, _constants.GROUPREF, _constants.GROUPREF_EXISTS):
+            return None
+        single = _single_char_set(op, av, flags, sample)
+        if single is not None:
+            return chars | single
+        inner_ops = {inner_op for inner_op, _ in _walk([(op, av)])}
+        if inner_ops & {_constants.GROUPREF, _constants.ASSERT, _constants.ASSERT_NOT}:
+            return None
+        chars |= _first_chars([(op, av)], flags, sample)
+        if not _is_nullable([(op, av)]):
+            return chars
+        if _constants.AT in inner_ops:
+            return None
+    return None if outer is None else chars | outer
+
+
+def _make_possessive(sequence, outer, flags, sample, rewrites):
+    result = []
+    for index, (op, av) in enumerate(sequence):
+        rest = sequence[index + 1 :]
+        # A fixed count such as \d{4} has nothing to give back
+        if op is _constants.MAX_REPEAT and av[0] != av[1] and len(av[2]) == 1:
+            repeated = _single_char_set(*av[2][0], flags, sample)
+            if repeated is not None:
+                follow = _follow_chars(rest, outer, repeated, av[0], flags, sample)
+                if follow is not None and not repeated & follow:
+                    rewrites.append(f"possessive: {_unparse([(op, av)], {})}+")
+                    result.append((_constants.POSSESSIVE_REPEAT, av))
+                    continue
+        follow = _follow_chars(rest, outer, None, 0, flags, sample)
+        if op is _constants.SUBPATTERN:
+            group, add_flags, del_flags, body = av
+            scoped = (flags | add_flags) & ~del_flags
+            av = (group, add_flags, del_flags, _make_possessive(list(body), follow, scoped, sample, rewrites))
+        elif op is _constants.BRANCH:
+            av = (
+                av[0],
+                [_make_possessive(list(branch), follow, flags, sample, rewrites) for branch in av[1]],
+            )
+        elif op is _constants.ATOMIC_GROUP:
+            av = _make_possessive(list(av), follow, flags, sample, rewrites)
+        elif op in _REPEATS or op is _constants.POSSESSIVE_REPEAT:
+            body = list(av[2])
+            # After one iteration comes either the next iteration or whatever follows the repeat
+            inner = None
+            if follow is not None and not _is_nullable(body):
+                inner = follow | _first_chars(body, flags, sample)
+            av = (av[0], av[1], _make_possessive(body, inner, flags, sample, rewrites))
+        result.append((op, av))
+    return result
+
+
+def _drop_captures(sequence, keep, group_map):
+    result = []
+    for op, av in sequence:
+        if op is _constants.SUBPATTERN:
+            group, add_flags, del_flags, body = av
+            # Groups are numbered by their opening parenthesis, so the outer group is numbered first
+            if group is not None and group not in keep and not add_flags and not del_flags:
+                # Like the parser does for (?:...), the contents of a dropped group go straight into the sequence
+                result.extend(_drop_captures(body, keep, group_map))
+                continue
+            if group in keep:
+                group_map[group] = len(group_map) + 1
+                group = group_map[group]
+            else:
+                group = None
+            av = (group, add_flags, del_flags, _drop_captures(body, keep, group_map))
+        elif op is _constants.BRANCH:
+            av = (av[0], [_drop_captures(branch, keep, group_map) for branch in av[1]])
+        elif op is _constants.ATOMIC_GROUP:
+            av = _drop_captures(av, keep, group_map)
+        elif op in (_constants.ASSERT, _constants.ASSERT_NOT):
+            av = (av[0], _drop_captures(av[1], keep, group_map))
+        elif op in _REPEATS or op is _constants.POSSESSIVE_REPEAT:
+            av = (av[0], av[1], _drop_captures(av[2], keep, group_map))
+        result.append((op, av))
+    return result
+
+
+def _factor_branches(sequence, rewrites):
+    result = []
+    for op, av in sequence:
+        if op is _constants.BRANCH:
+            branches = [_factor_branches(list(branch), rewrites) for branch in av[1]]
+            av = (av[0], _factor_alternatives(branches, rewrites))
+        elif op is _constants.SUBPATTERN:
+            av = (av[0], av[1], av[2], _factor_branches(list(av[3]), rewrites))
+        elif op is _constants.ATOMIC_GROUP:
+            av = _factor_branches(list(av), rewrites)
+        elif op in _REPEATS or op is _constants.POSSESSIVE_REPEAT:
+            av = (av[0], av[1], _factor_branches(list(av[2]), rewrites))
+        result.append((op, av))
+    return result
+
+
+def _factor_alternatives(branches, rewrites):
+    # Only neighbouring alternatives are merged, so the order in which they are tried stays the same
+    factored = []
+    index = 0
+    while index < len(branches):
+        first = branches[index][:1]
+        end = index + 1
+        while (
+            first
+            and first[0][0] is _constants.LITERAL
+            and end < len(branches)
+            and branches[end][:1] == first
+        ):
+            end += 1
+        if end - index < 2:
+            factored.append(branches[index])
+            index += 1
+            continue
+        run = branches[index:end]
+        prefix = 0
+        while all(
+            len(branch) > prefix
+            and branch[prefix][0] is _constants.LITERAL
+            and branch[prefix] == run[0][prefix]
+            for branch in run
+        ):
+            prefix += 1
+        tails = _factor_alternatives([branch[prefix:] for branch in run], rewrites)
+        merged = list(run[0][:prefix]) + [(_constants.BRANCH, (None, tails))]
+        rewrites.append(f"factor: {_unparse(merged, {})}")
+        factored.append(merged)
+        index = end
+    return factored
+
+
+def _anchor_leading_wildcard(sequence, flags, rewrites):
+    if not sequence:
+        return sequence
+    op, av = sequence[0]
+    if not _is_unbounded_repeat(op, av) or av[0] != 0 or list(av[2]) != [(_constants.ANY, None)]:
+        return sequence
+    if flags & re.DOTALL:
+        anchor = (_constants.AT, _constants.AT_BEGINNING_STRING)
+    elif flags & re.MULTILINE:
+        anchor = (_constants.AT, _constants.AT_BEGINNING)
+    else:
+        anchor = (_constants.SUBPATTERN, (None, re.MULTILINE, 0, [(_constants.AT, _constants.AT_BEGINNING)]))
+    rewrites.append(f"anchor: {_unparse([anchor], {})}")
+    return [anchor] + list(sequence)
+
+
+def _random_match(sequence, rng, flags, sample, captured):
+    # Builds a random string that `sequence` is likely to match (lookarounds are ignored)
+    output = []
+    for op, av in sequence:
+        chars = _single_char_set(op, av, flags, sample)
+        if chars is not None:
+            if chars:
+                output.append(rng.choice(sorted(chars)))
+        elif op is _constants.SUBPATTERN:
+            text = _random_match(av[3], rng, flags, sample, captured)
+            if av[0] is not None:
+                captured[av[0]] = text
+            output.append(text)
+        elif op is _constants.BRANCH:
+            output.append(_random_match(rng.choice(av[1]), rng, flags, sample, captured))
+        elif op is _constants.ATOMIC_GROUP:
+            output.append(_random_match(av, rng, flags, sample, captured))
+        elif op in _REPEATS or op is _constants.POSSESSIVE_REPEAT:
+            count = rng.randint(av[0], min(av[1], av[0] + 4))
+            output.extend(_random_match(av[2], rng, flags, sample, captured) for _ in range(count))
+        elif op is _constants.GROUPREF:
+            output.append(captured.get(av, ""))
+    return "".join(output)
+
+
+def _fuzz_corpus(parsed, flags, sample, samples, seed):
+    rng = random.Random(seed)
+    alphabet = sorted(_consumed_chars(parsed, flags, sample) | set("aZ0 -.\n@$")) or ["a"]
+    corpus = ["", "\n"]
+    for _ in range(samples):
+        pieces = []
+        for _ in range(rng.randint(1, 3)):
+            pieces.append("".join(rng.choice(alphabet) for _ in range(rng.randint(0, 6))))
+            match_text = _random_match(parsed, rng, flags, sample, {})
+            if match_text and rng.random() < 0.3:
+                # Near-misses exercise backtracking: cut or change one character
+                position = rng.randrange(len(match_text))
+                replacement = rng.choice(["", rng.choice(alphabet)])
+                match_text = match_text[:position] + replacement + match_text[position + 1 :]
+            pieces.append(match_text)
+        corpus.append("".join(pieces))
+    return corpus
+
+
+def _same_results(original, optimized, text, methods, used_groups, group_map):
+    # Compares the spans of every match and of every group the caller reads
+    def spans(match, numbers):
+        if match is None:
+            return None
+        return [match.span()] + [match.span(number) for number in numbers]
+
+    new_groups = [group_map[group] for group in used_groups]
+    for method in methods:
+        if method in ("search", "match", "fullmatch"):
+            old = spans(getattr(original, method)(text), used_groups)
+            if old != spans(getattr(optimized, method)(text), new_groups):
+                return False
+        elif method in ("finditer", "sub", "subn"):
+            old = [spans(match, used_groups) for match in original.finditer(text)]
+            new = [spans(match, new_groups) for match in optimized.finditer(text)]
+            if old != new:
+                return False
+        elif getattr(original, method)(text) != getattr(optimized, method)(text):
+            return False
+    return True
+
+
+def optimize_pattern(
+    pattern, flags=0, used_groups=None, methods=None, fuzz_samples=2000, seed=0
+):
+    """
+    Rewrites a str pattern into a faster equivalent, given which groups are read and which methods are called.
+
+    `used_groups` holds the group names or numbers the caller reads from matches (None keeps every group), and
+    `methods` the pattern methods it calls (None means any of them). Returns an OptimizedPattern; group_map maps
+    old group numbers to new ones. When the fuzz check finds a difference the original pattern is returned with
+    verified=False.
+    """
+    pattern = _resolve_pattern(pattern)
+    if isinstance(pattern, re.Pattern):
+        pattern, flags = pattern.pattern, pattern.flags
+    if not isinstance(pattern, str):
+        raise TypeError("only str patterns can be optimized")
+    original = pattern_registry.compile(pattern, flags)
+    if methods is None:
+        methods = {"findall", "finditer", "search", "match", "fullmatch", "split"}
+    methods = set(methods)
+    parsed = re._parser.parse(pattern, flags)
+    flags = parsed.state.flags & ~re.VERBOSE  # the rebuilt text has no comments or layout whitespace
+    group_names = {number: name for name, number in parsed.state.groupdict.items()}
+    sequence = list(parsed)
+    sample = _pattern_sample_chars(sequence)
+    rewrites = []
+    group_map = {group: group for group in range(1, original.groups + 1)}
+    if used_groups is not None:
+        used_groups = [original.groupindex.get(group, group) for group in used_groups]
+    else:
+        used_groups = list(group_map)
+    has_backreferences = any(
+        op in (_constants.GROUPREF, _constants.GROUPREF_EXISTS) for op, _ in _walk(sequence)
+    )
+    # Dropping a group renumbers the later ones, which would break backreferences
+    can_drop = not has_backreferences and not methods & _ALL_GROUP_METHODS
+    if can_drop and len(used_groups) < original.groups:
+        group_map = {}
+        sequence = _drop_captures(sequence, set(used_groups), group_map)
+        for group in range(1, original.groups + 1):
+            if group not in group_map:
+                rewrites.append(f"non_capturing: group {group_names.get(group, group)}")
+        group_names = {
+            group_map[number]: name for number, name in group_names.items() if number in group_map
+        }
+    sequence = _factor_branches(sequence, rewrites)
+    if methods == {"search"}:  # search() without a pos argument
+        sequence = _anchor_leading_wildcard(sequence, flags, rewrites)
+    # Nothing follows the whole pattern, so a repeat at its end never needs to give characters back
+    sequence = _make_possessive(sequence, set(), flags, sample, rewrites)
+    if not rewrites:
+        return OptimizedPattern(pattern, original.flags, [], group_map, True)
+    optimized_text = _unparse(sequence, group_names)
+    optimized = re.compile(optimized_text, flags)
+    corpus = _fuzz_corpus(list(parsed), flags, sample, fuzz_samples, seed)
+    for text in corpus:
+        if not _same_results(original, optimized, text, sorted(methods), used_groups, group_map):
+            unchanged = {group: group for group in range(1, original.groups + 1)}
+            return OptimizedPattern(pattern, original.flags, [], unchanged, False)
+    return OptimizedPattern(optimized_text, optimized.flags, rewrites, group_map, True)
+
+
+def optimize_registered(name, used_groups=None, methods=None):
+    # Swaps a registered pattern for its optimized form, but only after the fuzz check passed
+    compiled = pattern_registry.get(name)
+    result = optimize_pattern(compiled, used_groups=used_groups, methods=methods)
+    if result.verified and result.rewrites:
+        pattern_registry.register(name, result.pattern, result.flags)
+    return result
+
+
+email_pattern = r"(\w+)@(\w+)\.com"
+optimized_email = optimize_pattern(email_pattern, used_groups=[2], methods=["search", "finditer"])
+print(optimized_email.pattern, optimized_email.group_map)  # Output: \w++@(\w++)\.com {2: 1}
+print(optimized_email.rewrites)
+# Output: ['non_capturing: group 1', 'possessive: \\w++', 'possessive: \\w++']
+print(optimize_pattern(r"apple|apricot|banana|band").pattern)  # Output: ap(?:ple|ricot)|ban(?:ana|d)
+# The lazily registered "ssn" pattern from the top of this lesson is accepted like a compiled one
+assert optimize_pattern(compiled_pattern).pattern == r"\d{3}-\d{2}-\d{4}"
+assert find_backtracking_risks(compiled_pattern) == []
+# Each call works on its own extended sample, so the shared sample and the category cache never grow
+assert len(_SAMPLE_CHARS) == 134 and len(_category_cache) <= len(_CATEGORY_PATTERNS)
+error_line_pattern = r".*ERROR: (\w+)"
+optimized_error_line = optimize_pattern(error_line_pattern, methods=["search"])
+print(optimized_error_line.pattern)  # Output: (?m:^).*ERROR: (\w++)
+# Benchmark: long log lines that mostly do not contain the searched text
+optimizer_text = "\n".join(
+    f"{number:05d} GET /item/{number} 200 {number * 31} bytes user{number}@example" * 6
+    for number in range(300)
+) + "\nERROR: disk_full\nsent to admin@example.com"
+for original_pattern, result in [
+    (error_line_pattern, optimized_error_line),
+    (email_pattern, optimized_email),
+]:
+    before = pattern_registry.compile(original_pattern)
+    after = pattern_registry.compile(result.pattern, result.flags)
+    assert before.search(optimizer_text).span() == after.search(optimizer_text).span()
+    before_time = _best_time(lambda: before.search(optimizer_text), 3, 0.05)
+    after_time = _best_time(lambda: after.search(optimizer_text), 3, 0.05)
+    print(f"{original_pattern}: {before_time * 1000:.2f} ms -> {after_time * 1000:.2f} ms")
+# Output (timings vary by machine):
+# .*ERROR: (\w+): 35.88 ms -> 1.33 ms
+# (\w+)@(\w+)\.com: 16.96 ms -> 10.32 ms
+# Swapping a registered pattern in place; a pattern that fails the fuzz check stays as it was
+pattern_registry.register("email_domain", email_pattern)
+optimize_registered("email_domain", used_groups=[2], methods=["search", "finditer"])
+print(pattern_registry.get("email_domain").pattern)  # Output: \w++@(\w++)\.com
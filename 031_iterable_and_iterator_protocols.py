@@ -17,6 +17,12 @@ class MyIterable:
         else:
             raise StopIteration
 
+    def next_batch(self, n):
+        # Up to n items in one step; an empty slice means the iterator is exhausted
+        start = self.index
+        self.index = min(start + n, len(self.data))
+        return self.data[start : self.index]
+
 
 print("Iterable example:")
 my_iterable = MyIterable()
@@ -43,6 +49,13 @@ class MyIterator:
         else:
             raise StopIteration
 
+    def next_batch(self, n):
+        # Slicing keeps the type of the data: a list gives a list, an array.array an array chunk
+        # and a memoryview a zero-copy view
+        start = self.index
+        self.index = min(start + n, len(self.data))
+        return self.data[start : self.index]
+
 
 print("\nIterator example:")
 my_iterator = MyIterator([4, 5, 6])
@@ -50,6 +63,99 @@ for item in my_iterator:
     print(item)  # Output: 4, 5, 6
 
 
+# Batch protocol:
+# `__next__` pays for a length check, an index lookup and an attribute update on every single element.
+# With tens of millions of records that per-item overhead dominates, so iterators in this lesson also offer
+# `next_batch(n)`, which hands out up to n items at once and an empty batch when exhausted.
+# Consumers use it when it is there and fall back to plain iteration otherwise, so per-element loops keep working.
+import itertools
+
+
+def iter_batches(iterable, size=1024):
+    iterator = iter(iterable)
+    next_batch = getattr(iterator, "next_batch", None)
+    if next_batch is None:
+        # Any other iterator is grouped into lists of up to `size` items
+        while True:
+            batch = list(itertools.islice(iterator, size))
+            if not batch:
+                return
+            yield batch
+    while True:
+        batch = next_batch(size)
+        if not len(batch):
+            return
+        yield batch
+
+
+print("\nBatch protocol example:")
+print(list(iter_batches(MyIterator([1, 2, 3, 4, 5]), 2)))  # Output: [[1, 2], [3, 4], [5]]
+print(list(iter_batches(iter([1, 2, 3, 4, 5]), 2)))  # Output: [[1, 2], [3, 4], [5]]
+record_bytes = MyIterator(memoryview(b"abcdef"))
+print([bytes(chunk) for chunk in iter_batches(record_bytes, 4)])  # Output: [b'abcd', b'ef']
+mixed_iterator = MyIterator([1, 2, 3, 4])
+print(next(mixed_iterator), mixed_iterator.next_batch(2), list(mixed_iterator))  # Output: 1 [2, 3] [4]
+
+
+# Separate, compact iterable and iterator classes:
+# MyIterable above stores its position on itself, so two loops over the same object share one index and
+# corrupt each other, and every instance carries a __dict__. Splitting the two roles fixes both:
+# the iterable only holds the data and each __iter__ call returns a fresh cursor, and both classes use
+# __slots__ so they have no per-instance dictionary.
+# __length_hint__ tells list(), tuple() and friends how many items remain so they can allocate once.
+import sys
+
+
+class CompactIterable:
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __iter__(self):
+        return CompactIterator(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class CompactIterator:
+    __slots__ = ("data", "index")
+
+    def __init__(self, data):
+        self.data = data
+        self.index = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        index = self.index
+        if index < len(self.data):
+            self.index = index + 1
+            return self.data[index]
+        raise StopIteration
+
+    def __length_hint__(self):
+        return max(len(self.data) - self.index, 0)
+
+    def next_batch(self, n):
+        start = self.index
+        self.index = min(start + n, len(self.data))
+        return self.data[start : self.index]
+
+
+print("\nCompact iterable example:")
+shared_iterable = MyIterable()
+print([(a, b) for a in shared_iterable for b in shared_iterable])
+# Output: [(1, 1), (1, 2), (1, 3)] - the inner loop reset the shared index and ended the outer loop
+compact_iterable = CompactIterable([1, 2, 3])
+print(len([(a, b) for a in compact_iterable for b in compact_iterable]))  # Output: 9
+compact_cursor = iter(compact_iterable)
+next(compact_cursor)
+print(compact_cursor.__length_hint__(), list(compact_cursor))  # Output: 2 [2, 3]
+
+
 # iterable vs iterator:
 # An iterable can be looped over multiple times, while an iterator can only be traversed once.
 # After an iterator is exhausted, it cannot be reused unless a new iterator is created from the iterable.
@@ -117,8 +223,10 @@ for item in built_in_iterator:
 
 # Example of using built-in iterators with functions
 def process_items(iterator):
-    for item in iterator:
-        print(f"Processing item: {item}")
+    # iter_batches() uses next_batch() when the iterator has it, so the per-item work is a plain list loop
+    for batch in iter_batches(iterator):
+        for item in batch:
+            print(f"Processing item: {item}")
 
 
 process_items(built_in_iterator)  # Output: Processing item: 1, 2, 3, 4, 5
@@ -134,3 +242,346 @@ print(mapped_items)  # Output: [2, 4, 6, 8, 10]
 filtered_items = list(filter(lambda x: x > 2, built_in_iterables))
 print("\nBuilt-in Iterators with Filter Function example:")
 print(filtered_items)  # Output: [3, 4, 5]
+# Benchmark: summing ten million numbers one __next__ call at a time against one batch at a time
+import array
+import timeit
+
+benchmark_numbers = array.array("d", range(10_000_000))
+per_item_time = timeit.timeit(lambda: sum(MyIterator(benchmark_numbers)), number=1)
+batched_time = timeit.timeit(
+    lambda: sum(sum(batch) for batch in iter_batches(MyIterator(benchmark_numbers), 65536)),
+    number=1,
+)
+print(f"\nPer item: {per_item_time:.2f}s, batched: {batched_time:.2f}s")
+# Output (timings vary by machine): Per item: 2.22s, batched: 0.16s
+# Benchmark: memory per instance and iteration speed of MyIterator against the compact classes
+old_cursor = MyIterator(benchmark_numbers)
+new_cursor = CompactIterator(benchmark_numbers)
+old_bytes = sys.getsizeof(old_cursor) + sys.getsizeof(old_cursor.__dict__)
+print(f"MyIterator: {old_bytes} bytes, CompactIterator: {sys.getsizeof(new_cursor)} bytes per instance")
+# Output (depends on the Python version): MyIterator: 304 bytes, CompactIterator: 48 bytes per instance
+for label, make_iterable in [
+    ("MyIterator", lambda: MyIterator(benchmark_numbers)),
+    ("CompactIterable", lambda: CompactIterable(benchmark_numbers)),
+]:
+    loop_time = timeit.timeit(lambda: list(make_iterable()), number=1)
+    print(f"{label}: {len(benchmark_numbers) / loop_time / 1e6:.1f} million items per second")
+# Output (timings vary by machine):
+# MyIterator: 3.7 million items per second
+# CompactIterable: 4.2 million items per second
+
+
+# Fused lazy pipelines:
+# `map(lambda ...)` feeding `filter(lambda ...)` feeding a generator resumes one frame per stage for every element.
+# Pipeline records the stages instead and, when it is iterated, generates a single loop for all of them,
+# much like the comprehension you would write by hand:
+#     for item in source:
+#         item = f0(item)
+#         if p1(item):
+#             yield item
+# The loop is compiled once per shape of pipeline and reused. take(k) stops pulling from the source as soon as k
+# items have passed it, and chunk(n) groups items into lists for the stages after it.
+# When the source is a NumPy array the stages are applied to the whole array at once instead (the functions must
+# then be written with array operations, e.g. lambda x: x * 2 and lambda x: x % 3 == 0).
+_fused_loops = {}  # stage kinds, e.g. ("map", "filter", "take") -> generated generator function
+
+
+def _fused_loop(kinds):
+    if kinds not in _fused_loops:
+        lines = ["def fused(source, stages):"]
+        lines += [f"    s{index} = stages[{index}]" for index in range(len(kinds))]
+        if "take" in kinds:
+            lines += [f"    taken{index} = 0" for index, kind in enumerate(kinds) if kind == "take"]
+            lines += [f"    if s{index} <= 0: return" for index, kind in enumerate(kinds) if kind == "take"]
+        lines.append("    for item in source:")
+        lines += _fused_body(kinds, 0, "        ")
+        namespace = {}
+        exec("\n".join(lines), namespace)
+        _fused_loops[kinds] = namespace["fused"]
+    return _fused_loops[kinds]
+
+
+def _fused_body(kinds, index, indent):
+    # Filters open a nested block instead of using `continue`, so a take() check after them still runs
+    if index == len(kinds):
+        return [f"{indent}yield item"]
+    kind = kinds[index]
+    if kind == "map":
+        return [f"{indent}item = s{index}(item)"] + _fused_body(kinds, index + 1, indent)
+    if kind == "filter":
+        return [f"{indent}if s{index}(item):"] + _fused_body(kinds, index + 1, indent + "    ")
+    # take: count the item, let it through the remaining stages, then stop once the limit is reached
+    return (
+        [f"{indent}taken{index} += 1"]
+        + _fused_body(kinds, index + 1, indent)
+        + [f"{indent}if taken{index} >= s{index}: return"]
+    )
+
+
+def _is_ndarray(value):
+    # Checked by type name so that NumPy is only imported when a NumPy array is actually used
+    return type(value).__name__ == "ndarray" and type(value).__module__ == "numpy"
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Pipeline:
+    __slots__ = ("source", "stages")
+
+    def __init__(self, source, stages=()):
+        self.source = source
+        self.stages = stages  # tuple of (kind, argument); every builder call returns a new Pipeline
+
+    def _extend(self, kind, argument):
+        return Pipeline(self.source, self.stages + ((kind, argument),))
+
+    def map(self, function):
+        return self._extend("map", function)
+
+    def filter(self, predicate):
+        return self._extend("filter", predicate)
+
+    def take(self, count):
+        return self._extend("take", count)
+
+    def chunk(self, size):
+        return self._extend("chunk", size)
+
+    def __iter__(self):
+        if _is_ndarray(self.source):
+            return iter(self._run_vectorized())
+        iterable = self.source
+        if hasattr(iter(self.source), "next_batch"):
+            # The batch protocol hands out slices, and chain() walks them in C
+            iterable = itertools.chain.from_iterable(iter_batches(self.source, 65536))
+        segment = []
+        for kind, argument in self.stages:
+            if kind == "chunk":
+                iterable = _chunked(self._run_segment(iterable, segment), argument)
+                segment = []
+            else:
+                segment.append((kind, argument))
+        return self._run_segment(iterable, segment)
+
+    @staticmethod
+    def _run_segment(iterable, segment):
+        if not segment:
+            return iter(iterable)
+        kinds = tuple(kind for kind, _ in segment)
+        return _fused_loop(kinds)(iterable, [argument for _, argument in segment])
+
+    def _run_vectorized(self):
+        import numpy
+
+        array = self.source
+        for index, (kind, argument) in enumerate(self.stages):
+            if kind == "map":
+                array = argument(array)
+            elif kind == "filter":
+                array = array[argument(array)]
+            elif kind == "take":
+                array = array[: max(argument, 0)]
+            else:
+                chunks = numpy.array_split(array, list(range(argument, len(array), argument)))
+                # Stages after chunk() see one array per chunk, as the Python backend passes one list per chunk
+                return list(Pipeline(chunks, self.stages[index + 1 :]))
+        return array
+
+    def to_list(self):
+        return list(self)
+
+    def collect(self):
+        # Like to_list(), but the NumPy backend returns its result array (or list of chunk arrays) as it is
+        if _is_ndarray(self.source):
+            return self._run_vectorized()
+        return self.to_list()
+
+
+print("\nPipeline example:")
+numbers_pipeline = Pipeline(range(1, 1_000_000_000)).map(lambda x: x * 2).filter(lambda x: x % 3 == 0)
+print(numbers_pipeline.take(4).to_list())  # Output: [6, 12, 18, 24] - only 12 source items were read
+print(numbers_pipeline.chunk(3).take(2).to_list())  # Output: [[6, 12, 18], [24, 30, 36]]
+print(Pipeline(MyIterator([1, 2, 3, 4, 5])).filter(lambda x: x % 2).to_list())  # Output: [1, 3, 5]
+try:
+    import numpy
+
+    vector_pipeline = Pipeline(numpy.arange(1, 20)).map(lambda x: x * 2).filter(lambda x: x % 3 == 0)
+    print(vector_pipeline.take(4).to_list())  # Output: [6, 12, 18, 24]
+except ImportError:
+    print("NumPy is not installed, so only the Python backend was used.")
+# Benchmark: the same three functions as separate map/filter/generator stages, as chained generators and fused
+pipeline_numbers = range(5_000_000)
+
+
+def double(x):
+    return x * 2
+
+
+def is_multiple_of_three(x):
+    return x % 3 == 0
+
+
+def plus_one(x):
+    return x + 1
+
+
+def _chained_stages():
+    return sum(map(plus_one, filter(is_multiple_of_three, map(double, pipeline_numbers))))
+
+
+def _generator_stages():
+    doubled = (double(x) for x in pipeline_numbers)
+    multiples = (x for x in doubled if is_multiple_of_three(x))
+    return sum(plus_one(x) for x in multiples)
+
+
+def _fused_stages():
+    return sum(Pipeline(pipeline_numbers).map(double).filter(is_multiple_of_three).map(plus_one))
+
+
+assert _chained_stages() == _generator_stages() == _fused_stages()
+chained_time = timeit.timeit(_chained_stages, number=1)
+generator_time = timeit.timeit(_generator_stages, number=1)
+fused_time = timeit.timeit(_fused_stages, number=1)
+print(f"map/filter: {chained_time:.2f}s, generators: {generator_time:.2f}s, fused: {fused_time:.2f}s")
+# Output (timings vary by machine): map/filter: 1.39s, generators: 1.38s, fused: 1.14s
+try:
+    import numpy
+
+    vector_numbers = numpy.arange(5_000_000)
+    vector_pipeline = Pipeline(vector_numbers).map(double).filter(is_multiple_of_three).map(plus_one)
+    assert int(vector_pipeline.collect().sum()) == _fused_stages()
+    print(f"NumPy backend: {timeit.timeit(lambda: vector_pipeline.collect().sum(), number=1):.2f}s")
+except ImportError:
+    pass
+
+
+# Parallel lazy map:
+# Pool.map() and Executor.map() submit the whole input before returning the first result, so they never finish on an
+# unbounded generator. parallel_imap() pulls items from the source only as results are consumed and keeps at most
+# `prefetch` items in flight. Results come back in input order; a worker exception is raised when its position is
+# reached, and closing the generator early (break, islice) cancels the queued items and shuts the workers down.
+# The thread backend suits I/O-bound work; CPU-bound work needs the process backend, where `func` and the items must
+# be picklable.
+import collections
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def parallel_imap(func, iterable, workers=None, prefetch=None, backend="thread"):
+    if backend not in ("thread", "process"):
+        raise ValueError(f"unknown backend {backend!r}, expected 'thread' or 'process'")
+    workers = workers or os.cpu_count() or 1
+    prefetch = prefetch or 2 * workers  # enough to keep every worker busy while the consumer handles a result
+    executor_class = ThreadPoolExecutor if backend == "thread" else ProcessPoolExecutor
+    return _parallel_imap(func, iter(iterable), executor_class(max_workers=workers), prefetch)
+
+
+def _parallel_imap(func, iterator, executor, prefetch):
+    pending = collections.deque()
+    try:
+        for item in itertools.islice(iterator, prefetch):
+            pending.append(executor.submit(func, item))
+        while pending:
+            result = pending.popleft().result()
+            for item in itertools.islice(iterator, 1):
+                pending.append(executor.submit(func, item))
+            yield result
+    finally:
+        # Runs on exhaustion, on an exception and on close(), so no worker outlives the generator
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def slow_square(x):
+    time.sleep(0.01)  # stands in for a network or disk call
+    return x * x
+
+
+def checked_inverse(x):
+    if x == 0:
+        raise ZeroDivisionError("item 0 has no inverse")
+    return 1 / x
+
+
+print("\nParallel lazy map example:")
+print(list(itertools.islice(parallel_imap(slow_square, itertools.count(1), workers=8), 5)))
+# Output: [1, 4, 9, 16, 25] - from an unbounded source, of which at most 16 + 5 items were read
+inverses = parallel_imap(checked_inverse, [4, 2, 0, 1], workers=2)
+print(next(inverses), next(inverses))  # Output: 0.25 0.5
+try:
+    next(inverses)
+except ZeroDivisionError as error:
+    print(f"Raised at the third result: {error}")  # Output: Raised at the third result: item 0 has no inverse
+serial_time = timeit.timeit(lambda: list(map(slow_square, range(100))), number=1)
+parallel_time = timeit.timeit(lambda: list(parallel_imap(slow_square, range(100), workers=10)), number=1)
+print(f"Serial: {serial_time:.2f}s, 10 threads: {parallel_time:.2f}s")
+# Output (timings vary by machine): Serial: 1.01s, 10 threads: 0.11s
+
+
+def count_primes(limit):
+    # Deliberately naive CPU-bound work
+    return sum(all(n % d for d in range(2, int(n**0.5) + 1)) for n in range(2, limit))
+
+
+# Each process gets a copy of this script's state, so keep the process demo under the main guard
+if __name__ == "__main__":
+    prime_limits = [20_000 + i for i in range(16)]
+    assert list(parallel_imap(count_primes, prime_limits, workers=4, backend="process")) == list(
+        map(count_primes, prime_limits)
+    )
+    serial_time = timeit.timeit(lambda: list(map(count_primes, prime_limits)), number=1)
+    parallel_time = timeit.timeit(
+        lambda: list(parallel_imap(count_primes, prime_limits, workers=4, backend="process")), number=1
+    )
+    print(f"{os.cpu_count()} CPUs - serial: {serial_time:.2f}s, 4 processes: {parallel_time:.2f}s")
+    # Output (timings vary by machine): 1 CPUs - serial: 1.00s, 4 processes: 0.92s
+    # With a single CPU there is nothing to run in parallel; the speedup grows with the number of CPUs.
+
+
+# Asynchronous iterator protocol:
+# An asynchronous iterable implements `__aiter__()`, and its iterator implements `__anext__()`, a coroutine that
+# raises StopAsyncIteration at the end. `async for` awaits `__anext__()`, so a slow source (such as a socket)
+# can wait without blocking the event loop. See 036_async_await.py for pipelines built from async iterators.
+import asyncio
+
+
+class MyAsyncIterator:
+    def __init__(self, data):
+        self.data = data
+        self.index = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.index < len(self.data):
+            result = self.data[self.index]
+            self.index += 1
+            await asyncio.sleep(0)  # a real source would await a read here
+            return result
+        else:
+            raise StopAsyncIteration
+
+    async def anext_batch(self, n):
+        # The batch protocol again: one await for up to n items
+        start = self.index
+        self.index = min(start + n, len(self.data))
+        await asyncio.sleep(0)
+        return self.data[start : self.index]
+
+
+async def collect_async(async_iterable):
+    return [item async for item in async_iterable]
+
+
+print("\nAsync iterator example:")
+print(asyncio.run(collect_async(MyAsyncIterator([7, 8, 9]))))  # Output: [7, 8, 9]
+print(asyncio.run(MyAsyncIterator([7, 8, 9]).anext_batch(2)))  # Output: [7, 8]
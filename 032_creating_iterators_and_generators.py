@@ -17,11 +17,22 @@ class MyIterator:
         else:
             raise StopIteration
 
+    def next_batch(self, n):
+        # Batch protocol (see 031_iterable_and_iterator_protocols.py): up to n items per call as one slice,
+        # which is empty once the iterator is exhausted
+        start = self.index
+        self.index = min(start + n, len(self.data))
+        return self.data[start : self.index]
+
 
 print("\nIterator example:")
 my_iterator = MyIterator([4, 5, 6])
 for num in my_iterator:
     print(num)  # Output: 4, 5, 6
+# The same iterator can hand out chunks instead of single items; iter() stops at the empty-list sentinel
+my_batch_iterator = MyIterator([4, 5, 6, 7, 8])
+for chunk in iter(lambda: my_batch_iterator.next_batch(2), []):
+    print(chunk)  # Output: [4, 5], [6, 7], [8]
 
 
 # Example of an iterable that can be looped over multiple times
@@ -73,3 +84,149 @@ for num in my_generator():
 # They are particularly useful for processing large datasets or streams of data where you don't need to store all values in memory at once.
 # This lesson provides a foundation for working with iterators and generators in Python, which are powerful tools for managing data flow and memory usage in applications.
 # Understanding these concepts is essential for creating custom iterable objects and for using built-in data structures effectively.
+
+
+# Replaying an exhausted iterator:
+# As shown above, `my_iterator_example` cannot be looped over twice. itertools.tee() remembers every item for the
+# copies that are behind, which for a 100 GB stream means 100 GB of memory. ReplayableIterator wraps a one-shot
+# iterator and records what it yields: the first `memory_items` items stay in memory, and after that every block of
+# `block_items` items is written to a temporary file in a compact binary form:
+# - a block of plain ints (or of floats) is stored as array.array("q") (or "d"): 8 bytes per number,
+# - anything else is pickled with protocol 5, where large buffers such as bytearray or NumPy arrays are written
+#   out-of-band, straight after the pickle, without being copied into it.
+# Every `iter()` call returns an independent cursor that starts from the first item. A cursor holds at most one
+# block in memory and only pulls a new item from the source when it gets past everything recorded so far.
+import array
+import pickle
+import tempfile
+
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+class ReplayableIterator:
+    def __init__(self, iterable, memory_items=100_000, block_items=4096, directory=None):
+        self._source = iter(iterable)
+        self.memory_items = memory_items
+        self.block_items = block_items
+        self.directory = directory
+        self._blocks = []  # each a list in memory, or (codec, offset, sizes) of a block on disk
+        self._tail = []  # the block being filled
+        self._in_memory = 0
+        self._file = None
+        self.spilled_bytes = 0
+        self.exhausted = False
+
+    def __iter__(self):
+        return ReplayCursor(self)
+
+    def _pull(self):
+        # Records one more item from the source; returns False once the source is exhausted
+        if self.exhausted:
+            return False
+        try:
+            item = next(self._source)
+        except StopIteration:
+            self.exhausted = True
+            return False
+        self._tail.append(item)
+        if len(self._tail) == self.block_items:
+            self._seal()
+        return True
+
+    def _seal(self):
+        block, self._tail = self._tail, []
+        if self._in_memory + len(block) <= self.memory_items:
+            self._in_memory += len(block)
+            self._blocks.append(block)
+        else:
+            self._blocks.append(self._spill(block))
+
+    def _spill(self, block):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self.directory)  # deleted when closed
+        if all(type(item) is int and _INT64_MIN <= item <= _INT64_MAX for item in block):
+            codec, parts = "q", [array.array("q", block)]
+        elif all(type(item) is float for item in block):
+            codec, parts = "d", [array.array("d", block)]
+        else:
+            buffers = []
+            data = pickle.dumps(block, protocol=5, buffer_callback=buffers.append)
+            codec, parts = "pickle", [data] + [buffer.raw() for buffer in buffers]
+        offset = self._file.seek(0, 2)
+        sizes = []
+        for part in parts:
+            sizes.append(self._file.write(part))
+        self.spilled_bytes += sum(sizes)
+        return codec, offset, sizes
+
+    def _load(self, index):
+        block = self._blocks[index]
+        if isinstance(block, list):
+            return block
+        codec, offset, sizes = block
+        self._file.seek(offset)
+        if codec != "pickle":
+            items = array.array(codec)
+            items.frombytes(self._file.read(sizes[0]))
+            return items
+        data = self._file.read(sizes[0])
+        return pickle.loads(data, buffers=[bytearray(self._file.read(size)) for size in sizes[1:]])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayCursor:
+    __slots__ = ("owner", "block", "offset", "items")
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.block = 0
+        self.offset = 0
+        self.items = None  # the block being read, loaded on first use
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        owner = self.owner
+        while True:
+            if self.block < len(owner._blocks):
+                if self.items is None:
+                    self.items = owner._load(self.block)
+                if self.offset < len(self.items):
+                    item = self.items[self.offset]
+                    self.offset += 1
+                    return item
+                self.block, self.offset, self.items = self.block + 1, 0, None
+            elif self.offset < len(owner._tail):
+                # When the tail is sealed it becomes block number self.block, so the position stays valid
+                item = owner._tail[self.offset]
+                self.offset += 1
+                return item
+            elif not owner._pull():
+                raise StopIteration
+
+
+print("\nReplayable iterator example:")
+replayable = ReplayableIterator(MyIterator([10, 11, 12]))
+print(list(replayable), list(replayable))  # Output: [10, 11, 12] [10, 11, 12]
+first_cursor, second_cursor = iter(replayable), iter(replayable)
+print(next(first_cursor), next(first_cursor), next(second_cursor))  # Output: 10 11 10
+# Only 1,000 numbers stay in memory; the other 999,000 go to disk as 8-byte array items
+with ReplayableIterator((i * i for i in range(1_000_000)), memory_items=1000, block_items=1000) as squares:
+    print(sum(squares), sum(squares))  # Output: 333332833333500000 333332833333500000
+    print(squares.spilled_bytes)  # Output: 7992000
+# Mixed items are pickled, with each bytearray written out-of-band
+with ReplayableIterator(
+    ({"id": i, "payload": bytearray(100)} for i in range(10_000)), memory_items=0, block_items=500
+) as records:
+    print(sum(record["id"] for record in records), len(list(records)))  # Output: 49995000 10000
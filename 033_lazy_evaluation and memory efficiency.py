@@ -24,3 +24,195 @@ for num in lazy_gen:
     # As the values are generated on-the-fly, the memory usage is reduced.
 # This technique is particularly useful when working with large datasets or when the computation of values is expensive.
 # It allows you to process data in chunks, reducing memory usage and improving performance.
+# The same generator can be written as an asynchronous generator, which may await while producing values,
+# for example a network read. It is consumed with `async for` inside a coroutine:
+import asyncio
+
+
+async def async_lazy_evaluation_example():
+    for i in range(10):
+        await asyncio.sleep(0)  # stands in for waiting on I/O
+        yield i * 2
+
+
+async def print_async_values():
+    async for num in async_lazy_evaluation_example():
+        print(num)  # Output: 0, 2, 4, 6, 8, 10, 12, 14, 16, 18
+
+
+asyncio.run(print_async_values())
+
+# Window aggregations over infinite streams:
+# An infinite generator can never be turned into a list, so statistics have to be computed over windows:
+# - a sliding window covers the last `size` items and moves by one item at a time,
+# - a tumbling window covers items 0..size-1, then size..2*size-1, and so on, without overlap.
+# Each function below is a generator stage: it takes any iterable and yields one result per item (sliding) or per
+# window (tumbling), so stages can be chained and only run as far as the consumer reads. Every update costs O(1)
+# amortized time and memory never grows beyond the window:
+# - sums keep a running total instead of re-adding the window,
+# - min/max keep a monotonic deque: items that can never be the minimum again (because a smaller, newer item
+#   exists) are dropped, so the front of the deque is always the answer,
+# - distinct counts use HyperLogLog, which estimates the number of different items from 2**precision small
+#   registers (about 1.6% error with precision=12) instead of a set of every item seen.
+import itertools
+import math
+from collections import deque, namedtuple
+
+_MASK64 = (1 << 64) - 1
+
+
+def _hash64(item):
+    # hash() of small ints is the int itself, so mix the bits (splitmix64) before using them as random bits
+    z = (hash(item) + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+def _hll_alpha(registers):
+    return {16: 0.673, 32: 0.697, 64: 0.709}.get(registers, 0.7213 / (1 + 1.079 / registers))
+
+
+def _hll_estimate(registers, zeros, harmonic_sum, max_rank):
+    # harmonic_sum is sum(2 ** (max_rank - register)) kept as an exact integer
+    estimate = _hll_alpha(registers) * registers * registers * (1 << max_rank) / harmonic_sum
+    if estimate <= 2.5 * registers and zeros:
+        return registers * math.log(registers / zeros)  # linear counting is more accurate for small counts
+    return estimate
+
+
+class HyperLogLog:
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def _locate(self, item):
+        # The first `precision` bits pick a register; the rank is the position of the first 1 in the remaining bits
+        value = _hash64(item)
+        remaining_bits = 64 - self.precision
+        rest = value & ((1 << remaining_bits) - 1)
+        return value >> remaining_bits, remaining_bits - rest.bit_length() + 1
+
+    def add(self, item):
+        index, rank = self._locate(item)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        max_rank = 64 - self.precision + 1
+        harmonic_sum = sum(1 << (max_rank - register) for register in self.registers)
+        return _hll_estimate(len(self.registers), self.registers.count(0), harmonic_sum, max_rank)
+
+
+def sliding_sum(iterable, size):
+    window = deque()
+    total = 0
+    for count, item in enumerate(iterable, 1):
+        window.append(item)
+        total += item
+        if len(window) > size:
+            total -= window.popleft()
+        if count % size == 0:
+            total = sum(window)  # removes float rounding drift; O(size) once every size items is O(1) amortized
+        yield total
+
+
+def sliding_mean(iterable, size):
+    for count, total in enumerate(sliding_sum(iterable, size), 1):
+        yield total / min(count, size)
+
+
+def _sliding_extreme(iterable, size, replaces):
+    candidates = deque()  # (position, item), items ordered so the front is the current answer
+    for position, item in enumerate(iterable):
+        while candidates and replaces(item, candidates[-1][1]):
+            candidates.pop()
+        candidates.append((position, item))
+        if candidates[0][0] <= position - size:
+            candidates.popleft()
+        yield candidates[0][1]
+
+
+def sliding_min(iterable, size):
+    return _sliding_extreme(iterable, size, lambda new, old: new <= old)
+
+
+def sliding_max(iterable, size):
+    return _sliding_extreme(iterable, size, lambda new, old: new >= old)
+
+
+def sliding_distinct(iterable, size, precision=10):
+    # A HyperLogLog register has to "forget" items leaving the window, so each register keeps a monotonic deque of
+    # (position, rank) like sliding_max() and its value is the largest rank still inside the window
+    hll = HyperLogLog(precision)
+    registers = 1 << precision
+    max_rank = 64 - precision + 1
+    candidates = [deque() for _ in range(registers)]
+    arrivals = deque()  # (position, register) of every item in the window, oldest first
+    values = [0] * registers
+    zeros, harmonic_sum = registers, registers << max_rank
+
+    def set_register(index, value):
+        nonlocal zeros, harmonic_sum
+        zeros += (value == 0) - (values[index] == 0)
+        harmonic_sum += (1 << (max_rank - value)) - (1 << (max_rank - values[index]))
+        values[index] = value
+
+    for position, item in enumerate(iterable):
+        index, rank = hll._locate(item)
+        register = candidates[index]
+        while register and register[-1][1] <= rank:
+            register.pop()
+        register.append((position, rank))
+        arrivals.append((position, index))
+        set_register(index, register[0][1])
+        while arrivals[0][0] <= position - size:
+            expired, index = arrivals.popleft()
+            register = candidates[index]
+            if register and register[0][0] == expired:
+                register.popleft()
+                set_register(index, register[0][1] if register else 0)
+        yield _hll_estimate(registers, zeros, harmonic_sum, max_rank)
+
+
+WindowStats = namedtuple("WindowStats", ["count", "sum", "mean", "min", "max", "distinct"])
+
+
+def tumbling_stats(iterable, size, precision=12):
+    # One pass per window with running values, so a window of a billion items still needs only O(1) memory
+    iterator = iter(iterable)
+    while True:
+        window = itertools.islice(iterator, size)
+        first = next(window, None)
+        if first is None:
+            return
+        count, total, low, high = 1, first, first, first
+        distinct = HyperLogLog(precision)
+        distinct.add(first)
+        for item in window:
+            count += 1
+            total += item
+            if item < low:
+                low = item
+            elif item > high:
+                high = item
+            distinct.add(item)
+        yield WindowStats(count, total, total / count, low, high, round(distinct.count()))
+
+
+def sensor_readings():
+    # An infinite stream: 0, 3, 6, ..., 99 and around again
+    for i in itertools.count():
+        yield (i * 3) % 100
+
+
+print(list(itertools.islice(sliding_sum(sensor_readings(), 3), 6)))  # Output: [0, 3, 9, 18, 27, 36]
+print(list(itertools.islice(sliding_max(sensor_readings(), 3), 36))[32:])  # Output: [96, 99, 99, 99]
+print(list(itertools.islice(sliding_min(sensor_readings(), 3), 36))[32:])  # Output: [90, 93, 2, 2]
+print(next(itertools.islice(tumbling_stats(sensor_readings(), 1000), 2, None)))
+# Output: WindowStats(count=1000, sum=49500, mean=49.5, min=0, max=99, distinct=97) - 100 exactly, 97 estimated
+distinct_estimates = sliding_distinct(itertools.count(), 10_000)
+print(round(next(itertools.islice(distinct_estimates, 99_999, None))))  # Output: 9891 - the last 10,000 numbers are all different
@@ -40,13 +40,175 @@ def increment_counter():
 
 # Creating threads
 threads = [threading.Thread(target=increment_counter)]
-for tread in threads:
+for thread in threads:
     thread.start()
-for tread in threads:
+for thread in threads:
     thread.join()
 
 print("Counter: ", counter)
 
+# Striped counters:
+# increment_counter() takes the same lock for every increment, so with many threads each increment waits for the
+# others; on free-threaded builds (3.13t), where threads really run in parallel, that lock serialises all of them.
+# StripedCounter gives every thread its own slot (a stripe) instead. Only the owning thread ever writes to a
+# slot, so increments need no lock; the lock is only taken the first time a thread uses the counter. Reading the
+# value adds up the slots of every live thread plus a retired total: when a thread ends, its threading.local data
+# is freed and a weakref.finalize() callback folds its slot into the retired total, so no counts are lost and a
+# program that keeps starting short-lived threads does not collect one slot per thread it ever ran.
+# A read that runs while other threads are incrementing may miss their latest increments, like any metric.
+import itertools
+import weakref
+
+
+class _StripeOwner:
+    # Kept only in the owning thread's threading.local, so it is freed when that thread ends
+    __slots__ = ("__weakref__",)
+
+
+def _retire_counter_stripe(lock, stripes, retired, key):
+    with lock:
+        retired[0] += stripes.pop(key)[0]
+
+
+def _retire_metrics_stripe(lock, stripes, retired, key):
+    with lock:
+        for name, amount in stripes.pop(key).items():
+            retired[name] = retired.get(name, 0) + amount
+
+
+def _watch_stripe_owner(local, retire, *args):
+    # The callback gets the shared state rather than the counter itself, so it does not keep the counter alive
+    owner = local.owner = _StripeOwner()
+    weakref.finalize(owner, retire, *args).atexit = False
+
+
+class StripedCounter:
+    def __init__(self):
+        self._local = threading.local()
+        self._stripes = {}  # key -> single-item list, one per live thread
+        self._retired = [0]  # total of the stripes whose threads have ended
+        self._stripes_lock = threading.Lock()
+        self._keys = itertools.count()
+
+    def _new_stripe(self):
+        stripe = [0]
+        with self._stripes_lock:
+            key = next(self._keys)
+            self._stripes[key] = stripe
+        _watch_stripe_owner(
+            self._local, _retire_counter_stripe, self._stripes_lock, self._stripes, self._retired, key
+        )
+        self._local.stripe = stripe
+        return stripe
+
+    def increment(self, amount=1):
+        try:
+            stripe = self._local.stripe
+        except AttributeError:
+            stripe = self._new_stripe()
+        stripe[0] += amount
+
+    @property
+    def value(self):
+        with self._stripes_lock:
+            return self._retired[0] + sum(stripe[0] for stripe in self._stripes.values())
+
+    def stripe_count(self):
+        # Number of live threads that have used the counter
+        with self._stripes_lock:
+            return len(self._stripes)
+
+
+# The same idea for a set of named metrics: one dict per thread, merged when read
+class StripedMetrics:
+    def __init__(self):
+        self._local = threading.local()
+        self._stripes = {}
+        self._retired = {}
+        self._stripes_lock = threading.Lock()
+        self._keys = itertools.count()
+
+    def add(self, name, amount=1):
+        try:
+            stripe = self._local.stripe
+        except AttributeError:
+            stripe = {}
+            with self._stripes_lock:
+                key = next(self._keys)
+                self._stripes[key] = stripe
+            _watch_stripe_owner(
+                self._local, _retire_metrics_stripe, self._stripes_lock, self._stripes, self._retired, key
+            )
+            self._local.stripe = stripe
+        stripe[name] = stripe.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._stripes_lock:
+            totals = dict(self._retired)
+            stripes = [dict(stripe) for stripe in self._stripes.values()]
+        for stripe in stripes:
+            for name, amount in stripe.items():
+                totals[name] = totals.get(name, 0) + amount
+        return totals
+
+
+striped_counter = StripedCounter()
+request_metrics = StripedMetrics()
+
+
+def handle_requests(count):
+    for i in range(count):
+        striped_counter.increment()
+        request_metrics.add("errors" if i % 10 == 0 else "ok")
+
+
+threads = [threading.Thread(target=handle_requests, args=(1000,)) for _ in range(4)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+print("Striped counter: ", striped_counter.value)  # Output: Striped counter:  4000
+print(request_metrics.snapshot())  # Output: {'errors': 400, 'ok': 3600}
+# The four threads have ended, so their stripes were folded into the retired totals
+print(striped_counter.stripe_count(), striped_counter.value)  # Output: 0 4000
+
+
+# Benchmark: 1,000,000 increments split across a growing number of threads
+def _run_threads(target, thread_count, increments):
+    threads = [threading.Thread(target=target, args=(increments // thread_count,)) for _ in range(thread_count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def _locked_increments(count):
+    for _ in range(count):
+        increment_counter()
+
+
+def _striped_increments(count):
+    increment = benchmark_counter.increment
+    for _ in range(count):
+        increment()
+
+
+for thread_count in [1, 4, 16, 32]:
+    counter = 0
+    benchmark_counter = StripedCounter()
+    locked_time = _run_threads(_locked_increments, thread_count, 1_000_000)
+    striped_time = _run_threads(_striped_increments, thread_count, 1_000_000)
+    assert counter == benchmark_counter.value == 1_000_000
+    print(f"{thread_count} threads - one lock: {locked_time:.2f}s, striped: {striped_time:.2f}s")
+# Output (timings vary by machine, measured with the GIL):
+# 1 threads - one lock: 0.40s, striped: 0.14s
+# 4 threads - one lock: 0.38s, striped: 0.16s
+# 16 threads - one lock: 0.40s, striped: 0.15s
+# 32 threads - one lock: 0.57s, striped: 0.16s
+# Without the GIL the lock version gets slower as threads are added, while the striped version scales with the cores.
+
 
 import queue
 
@@ -83,6 +245,567 @@ consumer_thread.join()
 
 print("Finished.")
 
+# Batched work queue:
+# queue.Queue takes a lock and notifies a condition for every single put() and get(), and the None sentinel above only
+# stops one consumer, so N consumers need N sentinels. BatchQueue moves items in batches instead:
+# - put_many(items) adds a whole list under one lock acquisition, and get_batch(max_items) takes up to max_items,
+# - with a maxsize, put_many() waits for free space (backpressure) and adds items as space frees up,
+# - close() wakes every waiting consumer at once; get_batch() then returns what is left and finally an empty list,
+#   so `while batch := work.get_batch():` ends in every consumer.
+import collections
+
+
+class QueueClosed(Exception):
+    """Raised by put() and put_many() once the queue is closed."""
+
+
+class BatchQueue:
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize  # 0 means unbounded, as in queue.Queue
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+
+    def _wait(self, condition, ready, deadline, timeout_error):
+        while not ready():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise timeout_error
+            condition.wait(remaining)
+
+    def put(self, item, timeout=None):
+        self.put_many([item], timeout)
+
+    def put_many(self, items, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        items = list(items)
+        start = 0
+        with self._lock:
+            while start < len(items):
+                if self._closed:
+                    raise QueueClosed("put on a closed queue")
+                if self.maxsize:
+                    self._wait(
+                        self._not_full,
+                        lambda: self._closed or len(self._items) < self.maxsize,
+                        deadline,
+                        queue.Full(),
+                    )
+                    if self._closed:
+                        continue
+                    stop = min(len(items), start + self.maxsize - len(self._items))
+                else:
+                    stop = len(items)
+                self._items.extend(items[start:stop])
+                self._not_empty.notify(stop - start)
+                start = stop
+
+    def get_batch(self, max_items=1024, timeout=None):
+        # An empty batch means "closed and drained", so a request for no items at all is refused
+        if max_items < 1:
+            raise ValueError("max_items must be at least 1.")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._wait(self._not_empty, lambda: self._items or self._closed, deadline, queue.Empty())
+            count = min(max_items, len(self._items))
+            batch = [self._items.popleft() for _ in range(count)]
+            if count and self.maxsize:
+                self._not_full.notify(count)
+            return batch  # empty only when the queue is closed and drained
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def qsize(self):
+        with self._lock:
+            return len(self._items)
+
+
+def batch_consumer(work, results):
+    while batch := work.get_batch(max_items=2):
+        results.extend(batch)
+
+
+work = BatchQueue(maxsize=4)
+consumed_items = []
+consumer_threads = [threading.Thread(target=batch_consumer, args=(work, consumed_items)) for _ in range(3)]
+for thread in consumer_threads:
+    thread.start()
+work.put_many(range(10))  # waits whenever 4 items are queued
+work.close()  # one call stops all three consumers
+for thread in consumer_threads:
+    thread.join()
+print(sorted(consumed_items))  # Output: [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+try:
+    work.get_batch(max_items=0)  # an empty batch would look like "closed", so this is refused
+except ValueError as error:
+    print(error)  # Output: max_items must be at least 1.
+
+
+# Benchmark: 200,000 items from one producer to 1, 4 and 16 consumers
+def _queue_throughput(consumer_count, item_count=200_000):
+    items = queue.Queue(maxsize=10_000)
+
+    def consume():
+        while items.get() is not None:
+            pass
+
+    consumers = [threading.Thread(target=consume) for _ in range(consumer_count)]
+    start = time.perf_counter()
+    for thread in consumers:
+        thread.start()
+    for i in range(item_count):
+        items.put(i)
+    for _ in consumers:
+        items.put(None)  # one sentinel per consumer
+    for thread in consumers:
+        thread.join()
+    return item_count / (time.perf_counter() - start)
+
+
+def _batch_queue_throughput(consumer_count, item_count=200_000, batch_size=256):
+    items = BatchQueue(maxsize=10_000)
+
+    def consume():
+        while items.get_batch(batch_size):
+            pass
+
+    consumers = [threading.Thread(target=consume) for _ in range(consumer_count)]
+    start = time.perf_counter()
+    for thread in consumers:
+        thread.start()
+    for first in range(0, item_count, batch_size):
+        items.put_many(range(first, min(first + batch_size, item_count)))
+    items.close()
+    for thread in consumers:
+        thread.join()
+    return item_count / (time.perf_counter() - start)
+
+
+for consumer_count in [1, 4, 16]:
+    print(
+        f"{consumer_count} consumers - queue.Queue: {_queue_throughput(consumer_count):,.0f} items/s, "
+        f"BatchQueue: {_batch_queue_throughput(consumer_count):,.0f} items/s"
+    )
+# Output (timings vary by machine):
+# 1 consumers - queue.Queue: 342,185 items/s, BatchQueue: 9,109,221 items/s
+# 4 consumers - queue.Queue: 374,598 items/s, BatchQueue: 12,020,746 items/s
+# 16 consumers - queue.Queue: 298,462 items/s, BatchQueue: 11,460,964 items/s
+
+# Work-stealing thread pool:
+# ThreadPoolExecutor feeds all workers from one shared queue. WorkStealingExecutor gives each worker its own deque:
+# - tasks submitted from outside the pool are spread over the workers' deques in turn,
+# - a task that submits subtasks puts them on its own worker's deque, where they stay warm and need no shared lock,
+# - a worker takes its newest task first (LIFO); a worker with an empty deque steals the oldest task (FIFO) from
+#   another worker, usually the largest piece of remaining work, so nobody sits idle behind one long task.
+# It implements the concurrent.futures.Executor API, so submit(), map(), shutdown() and `with` work as usual.
+# A task can wait for its subtasks with help_until_done(future), which runs other tasks in the meantime instead of
+# blocking its worker (blocking every worker on subtasks that no worker is free to run would deadlock).
+import random
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
+
+
+class WorkStealingExecutor(Executor):
+    def __init__(self, max_workers=4):
+        self._deques = [collections.deque() for _ in range(max_workers)]
+        self._stats = [{"executed": 0, "stolen": 0, "idle_seconds": 0.0} for _ in range(max_workers)]
+        self._work_available = threading.Condition()
+        self._local = threading.local()
+        self._next_deque = 0
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._worker, args=(index,), daemon=True) for index in range(max_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, /, *args, **kwargs):
+        if self._shutdown:
+            raise RuntimeError("cannot schedule new futures after shutdown")
+        future = Future()
+        index = getattr(self._local, "index", None)
+        if index is None:
+            index = self._next_deque  # round-robin for tasks from outside the pool
+            self._next_deque = (index + 1) % len(self._deques)
+        self._deques[index].append((future, fn, args, kwargs))  # deque.append() is thread-safe
+        with self._work_available:
+            self._work_available.notify()
+        return future
+
+    def _find_task(self, index):
+        # Own deque first, newest task first; then steal the oldest task of another worker, starting at a random one
+        try:
+            return self._deques[index].pop()
+        except IndexError:
+            pass
+        count = len(self._deques)
+        start = random.randrange(count)
+        for offset in range(count):
+            victim = (start + offset) % count
+            if victim == index:
+                continue
+            try:
+                task = self._deques[victim].popleft()
+            except IndexError:
+                continue
+            self._stats[index]["stolen"] += 1
+            return task
+        return None
+
+    def _run(self, index, task):
+        future, fn, args, kwargs = task
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as error:
+                future.set_exception(error)
+        self._stats[index]["executed"] += 1
+
+    def _worker(self, index):
+        self._local.index = index
+        while True:
+            task = self._find_task(index)
+            if task is not None:
+                self._run(index, task)
+                continue
+            idle_start = time.perf_counter()
+            with self._work_available:
+                # Checked again under the lock, so a submit() between the search and wait() cannot be missed
+                while not any(self._deques):
+                    if self._shutdown:
+                        return
+                    self._work_available.wait()
+            self._stats[index]["idle_seconds"] += time.perf_counter() - idle_start
+
+    def help_until_done(self, future):
+        # For use inside a task: runs queued tasks until `future` is done, then returns its result
+        index = getattr(self._local, "index", None)
+        if index is None:
+            return future.result()  # outside the pool there is no worker to lend
+        while not future.done():
+            task = self._find_task(index)
+            if task is not None:
+                self._run(index, task)
+            else:
+                wait([future], timeout=0.001)  # nothing to run: wait a moment for other workers
+        return future.result()
+
+    def stats(self):
+        # Per worker: tasks executed, tasks stolen from other workers and seconds spent waiting for work
+        return [dict(worker_stats) for worker_stats in self._stats]
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        if cancel_futures:
+            for tasks in self._deques:
+                while tasks:
+                    try:
+                        tasks.popleft()[0].cancel()
+                    except IndexError:
+                        break
+        with self._work_available:
+            self._shutdown = True
+            self._work_available.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+def parallel_sum(executor, numbers):
+    # Fork/join: split the range until the pieces are small, adding the pieces up in parallel
+    if len(numbers) <= 1000:
+        return sum(numbers)
+    middle = len(numbers) // 2
+    right = executor.submit(parallel_sum, executor, numbers[middle:])
+    left = parallel_sum(executor, numbers[:middle])
+    return left + executor.help_until_done(right)
+
+
+with WorkStealingExecutor(max_workers=4) as stealing_pool:
+    print(stealing_pool.submit(parallel_sum, stealing_pool, range(1_000_000)).result())  # Output: 499999500000
+    print(list(stealing_pool.map(abs, [-1, -2, 3])))  # Output: [1, 2, 3]
+    print(sum(worker["executed"] for worker in stealing_pool.stats()) > 0)  # Output: True
+
+
+# The awaited subtask may have been stolen and still be running elsewhere when its parent runs out of tasks to help
+# with; help_until_done() then keeps waiting for it instead of giving up after one poll interval
+def _slow_subtask(started):
+    started.set()
+    time.sleep(0.05)
+    return "slow subtask done"
+
+
+def _await_stolen_subtask(executor):
+    started = threading.Event()
+    subtask = executor.submit(_slow_subtask, started)
+    assert started.wait(timeout=5)  # another worker has stolen the subtask and is running it
+    return executor.help_until_done(subtask)
+
+
+with WorkStealingExecutor(max_workers=2) as stealing_pool:
+    print(stealing_pool.submit(_await_stolen_subtask, stealing_pool).result())  # Output: slow subtask done
+
+
+# Benchmark: one task spawns 200 subtasks of very different lengths (sleeps stand in for I/O). They all land on the
+# spawning worker's deque, and the other three workers only get work by stealing it.
+def _skewed_task(executor, i):
+    time.sleep(0.02 if i % 10 == 0 else 0.001)
+
+
+def _spawn_skewed(executor):
+    return [executor.submit(_skewed_task, executor, i) for i in range(200)]
+
+
+for pool_class in [ThreadPoolExecutor, WorkStealingExecutor]:
+    with pool_class(max_workers=4) as pool:
+        start = time.perf_counter()
+        for future in pool.submit(_spawn_skewed, pool).result():
+            future.result()
+        elapsed = time.perf_counter() - start
+        if isinstance(pool, WorkStealingExecutor):
+            steals = sum(worker["stolen"] for worker in pool.stats())
+            idle = sum(worker["idle_seconds"] for worker in pool.stats())
+            print(f"{pool_class.__name__}: {elapsed:.2f}s, {steals} steals, {idle:.2f}s idle in total")
+        else:
+            print(f"{pool_class.__name__}: {elapsed:.2f}s")
+# Output (timings vary by machine):
+# ThreadPoolExecutor: 0.16s
+# WorkStealingExecutor: 0.16s, 150 steals, 0.01s idle in total
+# Both keep all four workers busy. The stealing pool does it without a queue shared by every task, which matters
+# once tasks are tiny and numerous, or when threads run in parallel without the GIL.
+
+# Instrumenting queues and pools:
+# When a pipeline is slow, the question is where the time goes: are consumers starved, are producers blocked on a
+# full queue, or do items sit in the queue for seconds? The wrappers below measure it:
+# - InstrumentedQueue is a queue.Queue that timestamps every item. It records how long items wait in the queue
+#   (put -> get), how long consumers work on them (get -> task_done), how long put() blocks (producers) and get()
+#   blocks (consumers), the queue depth at every put and get, and how busy the consumer threads are,
+# - InstrumentedExecutor wraps any concurrent.futures executor and records the wait and run time of every task.
+# Times go into HdrHistograms: like the HDR Histogram library, values are counted in log-linear buckets that keep
+# every value to within 1/64 (about 1.6%), in a fixed array of counters sized by the largest value, no matter how
+# many values are recorded. Recording is one index calculation and one counter update, so it can stay on in
+# production.
+# snapshot() returns plain dicts and lists that json.dumps() can write out. The class lives in hdr_histogram.py,
+# next to this file, because 035_multiprocessing.py uses it too.
+import json
+import timeit
+
+from hdr_histogram import HdrHistogram
+
+
+def _microseconds(seconds):
+    return int(seconds * 1_000_000)
+
+
+class InstrumentedQueue(queue.Queue):
+    def __init__(self, maxsize=0, depth_samples=1024):
+        super().__init__(maxsize)
+        self.queue_wait = HdrHistogram()  # put -> get, in microseconds
+        self.service_time = HdrHistogram()  # get -> task_done
+        self.put_blocked = HdrHistogram()  # time put() waited for space
+        self.get_blocked = HdrHistogram()  # time get() waited for an item
+        self.depth = HdrHistogram(highest_value=1 << 20)
+        self.depth_over_time = collections.deque(maxlen=depth_samples)  # (seconds since creation, depth)
+        self._created = time.perf_counter()
+        self._next_depth_sample = self._created
+        self._busy_seconds = 0.0
+        self._consumers = set()
+        self._local = threading.local()
+
+    # _put() and _get() are the hooks queue.Queue calls with its mutex held. Every other recording also takes that
+    # mutex, so the histograms are only ever updated by one thread at a time.
+    def _put(self, item):
+        self.queue.append((time.perf_counter(), item))
+        self._record_depth()
+
+    def _get(self):
+        enqueued, item = self.queue.popleft()
+        self.queue_wait.record(_microseconds(time.perf_counter() - enqueued))
+        self._record_depth()
+        return item
+
+    def _record_depth(self):
+        depth = len(self.queue)
+        self.depth.record(depth)
+        now = time.perf_counter()
+        # At most one sample per millisecond, so the fixed-size history covers a useful stretch of time
+        if now >= self._next_depth_sample:
+            self._next_depth_sample = now + 0.001
+            self.depth_over_time.append((round(now - self._created, 6), depth))
+
+    def put(self, item, block=True, timeout=None):
+        start = time.perf_counter()
+        super().put(item, block, timeout)
+        blocked = _microseconds(time.perf_counter() - start)
+        with self.mutex:
+            self.put_blocked.record(blocked)
+
+    def get(self, block=True, timeout=None):
+        start = time.perf_counter()
+        item = super().get(block, timeout)
+        now = time.perf_counter()
+        self._local.started = now
+        with self.mutex:
+            self.get_blocked.record(_microseconds(now - start))
+            self._consumers.add(threading.get_ident())
+        return item
+
+    def task_done(self):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            with self.mutex:
+                self.service_time.record(_microseconds(elapsed))
+                self._busy_seconds += elapsed
+            self._local.started = None
+        super().task_done()
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self._created
+        with self.mutex:
+            consumers = len(self._consumers)
+            return {
+                "elapsed_seconds": elapsed,
+                "consumers": consumers,
+                # Share of the consumers' time spent between get() and task_done()
+                "consumer_utilization": self._busy_seconds / (elapsed * consumers) if consumers else 0.0,
+                "queue_wait_us": self.queue_wait.snapshot(),
+                "service_time_us": self.service_time.snapshot(),
+                "put_blocked_us": self.put_blocked.snapshot(),
+                "get_blocked_us": self.get_blocked.snapshot(),
+                "depth": self.depth.snapshot(),
+                "depth_over_time": list(self.depth_over_time),
+            }
+
+
+def _timed_call(fn, args, kwargs):
+    # Runs in the worker; module level so process pools can pickle it. time.monotonic() is the same clock in every
+    # process on one machine, so the parent can compare it with the submit time.
+    start = time.monotonic()
+    result = fn(*args, **kwargs)
+    return start, time.monotonic(), result
+
+
+class _ForwardingFuture(Future):
+    # What InstrumentedExecutor.submit() returns. It reports running while the wrapped executor's future runs, and
+    # cancelling it cancels that future, so like any executor's future it can only be cancelled before it starts.
+    def __init__(self, inner):
+        super().__init__()
+        self._inner = inner
+
+    def running(self):
+        return super().running() or (self._inner.running() and not self.done())
+
+    def cancel(self):
+        # A successful inner.cancel() runs the done callback, which cancels this future
+        self._inner.cancel()
+        return self.cancelled()
+
+
+class InstrumentedExecutor(Executor):
+    def __init__(self, executor, workers):
+        self.executor = executor
+        self.workers = workers
+        self.queue_wait = HdrHistogram()
+        self.service_time = HdrHistogram()
+        self._created = time.monotonic()
+        self._busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        submitted = time.monotonic()
+        inner = self.executor.submit(_timed_call, fn, args, kwargs)
+        outer = _ForwardingFuture(inner)
+
+        def finish(inner):
+            # Runs when the task is done: record the timings and pass the result (or exception) on
+            if inner.cancelled():
+                Future.cancel(outer)
+            if not outer.set_running_or_notify_cancel():
+                return  # cancelled before the task started
+            error = inner.exception()
+            if error is not None:
+                outer.set_exception(error)
+                return
+            start, end, result = inner.result()
+            with self._lock:
+                self.queue_wait.record(_microseconds(start - submitted))
+                self.service_time.record(_microseconds(end - start))
+                self._busy_seconds += end - start
+            outer.set_result(result)
+
+        inner.add_done_callback(finish)
+        return outer
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self._created
+        with self._lock:
+            return {
+                "elapsed_seconds": elapsed,
+                "workers": self.workers,
+                "worker_utilization": self._busy_seconds / (elapsed * self.workers),
+                "queue_wait_us": self.queue_wait.snapshot(),
+                "service_time_us": self.service_time.snapshot(),
+            }
+
+
+latencies = HdrHistogram()
+for value in [1, 5, 100, 1_000, 1_000_000]:
+    latencies.record(value)
+print(latencies.percentile(50), latencies.percentile(100), len(latencies.counts))  # Output: 100 1000000 1708
+restored = HdrHistogram.from_snapshot(json.loads(json.dumps(latencies.snapshot())))
+print(restored.percentile(50), restored.counts == latencies.counts)  # Output: 100 True
+
+
+def instrumented_consumer(work):
+    while (item := work.get()) is not None:
+        time.sleep(0.001 * item)  # the work
+        work.task_done()
+    work.task_done()
+
+
+work = InstrumentedQueue(maxsize=10)
+consumer_threads = [threading.Thread(target=instrumented_consumer, args=(work,)) for _ in range(2)]
+for thread in consumer_threads:
+    thread.start()
+for i in range(100):
+    work.put(i % 5)
+for _ in consumer_threads:
+    work.put(None)
+for thread in consumer_threads:
+    thread.join()
+queue_report = work.snapshot()
+print(queue_report["queue_wait_us"]["count"], queue_report["depth"]["max"])  # Output: 102 10
+print(f"p99 wait in queue: {queue_report['queue_wait_us']['p99'] / 1000:.1f} ms")
+# Output (varies by machine): p99 wait in queue: 20.5 ms
+with InstrumentedExecutor(ThreadPoolExecutor(max_workers=4), workers=4) as pool:
+    list(pool.map(time.sleep, [0.01] * 20))
+    pool_report = pool.snapshot()
+print(pool_report["service_time_us"]["count"], pool_report["service_time_us"]["p50"] >= 10_000)  # Output: 20 True
+# Cancelling works as with the wrapped executor: a running task keeps going, a queued one is dropped
+with InstrumentedExecutor(ThreadPoolExecutor(max_workers=1), workers=1) as pool:
+    running_task = pool.submit(time.sleep, 0.05)
+    queued_task = pool.submit(abs, -1)
+    while not running_task.running():
+        time.sleep(0.001)
+    print(running_task.cancel(), queued_task.cancel())  # Output: False True
+    print(running_task.result(), queued_task.cancelled())  # Output: None True
+print(len(json.dumps({"queue": queue_report, "pool": pool_report})) > 0)  # Output: True
+# Overhead: the cost per item of the instrumentation on an otherwise empty put()/get() loop
+plain_queue, timed_queue = queue.Queue(), InstrumentedQueue()
+plain_time = timeit.timeit(lambda: (plain_queue.put(1), plain_queue.get(), plain_queue.task_done()), number=100_000)
+timed_time = timeit.timeit(lambda: (timed_queue.put(1), timed_queue.get(), timed_queue.task_done()), number=100_000)
+print(f"queue.Queue: {plain_time * 10:.2f} us per item, InstrumentedQueue: {timed_time * 10:.2f} us per item")
+# Output (timings vary by machine): queue.Queue: 4.34 us per item, InstrumentedQueue: 14.58 us per item
+# About 10 microseconds per item: 1% of an item that takes a millisecond to process.
+
 
 # Global interpreter lock
 # - The Global Interpreter Lock (GIL) is a mechanism in Python that prevents multiple threads from executing native code at the same time. This lock is necessary to ensure that only one thread can execute Python bytecodes at a time, which is necessary for maintaining thread safety. GIL can cause performance issues in certain scenarios, such as CPU-bound tasks or I/O-bound tasks, where multiple threads can compete for resources.
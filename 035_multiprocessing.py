@@ -84,6 +84,381 @@ pool.join()
 
 print("Pool of processes finished execution.")
 
+
+# Instrumenting process queues and pools:
+# The same questions as for threads in 034_threading.py (how long do items wait, how long does the work take, how
+# busy are the workers), but the work now happens in other processes:
+# - InstrumentedProcessQueue wraps multiprocessing.Queue. put() sends each item with the time it was sent, and get()
+#   records the time it spent in the queue in the receiving process. Like InstrumentedQueue in 034_threading.py it
+#   also records how long put() and get() block, the time from get() to task_done() (service time), the queue depth
+#   (as a histogram and as samples over time) and how busy the consumer is. Each process keeps its own histograms
+#   and expects one consumer thread; the snapshots can be sent back to the parent and merged with
+#   HdrHistogram.from_snapshot() and merge(),
+# - InstrumentedPool wraps multiprocessing.Pool. Each task runs inside _timed_call(), which reports when the task
+#   started and ended, and the parent records the wait and run times when the result arrives.
+# time.monotonic() reads the same clock in every process on one machine, so times from different processes can be
+# subtracted. HdrHistogram comes from hdr_histogram.py, which 034_threading.py uses as well.
+import collections
+import json
+import threading
+import time
+
+from hdr_histogram import HdrHistogram
+
+
+def _microseconds(seconds):
+    return int(seconds * 1_000_000)
+
+
+class InstrumentedProcessQueue:
+    def __init__(self, maxsize=0, depth_samples=1024):
+        self._queue = multiprocessing.Queue(maxsize)
+        # All in this process only, in microseconds
+        self.queue_wait = HdrHistogram()  # put -> get
+        self.service_time = HdrHistogram()  # get -> task_done
+        self.put_blocked = HdrHistogram()
+        self.get_blocked = HdrHistogram()
+        self.depth = HdrHistogram(highest_value=1 << 20)
+        # (seconds since the queue was created, depth); time.monotonic() is shared, so samples from different
+        # processes lie on the same time axis
+        self.depth_over_time = collections.deque(maxlen=depth_samples)
+        self._created = time.monotonic()
+        self._next_depth_sample = self._created
+        self._busy_seconds = 0.0
+        self._started = None  # when this process's consumer took its current item
+
+    def _record_depth(self, now):
+        try:
+            depth = self._queue.qsize()
+        except NotImplementedError:
+            return  # qsize() is not available on macOS
+        self.depth.record(depth)
+        # At most one sample per millisecond, so the fixed-size history covers a useful stretch of time
+        if now >= self._next_depth_sample:
+            self._next_depth_sample = now + 0.001
+            self.depth_over_time.append((round(now - self._created, 6), depth))
+
+    def put(self, item, block=True, timeout=None):
+        start = time.monotonic()
+        self._queue.put((start, item), block, timeout)
+        now = time.monotonic()
+        self.put_blocked.record(_microseconds(now - start))
+        self._record_depth(now)
+
+    def get(self, block=True, timeout=None):
+        start = time.monotonic()
+        sent, item = self._queue.get(block, timeout)
+        now = time.monotonic()
+        self.get_blocked.record(_microseconds(now - start))
+        self.queue_wait.record(_microseconds(now - sent))
+        self._record_depth(now)
+        self._started = now
+        return item
+
+    def task_done(self):
+        # Marks the item from the last get() as processed; only recorded here, the underlying queue is not joinable
+        if self._started is not None:
+            elapsed = time.monotonic() - self._started
+            self.service_time.record(_microseconds(elapsed))
+            self._busy_seconds += elapsed
+            self._started = None
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self._created
+        return {
+            "elapsed_seconds": elapsed,
+            # Share of this process's time (since the queue was created) spent between get() and task_done()
+            "consumer_utilization": self._busy_seconds / elapsed,
+            "queue_wait_us": self.queue_wait.snapshot(),
+            "service_time_us": self.service_time.snapshot(),
+            "put_blocked_us": self.put_blocked.snapshot(),
+            "get_blocked_us": self.get_blocked.snapshot(),
+            "depth": self.depth.snapshot(),
+            "depth_over_time": list(self.depth_over_time),
+        }
+
+
+def _timed_call(fn, args):
+    start = time.monotonic()
+    result = fn(*args)
+    return start, time.monotonic(), result
+
+
+class TimedResult:
+    """Wraps the AsyncResult of a timed task; get() returns the task's own result."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def get(self, timeout=None):
+        return self.inner.get(timeout)[2]
+
+    def ready(self):
+        return self.inner.ready()
+
+
+class InstrumentedPool:
+    def __init__(self, processes=4):
+        self.processes = processes
+        self._pool = multiprocessing.Pool(processes)
+        self.queue_wait = HdrHistogram()
+        self.service_time = HdrHistogram()
+        self._busy_seconds = 0.0
+        self._created = time.monotonic()
+        self._lock = threading.Lock()  # callbacks run on the pool's result thread
+
+    def apply_async(self, fn, args=()):
+        submitted = time.monotonic()
+
+        def record(timing):
+            start, end, _ = timing
+            with self._lock:
+                self.queue_wait.record(_microseconds(start - submitted))
+                self.service_time.record(_microseconds(end - start))
+                self._busy_seconds += end - start
+
+        return TimedResult(self._pool.apply_async(_timed_call, (fn, args), callback=record))
+
+    def map(self, fn, iterable):
+        return [result.get() for result in [self.apply_async(fn, (item,)) for item in iterable]]
+
+    def close(self):
+        self._pool.close()
+
+    def join(self):
+        self._pool.join()
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self._created
+        with self._lock:
+            return {
+                "elapsed_seconds": elapsed,
+                "processes": self.processes,
+                "worker_utilization": self._busy_seconds / (elapsed * self.processes),
+                "queue_wait_us": self.queue_wait.snapshot(),
+                "service_time_us": self.service_time.snapshot(),
+            }
+
+
+def instrumented_worker(work, reports):
+    # Consumes until None, then sends its own histograms back to the parent
+    while work.get() is not None:
+        time.sleep(0.001)  # the work
+        work.task_done()
+    reports.put(work.snapshot())
+
+
+def slow_square(x):
+    time.sleep(0.01)
+    return x * x
+
+
+work = InstrumentedProcessQueue()
+reports = multiprocessing.Queue()
+workers = [multiprocessing.Process(target=instrumented_worker, args=(work, reports)) for _ in range(2)]
+for process in workers:
+    process.start()
+for i in range(50):
+    work.put(i)
+for _ in workers:
+    work.put(None)
+queue_wait, service_time = HdrHistogram(), HdrHistogram()
+worker_reports = [reports.get() for _ in workers]
+for report in worker_reports:
+    queue_wait.merge(HdrHistogram.from_snapshot(report["queue_wait_us"]))
+    service_time.merge(HdrHistogram.from_snapshot(report["service_time_us"]))
+for process in workers:
+    process.join()
+print(queue_wait.total, f"p99 wait in queue: {queue_wait.percentile(99) / 1000:.1f} ms")
+# Output (varies by machine): 52 p99 wait in queue: 26.1 ms
+print(service_time.total, service_time.percentile(50) >= 1000)  # Output: 50 True
+print([f"{report['consumer_utilization']:.0%}" for report in worker_reports], len(work.depth_over_time) > 0)
+# Output (varies by machine): ['77%', '77%'] True
+pool = InstrumentedPool(processes=4)
+print(pool.map(slow_square, range(8)))  # Output: [0, 1, 4, 9, 16, 25, 36, 49]
+pool.close()
+pool.join()
+pool_report = pool.snapshot()
+print(pool_report["service_time_us"]["count"], pool_report["service_time_us"]["p50"] >= 10_000)  # Output: 8 True
+print(len(json.dumps(pool_report)) > 0)  # Output: True
+
+
+# Lock-free single-producer/single-consumer ring buffer:
+# multiprocessing.Queue pickles every item, writes it to a pipe and takes a lock on each side. For a stream of
+# fixed-size numbers that costs far more than the numbers themselves. SharedRing keeps the numbers in a circular
+# array in multiprocessing.shared_memory, which both processes (or threads) see directly:
+# - the block starts with two counters, `head` (items written so far) and `tail` (items read so far), each in its own
+#   64-byte cache line; the ring holds head - tail items, and an item's slot is its counter modulo the capacity,
+# - only the producer writes `head` and only the consumer writes `tail`, so neither side needs a lock. The producer
+#   copies the values first and then advances `head`; the consumer reads them and then advances `tail`,
+# - write() and read() move whole batches with memoryview slice copies; there is no pickling at all.
+# It is only safe with exactly one producer and one consumer. Python has no memory fences, so the ordering of the two
+# steps relies on the CPU keeping stores in order, which x86-64 guarantees; on weakly ordered CPUs (such as ARM) use a
+# multiprocessing.Queue or add a lock.
+import array
+from multiprocessing import resource_tracker, shared_memory
+
+_RING_HEADER = 192  # head at byte 0, tail at byte 64, the closed flag at byte 128
+
+
+class SharedRing:
+    def __init__(self, capacity, typecode="d", name=None):
+        self.capacity = capacity
+        self.typecode = typecode
+        size = _RING_HEADER + capacity * array.array(typecode).itemsize
+        if name is None:
+            self._block = shared_memory.SharedMemory(create=True, size=size)
+            self._block.buf[:_RING_HEADER] = bytes(_RING_HEADER)
+        else:
+            self._block = shared_memory.SharedMemory(name=name)
+        self.name = self._block.name
+        self._counters = self._block.buf[:_RING_HEADER].cast("Q")  # [0] head, [8] tail, [16] closed
+        self._slots = self._block.buf[_RING_HEADER:size].cast(typecode)
+
+    def __reduce__(self):
+        # Sending the ring to another process sends its name; the receiver attaches to the same block
+        return SharedRing, (self.capacity, self.typecode, self.name)
+
+    def write(self, values):
+        # Copies as many of `values` (an array.array or memoryview of the ring's typecode) as fit; returns the count
+        head, tail = self._counters[0], self._counters[8]
+        count = min(len(values), self.capacity - (head - tail))
+        if count <= 0:
+            return 0
+        start = head % self.capacity
+        first = min(count, self.capacity - start)
+        values = memoryview(values)
+        self._slots[start : start + first] = values[:first]
+        self._slots[: count - first] = values[first:count]  # the part that wraps around to the beginning
+        self._counters[0] = head + count  # published only after the values are in place
+        return count
+
+    def read(self, max_items=4096):
+        # Returns up to max_items values as an array.array; empty when nothing is waiting
+        head, tail = self._counters[0], self._counters[8]
+        count = min(max_items, head - tail)
+        values = array.array(self.typecode)
+        if count <= 0:
+            return values
+        start = tail % self.capacity
+        first = min(count, self.capacity - start)
+        values.frombytes(self._slots[start : start + first].cast("B"))
+        values.frombytes(self._slots[: count - first].cast("B"))
+        self._counters[8] = tail + count  # the slots may be overwritten from now on
+        return values
+
+    def write_all(self, values):
+        # Blocking write for the producer: waits for free space, first yielding the CPU, then sleeping a little
+        values = memoryview(values)
+        written = idle = 0
+        while written < len(values):
+            count = self.write(values[written:])
+            written += count
+            idle = 0 if count else idle + 1
+            if idle:
+                time.sleep(0 if idle < 100 else 0.0001)
+
+    def close_writing(self):
+        self._counters[16] = 1
+
+    def iter_batches(self, max_items=4096):
+        # For the consumer: yields batches until the producer has called close_writing() and the ring is empty
+        idle = 0
+        while True:
+            closed = self._counters[16]  # read before the batch, so no value written before closing is missed
+            batch = self.read(max_items)
+            if batch:
+                idle = 0
+                yield batch
+            elif closed:
+                return
+            else:
+                idle += 1
+                time.sleep(0 if idle < 100 else 0.0001)
+
+    def close(self):
+        # The views must be released before the block can be closed; closing twice does nothing
+        if self._slots is None:
+            return
+        self._counters.release()
+        self._slots.release()
+        self._counters = self._slots = None
+        self._block.close()
+
+    def unlink(self):
+        self._block.unlink()
+
+
+def ring_consumer(ring, totals):
+    totals.put(sum(sum(batch) for batch in ring.iter_batches()))
+    ring.close()
+
+
+resource_tracker.ensure_running()  # one tracker shared by the child processes, as in 027's parallel_findall
+ring = SharedRing(capacity=8)
+ring.write(array.array("d", [1.0, 2.0, 3.0]))
+print(ring.read(2), ring.read())  # Output: array('d', [1.0, 2.0]) array('d', [3.0])
+print(ring.write(array.array("d", range(20))))  # Output: 8 - the ring is full
+ring.close()
+ring.unlink()
+
+
+# Benchmark: 1,000,000 float64 values from a producer to a consumer, one item per put() on the queues and batches of
+# 4096 on the ring
+ring_values = array.array("d", range(1_000_000))
+ring_total = sum(ring_values)
+
+
+def _benchmark_ring(start_consumer):
+    ring = SharedRing(capacity=65536)
+    totals = multiprocessing.Queue()
+    consumer = start_consumer(target=ring_consumer, args=(ring, totals))
+    start = time.perf_counter()
+    consumer.start()
+    for first in range(0, len(ring_values), 4096):
+        ring.write_all(ring_values[first : first + 4096])
+    ring.close_writing()
+    assert totals.get() == ring_total
+    elapsed = time.perf_counter() - start
+    consumer.join()
+    ring.close()
+    ring.unlink()
+    return elapsed
+
+
+def _queue_consumer(items, totals):
+    total = 0.0
+    while (item := items.get()) is not None:
+        total += item
+    totals.put(total)
+
+
+def _benchmark_queue(queue_class, start_consumer, count):
+    items, totals = queue_class(), queue_class()
+    consumer = start_consumer(target=_queue_consumer, args=(items, totals))
+    start = time.perf_counter()
+    consumer.start()
+    for value in ring_values[:count]:
+        items.put(value)
+    items.put(None)
+    assert totals.get() == sum(ring_values[:count])
+    elapsed = time.perf_counter() - start
+    consumer.join()
+    return elapsed * len(ring_values) / count  # scaled up to the full million
+
+
+import queue
+
+thread_queue_time = _benchmark_queue(queue.Queue, threading.Thread, 200_000)
+thread_ring_time = _benchmark_ring(threading.Thread)
+print(f"Threads - queue.Queue: {thread_queue_time:.2f}s, SharedRing: {thread_ring_time:.2f}s")
+process_queue_time = _benchmark_queue(multiprocessing.Queue, multiprocessing.Process, 100_000)
+process_ring_time = _benchmark_ring(multiprocessing.Process)
+print(f"Processes - multiprocessing.Queue: {process_queue_time:.2f}s, SharedRing: {process_ring_time:.2f}s")
+# Output (timings vary by machine; the queue times are scaled up from 200,000 and 100,000 items):
+# Threads - queue.Queue: 2.28s, SharedRing: 0.02s
+# Processes - multiprocessing.Queue: 14.29s, SharedRing: 0.03s
+
 # Global Interpreter Lock (GIL) avoidance:
 # - The Global Interpreter Lock (GIL) is a mechanism in Python that prevents multiple threads from executing native code at the same time. This lock is necessary to ensure that only one thread can execute Python bytecodes at a time, which is necessary for maintaining thread safety. Multiprocessing can help overcome this limitation by creating separate processes, each with its own memory space, allowing for parallel execution. However, the GIL can still cause performance issues in certain scenarios, such as CPU-bound tasks or I/O-bound tasks, where multiple threads can compete for resources.
 # Muliprocessing can be used to achieve parallelism and utilize multiple CPU cores effectively, but it is important to note that the GIL does not affect the performance of CPU-bound tasks or I/O- bound tasks.
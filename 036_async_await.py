@@ -83,3 +83,221 @@ asyncio.run(main())
 # - Efficient resource utilization: Asynchronous programming can utilize multiple CPU cores or threads, improving the performance of CPU-bound tasks.
 # - Scalability: Asynchronous programming can handle a large number of concurrent tasks, improving the scalability of the program.
 # - Better error handling: Asynchronous programming allows you to handle exceptions and errors in a more graceful manner, avoiding crashes and providing meaningful error messages.
+
+
+# Async iterators and pipelines:
+# A blocking `for line in file` or `next(iterator)` inside a coroutine stops the whole event loop until it returns.
+# The tools below keep data flowing through async code without that stall:
+# - amap(), afilter() and atake() are async generator stages, the `async for` versions of map(), filter() and islice(),
+# - buffered() runs a producer in its own task with a bounded queue between it and the consumer. When the queue is full
+#   the producer waits (backpressure), so a fast network reader cannot pile up unbounded data in memory,
+# - iterate_in_thread() runs a blocking iterator in a worker thread, and iterate_from_loop() lets blocking code in
+#   another thread consume an async iterator. Both hand over whole batches (the next_batch() protocol from
+#   031_iterable_and_iterator_protocols.py), so there is one thread switch per batch instead of one per item.
+#   When the consumer stops early, iterate_in_thread() waits for a read-ahead that is already running in the thread,
+#   so the source (for example a file the caller closes next) is never read after the loop has ended.
+import contextlib
+import itertools
+import os
+import tempfile
+import time
+
+
+async def amap(func, async_iterable):
+    async for item in async_iterable:
+        result = func(item)
+        if asyncio.iscoroutine(result):
+            result = await result
+        yield result
+
+
+async def afilter(predicate, async_iterable):
+    async for item in async_iterable:
+        keep = predicate(item)
+        if asyncio.iscoroutine(keep):
+            keep = await keep
+        if keep:
+            yield item
+
+
+async def atake(count, async_iterable):
+    if count <= 0:
+        return
+    async for item in async_iterable:
+        yield item
+        count -= 1
+        if count == 0:
+            return  # stop before awaiting another item from the source
+
+
+_END_OF_STREAM = object()
+
+
+async def buffered(async_iterable, maxsize=64):
+    queue = asyncio.Queue(maxsize)
+
+    async def produce():
+        try:
+            async for item in async_iterable:
+                await queue.put((item, None))  # waits while the consumer is `maxsize` items behind
+            await queue.put((_END_OF_STREAM, None))
+        except Exception as error:
+            await queue.put((_END_OF_STREAM, error))
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _END_OF_STREAM:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Also runs when the consumer stops early, so the producer never outlives the pipeline
+        producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+
+async def iterate_in_thread(iterable, batch_size=1024, executor=None):
+    loop = asyncio.get_running_loop()
+    iterator = iter(iterable)
+    next_batch = getattr(iterator, "next_batch", None)
+    if next_batch is None:
+        next_batch = lambda n: list(itertools.islice(iterator, n))
+    pending = loop.run_in_executor(executor, next_batch, batch_size)
+    try:
+        while True:
+            batch = await pending
+            if not len(batch):
+                return
+            # Read the next batch in the thread while this one is consumed
+            pending = loop.run_in_executor(executor, next_batch, batch_size)
+            for item in batch:
+                yield item
+    finally:
+        # cancel() only stops a read-ahead that has not started yet. One already running in the thread is awaited,
+        # and its result or error discarded, so the thread is done with the source before this generator returns
+        if not pending.cancel():
+            try:
+                await pending
+            except Exception:
+                pass
+
+
+def iterate_from_loop(async_iterable, loop, batch_size=1024):
+    # For a thread other than the loop's own: blocks until each batch is filled (or the stream ends)
+    async_iterator = async_iterable.__aiter__()
+
+    async def take_batch():
+        batch = []
+        try:
+            while len(batch) < batch_size:
+                batch.append(await async_iterator.__anext__())
+        except StopAsyncIteration:
+            pass
+        return batch
+
+    while True:
+        batch = asyncio.run_coroutine_threadsafe(take_batch(), loop).result()
+        if not batch:
+            return
+        yield from batch
+
+
+async def ticks(count, delay=0.0):
+    # Stands in for a network stream
+    for i in range(count):
+        await asyncio.sleep(delay)
+        yield i
+
+
+async def pipeline_examples():
+    doubled = amap(lambda x: x * 2, ticks(100))
+    multiples = afilter(lambda x: x % 3 == 0, doubled)
+    print([x async for x in atake(5, multiples)])  # Output: [0, 6, 12, 18, 24]
+
+    # A fast producer and a slow consumer: the producer can only ever be 4 items ahead
+    produced = []
+
+    async def fast_producer():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    async for item in buffered(fast_producer(), maxsize=4):
+        if item == 0:
+            await asyncio.sleep(0.01)
+            print(len(produced))  # Output: 6 - four queued, one waiting on the full queue, one consumed
+    # Lines of a file read in a thread, 1000 at a time, while the loop stays free for other tasks
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as file:
+        file.writelines(f"line {i}\n" for i in range(10_000))
+    with open(file.name) as lines_file:
+        line_count = 0
+        async for line in iterate_in_thread(lines_file, batch_size=1000):
+            line_count += 1
+    print(line_count)  # Output: 10000
+    os.remove(file.name)
+
+    # Stopping early: the read-ahead of the next batch is still running in the thread when the loop breaks
+    class SlowSource:
+        def __init__(self):
+            self.closed = False
+            self.reads_after_close = 0
+
+        def __iter__(self):
+            return self
+
+        def __next__(self):
+            return self.next_batch(1)[0]
+
+        def next_batch(self, n):
+            time.sleep(0.05)
+            if self.closed:
+                self.reads_after_close += 1
+            return list(range(n))
+
+    source = SlowSource()
+    async with contextlib.aclosing(iterate_in_thread(source, batch_size=10)) as items:
+        async for item in items:
+            break
+    source.closed = True  # like closing a file once the loop is done with it
+    await asyncio.sleep(0.1)
+    print(source.reads_after_close)  # Output: 0
+    # Blocking code in another thread consuming an async stream
+    loop = asyncio.get_running_loop()
+    total = await asyncio.to_thread(lambda: sum(iterate_from_loop(ticks(1000), loop, batch_size=100)))
+    print(total)  # Output: 499500
+
+
+asyncio.run(pipeline_examples())
+
+
+# Benchmark: moving 20,000 items from a blocking iterator into async code, one thread switch per item or per batch
+async def per_item_bridge(count):
+    loop = asyncio.get_running_loop()
+    iterator = iter(range(count))
+    total = 0
+    while (item := await loop.run_in_executor(None, next, iterator, None)) is not None:
+        total += item
+    return total
+
+
+async def batched_bridge(count):
+    total = 0
+    async for item in iterate_in_thread(range(count), batch_size=1024):
+        total += item
+    return total
+
+
+start = time.perf_counter()
+assert asyncio.run(per_item_bridge(20_000)) == sum(range(20_000))
+per_item_time = time.perf_counter() - start
+start = time.perf_counter()
+assert asyncio.run(batched_bridge(20_000)) == sum(range(20_000))
+batched_time = time.perf_counter() - start
+print(f"Per item: {per_item_time:.2f}s, batched: {batched_time:.3f}s")
+# Output (timings vary by machine): Per item: 1.52s, batched: 0.012s
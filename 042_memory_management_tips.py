@@ -29,6 +29,138 @@ for number in generate_numbers(1000000):
         print(number)
     else:
         break
+# Reading records straight from a memory-mapped file:
+# generate_numbers() above creates its values in memory, and reading a file line by line creates a new bytes object
+# for every line. mmap maps the file into the address space instead: the operating system loads pages on demand and
+# drops them again under memory pressure, so files larger than RAM can be walked. MappedRecords yields each record as
+# a memoryview slice of the mapping, which points into the mapped pages without copying them.
+# Records are either fixed-width (`record_size` bytes each) or end with a delimiter such as b"\n". With a `struct`
+# format, such as "<qd" for an 8-byte int followed by an 8-byte float, fixed-width records are decoded into tuples
+# by struct.iter_unpack(), which also reads the mapping directly.
+# A memoryview slice keeps the mapping alive, so use bytes(record) for anything that must outlive the loop.
+import mmap
+import os
+import struct
+import tempfile
+
+
+class MappedRecords:
+    def __init__(self, path, record_size=None, delimiter=b"\n", record_format=None):
+        self._struct = struct.Struct(record_format) if record_format is not None else None
+        self.record_size = self._struct.size if self._struct is not None else record_size
+        self.delimiter = delimiter
+        # Checked up front: an empty delimiter would never advance, and a zero size fails deep inside iteration
+        if self.record_size is not None and self.record_size < 1:
+            raise ValueError("record_size must be at least 1.")
+        if self.record_size is None and not delimiter:
+            raise ValueError("delimiter must not be empty.")
+        with open(path, "rb") as file:
+            # An empty file cannot be mapped; the mapping stays valid after the file is closed
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else None
+        if self._map is not None and hasattr(self._map, "madvise"):
+            self._map.madvise(mmap.MADV_SEQUENTIAL)  # lets the OS read ahead aggressively (Unix only)
+
+    def __iter__(self):
+        if self._map is None:
+            return iter(())
+        view = memoryview(self._map)
+        if self.record_size is None:
+            return self._delimited(view)
+        usable = len(view) - len(view) % self.record_size  # a partial last record is ignored
+        if self._struct is not None:
+            return self._struct.iter_unpack(view[:usable])
+        return (view[start : start + self.record_size] for start in range(0, usable, self.record_size))
+
+    def _delimited(self, view):
+        # mmap.find() searches in C, so Python only runs once per record
+        find, delimiter, end = self._map.find, self.delimiter, len(view)
+        start = 0
+        while start < end:
+            stop = find(delimiter, start)
+            if stop == -1:
+                yield view[start:]  # the last record has no delimiter
+                return
+            yield view[start:stop]
+            start = stop + len(delimiter)
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # slices are still in use; the mapping is released together with the last of them
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as file:
+    file.write(b"alpha\nbeta\ngamma")
+records_path = file.name
+with MappedRecords(records_path) as records:
+    print([bytes(record) for record in records])  # Output: [b'alpha', b'beta', b'gamma']
+with MappedRecords(records_path, record_size=4) as records:
+    print([record.tobytes() for record in records])  # Output: [b'alph', b'a\nbe', b'ta\ng', b'amma']
+option_errors = []
+for bad_options in [{"delimiter": b""}, {"record_size": 0}]:
+    try:
+        MappedRecords(records_path, **bad_options)
+    except ValueError as error:
+        option_errors.append(str(error))
+print(option_errors)  # Output: ['delimiter must not be empty.', 'record_size must be at least 1.']
+trade_format = struct.Struct("<qd")  # trade id, price
+with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as file:
+    for trade_id in range(1_000_000):
+        file.write(trade_format.pack(trade_id, trade_id * 0.5))
+trades_path = file.name
+with MappedRecords(trades_path, record_format="<qd") as trades:
+    print(sum(price for _, price in trades))  # Output: 249999750000.0
+# Benchmark: 200,000 lines of 1 KB read with a file object (a new bytes object per line) against memoryview slices,
+# and binary records decoded one read() at a time against iter_unpack() over the mapping
+import timeit
+
+with open(records_path, "wb") as file:
+    file.writelines(b"%d,%s\n" % (i, b"x" * 1000) for i in range(200_000))
+
+
+def _count_file_lines():
+    with open(records_path, "rb") as file:
+        return sum(1 for line in file if line[:1] == b"9")
+
+
+def _count_mapped_lines():
+    with MappedRecords(records_path) as records:
+        return sum(1 for record in records if record[:1] == b"9")
+
+
+assert _count_file_lines() == _count_mapped_lines()
+file_time = timeit.timeit(_count_file_lines, number=3)
+mapped_time = timeit.timeit(_count_mapped_lines, number=3)
+print(f"File lines: {file_time:.2f}s, mapped lines: {mapped_time:.2f}s")
+# Output (timings vary by machine): File lines: 0.63s, mapped lines: 0.66s
+# About the same time: both scan for b"\n" in C. The difference is that no line was copied into a new object.
+
+
+def _decode_read_records():
+    with open(trades_path, "rb") as file:
+        return sum(trade_format.unpack(file.read(16))[1] for _ in range(1_000_000))
+
+
+def _decode_mapped_records():
+    with MappedRecords(trades_path, record_format="<qd") as trades:
+        return sum(price for _, price in trades)
+
+
+read_time = timeit.timeit(_decode_read_records, number=3)
+mapped_time = timeit.timeit(_decode_mapped_records, number=3)
+print(f"read()+unpack: {read_time:.2f}s, mapped iter_unpack: {mapped_time:.2f}s")
+# Output (timings vary by machine): read()+unpack: 0.77s, mapped iter_unpack: 0.38s
+os.remove(records_path)
+os.remove(trades_path)
 # Close resources properly:
 # Always close files, network connections, and other resources when you're done with them.
 # Use context managers (the `with` statement) to ensure resources are released automatically.
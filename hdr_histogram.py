@@ -0,0 +1,111 @@
+# HDR-style histogram shared by the lessons on threads (034_threading.py) and processes (035_multiprocessing.py).
+# Like the HDR Histogram library, values are counted in log-linear buckets that keep every value to within 1/64
+# (about 1.6%), in a fixed array of counters sized by the largest value, no matter how many values are recorded.
+# Recording is one index calculation and one counter update, so it can stay on in production. snapshot() returns
+# plain dicts and lists that json.dumps() can write out or a multiprocessing.Queue can send to another process.
+import array
+import math
+
+
+class HdrHistogram:
+    def __init__(self, highest_value=3_600_000_000, significant_bits=7):
+        # Values are integers (microseconds here), up to one hour by default; larger values count as the highest
+        self.highest_value = highest_value
+        # 2**7 = 128 exact counters for values below 128; above that each power of two gets 64 buckets, so a value is
+        # reported at most 1/64 (about 1.6%) too high. significant_bits=8 halves the error and doubles the counters.
+        self.sub_buckets = 1 << significant_bits
+        self._half = self.sub_buckets // 2
+        self._bits = significant_bits
+        self.counts = array.array("Q", bytes(8 * (self._index(highest_value) + 1)))
+        self.total = 0
+        self.sum = 0
+        self._low = highest_value + 1  # no value recorded yet
+        self._high = -1
+
+    def _index(self, value):
+        # Values below 128 get a counter each; above that, each power of two is split into 64 equal buckets
+        shift = value.bit_length() - self._bits
+        if shift <= 0:
+            return value
+        return shift * self._half + (value >> shift)
+
+    def _bucket_range(self, index):
+        if index < self.sub_buckets:
+            return index, index
+        shift = (index - self.sub_buckets) // self._half + 1
+        low = (index - shift * self._half) << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, value):
+        # Kept short because it runs for every item: the index calculation is _index() written out inline.
+        # There is no lock inside, so threads sharing a histogram must hold a common lock while recording.
+        if value > self.highest_value:
+            value = self.highest_value
+        elif value < 0:
+            value = 0
+        shift = value.bit_length() - self._bits
+        index = value if shift <= 0 else shift * self._half + (value >> shift)
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+        if value < self._low:
+            self._low = value
+        if value > self._high:
+            self._high = value
+
+    @property
+    def min(self):
+        return self._low if self.total else None
+
+    @property
+    def max(self):
+        return self._high if self.total else None
+
+    def percentile(self, percent):
+        # The highest value of the bucket that holds the given percentile
+        if not self.total:
+            return 0
+        target = max(1, math.ceil(self.total * percent / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._bucket_range(index)[1], self.max)
+        return self.max
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.sum += other.sum
+        self._low = min(self._low, other._low)
+        self._high = max(self._high, other._high)
+
+    def snapshot(self):
+        return {
+            "highest_value": self.highest_value,
+            "significant_bits": self._bits,
+            "count": self.total,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.total if self.total else 0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p99.9": self.percentile(99.9),
+            # Only the non-empty buckets, as [lowest value, count]
+            "buckets": [[self._bucket_range(index)[0], count] for index, count in enumerate(self.counts) if count],
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        # Rebuilds a histogram from snapshot() output, e.g. one loaded from JSON or sent by another process
+        histogram = cls(snapshot["highest_value"], snapshot["significant_bits"])
+        for low, count in snapshot["buckets"]:
+            histogram.counts[histogram._index(low)] += count
+        histogram.total, histogram.sum = snapshot["count"], snapshot["sum"]
+        if snapshot["count"]:
+            histogram._low, histogram._high = snapshot["min"], snapshot["max"]
+        return histogram